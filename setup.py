@@ -2,8 +2,7 @@ __version__ = '0.1.8'
 
 _classifiers = [
     'Development Status :: 4 - Beta',
-    'Programming Language :: Python :: 2.7',
-    'Programming Language :: Python :: 3.6',
+    'Programming Language :: Python :: 3 :: Only',
     'Programming Language :: Python :: 3.7',
     'Programming Language :: Python :: 3.8',
     'Programming Language :: Python :: 3.9',
@@ -37,7 +36,9 @@ def _run_setup():
         license='MIT',
         classifiers=_classifiers,
         keywords=['xled','twinkly','light-effects'],
+        python_requires='>=3.7',
         install_requires=['xled'],
+        extras_require={'numpy': ['numpy']},
     )
 
 
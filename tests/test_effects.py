@@ -0,0 +1,162 @@
+"""
+The numpy versions of the effects give the same frames as the plain
+python versions.
+"""
+
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from xled_plus import effects, ledcolor
+from xled_plus.geometry import DeviceGeometry
+
+TWO_STRINGS = [
+    {"first_led_id": 0, "length": 100},
+    {"first_led_id": 100, "length": 150},
+]
+
+
+def render(make_effect, numframes, numpy, monkeypatch):
+    with monkeypatch.context() as m:
+        if not numpy:
+            m.setattr(effects, "np", None)
+        random.seed(7)
+        effect = make_effect()
+        effect.reset(numframes)
+        return [bytes(effect.getnext().data) for i in range(numframes)]
+
+
+def assert_same_frames(make_effect, numframes, monkeypatch):
+    frames = render(make_effect, numframes, True, monkeypatch)
+    assert frames == render(make_effect, numframes, False, monkeypatch)
+
+
+class ScriptedRandom(object):
+    """
+    Random numbers that the per-led and the array versions draw in the same
+    way: first the two start colors of all leds if looping, then a constant.
+    """
+
+    def __init__(self, num_leds, loop, values=(0.1, 0.5, 0.9)):
+        self.starts = 2 if loop else 0
+        self.num_leds = num_leds
+        self.values = values
+        self.calls = 0
+
+    def random(self):
+        self.calls += 1
+        if self.calls > self.starts * self.num_leds:
+            return self.values[2]
+        return self.values[(self.calls - 1) % 2]
+
+    def RandomState(self, seed):
+        return self
+
+    def random_sample(self, num):
+        self.calls += 1
+        if self.calls > self.starts:
+            return np.full(num, self.values[2])
+        return np.full(num, self.values[self.calls - 1])
+
+
+@pytest.mark.parametrize("cls", [effects.Fire, effects.Water, effects.Aurora])
+@pytest.mark.parametrize("numframes", [120, False])
+def test_glow(monkeypatch, cls, numframes):
+    geom = DeviceGeometry(100, 4)
+    movies = []
+    for numpy in (True, False):
+        with monkeypatch.context() as m:
+            scripted = ScriptedRandom(100, numframes)
+            if numpy:
+                m.setattr(effects.np, "random", scripted)
+            else:
+                m.setattr(effects, "np", None)
+                m.setattr(random, "random", scripted.random)
+            effect = cls(geom)
+            effect.reset(numframes)
+            movies.append([bytes(effect.getnext().data) for i in range(150)])
+    assert movies[0] == movies[1]
+    assert len(set(movies[0])) > 10
+
+
+@pytest.mark.parametrize(
+    "cls", [effects.Pulselight, effects.Looplight, effects.SimpleStars]
+)
+def test_sparkle(monkeypatch, cls):
+    geom = DeviceGeometry(250)
+    assert_same_frames(lambda: cls(geom), 200, monkeypatch)
+
+
+@pytest.mark.parametrize(
+    "cls",
+    [
+        effects.SimpleBlink,
+        effects.Looplight,
+        effects.LooplightSpectrum,
+        effects.SparkleRandom,
+        effects.SparkleStars,
+    ],
+)
+def test_sparkle_uses_color_model(monkeypatch, cls):
+    balance = [0.6, 1.0, 0.9]
+    model = ledcolor.ColorModel(balance=balance)
+    geom = DeviceGeometry(250, color_model=model)
+    own = render(lambda: cls(geom), 60, True, monkeypatch)
+    default = render(lambda: cls(DeviceGeometry(250)), 60, True, monkeypatch)
+    old = ledcolor.led_balance
+    try:
+        ledcolor.set_led_params(balance=balance)
+        shared = render(lambda: cls(DeviceGeometry(250)), 60, True, monkeypatch)
+    finally:
+        ledcolor.set_led_params(balance=old)
+    assert own == shared
+    assert own != default
+
+
+@pytest.mark.parametrize("led_bytes", [3, 4])
+def test_breath(monkeypatch, led_bytes):
+    geom = DeviceGeometry(250, led_bytes)
+    cols = [[0.1, 1.0, 0.0], [0.5, 1.0, 0.2], [0.8, 0.5, -0.3]]
+    assert_same_frames(lambda: effects.BreathCP(geom, cols), 130, monkeypatch)
+
+
+@pytest.mark.parametrize("string_config", [None, TWO_STRINGS])
+@pytest.mark.parametrize(
+    "cls", [effects.Spectrum, effects.ScatteredSpectrum, effects.RotatingWhites]
+)
+def test_rotate(monkeypatch, cls, string_config):
+    geom = DeviceGeometry(250, 3, string_config)
+    assert_same_frames(lambda: cls(geom), 300, monkeypatch)
+
+
+def test_rotate_movie(monkeypatch):
+    geom = DeviceGeometry(250, 4, TWO_STRINGS)
+    movies = []
+    for numpy in (True, False):
+        with monkeypatch.context() as m:
+            if not numpy:
+                m.setattr(effects, "np", None)
+            random.seed(7)
+            effect = effects.ScatteredSpectrum(geom)
+            movies.append(effect.make_movie(effect.preferred_frames).getvalue())
+    assert movies[0] == movies[1]
+
+
+@pytest.mark.parametrize("numpy", [True, False])
+def test_breath_movie_loops(monkeypatch, numpy):
+    geom = DeviceGeometry(50)
+    cols = [[0.1, 1.0, 0.0], [0.5, 1.0, 0.2]]
+    with monkeypatch.context() as m:
+        if not numpy:
+            m.setattr(effects, "np", None)
+        effect = effects.BreathEffect(geom, cols, 1, 0.75, 7)
+        assert effect.get_period() == 7
+        movie = effect.make_movie(120).getvalue()
+        assert len(movie) == 119 * 150
+        effect.reset(119)
+        frames = [bytes(effect.getnext().data) for i in range(120)]
+        assert frames[119] == frames[0]
+        short = effects.BreathEffect(geom, cols, 1, 0.75, 7).make_movie(5)
+        assert len(short.getvalue()) == 5 * 150
@@ -0,0 +1,141 @@
+"""
+Patterns and movies made offline with a DeviceGeometry. The effect movies
+are compared with reference digests of the frames made by the original
+per-led code on a HighControlInterface.
+"""
+
+import hashlib
+import random
+import tracemalloc
+
+import pytest
+
+from xled_plus import effects
+from xled_plus.geometry import DeviceGeometry
+
+TWO_STRINGS = [
+    {"first_led_id": 0, "length": 100},
+    {"first_led_id": 100, "length": 150},
+]
+
+BREATH_COLORS = [[0.1, 1.0, 0.0], [0.5, 1.0, 0.2], [0.8, 0.5, -0.3]]
+
+EFFECTS = {
+    "Spectrum": effects.Spectrum,
+    "ScatteredSpectrum": effects.ScatteredSpectrum,
+    "RotatingWhites": effects.RotatingWhites,
+    "BreathCP": lambda geom: effects.BreathCP(geom, BREATH_COLORS),
+}
+
+# sha1 of make_movie(preferred_frames) after random.seed(7), on 250 leds
+REFERENCE = [
+    ("Spectrum", None, 3, "f8ed9cc9623e57326ea332e34dd815f6b459178b"),
+    ("ScatteredSpectrum", None, 3, "d5c9e1e40156bd1d4d34161b284a55f0b5f61c6c"),
+    ("RotatingWhites", None, 3, "3bd12576d72a5f2e8c9aab1bbc28c31f86fc021b"),
+    ("BreathCP", None, 3, "5337f4aafac3663fc357086bfc80c959b9d08937"),
+    ("Spectrum", None, 4, "08d1369b9b83f66e1c54098576dbf43ab259059e"),
+    ("ScatteredSpectrum", None, 4, "a1ed84797221f249a920d59cf8d4f81a23c62088"),
+    ("RotatingWhites", None, 4, "dfe67cebfa826f7c7282397021b422453e730fb4"),
+    ("BreathCP", None, 4, "9da15855f7fb92dfcd6954f8ec29daa48ad03a65"),
+    ("Spectrum", TWO_STRINGS, 3, "80572aaacec6f90bbcac26dfe111847159f431c9"),
+    ("ScatteredSpectrum", TWO_STRINGS, 3, "3e66d51cc028ca07771fa1320282e92d0829bc59"),
+    ("RotatingWhites", TWO_STRINGS, 3, "b2c1ce085a4ecd3793189252cf973528a991098c"),
+    ("BreathCP", TWO_STRINGS, 3, "5337f4aafac3663fc357086bfc80c959b9d08937"),
+    ("Spectrum", TWO_STRINGS, 4, "51f3f56ca5e1f5a4747df4a12ca4016b68419eba"),
+    ("ScatteredSpectrum", TWO_STRINGS, 4, "238f53354ab5bed394eee1f14577c7dea92ceaab"),
+    ("RotatingWhites", TWO_STRINGS, 4, "d9716ae7aa8211a483d7f76d0c6e9d0f8d5d673f"),
+    ("BreathCP", TWO_STRINGS, 4, "9da15855f7fb92dfcd6954f8ec29daa48ad03a65"),
+]
+
+
+@pytest.mark.parametrize("name, string_config, led_bytes, digest", REFERENCE)
+def test_effect_movie_matches_reference(name, string_config, led_bytes, digest):
+    geom = DeviceGeometry(250, led_bytes, string_config)
+    random.seed(7)
+    effect = EFFECTS[name](geom)
+    movie = effect.make_movie(effect.preferred_frames).getvalue()
+    assert len(movie) == effect.preferred_frames * 250 * led_bytes
+    assert hashlib.sha1(movie).hexdigest() == digest
+
+
+def test_circular_patterns():
+    geom = DeviceGeometry(250, 3, TWO_STRINGS)
+    assert [geom.circind(i) for i in (0, 99, 100, 249)] == [99, 0, 100, 249]
+    pat = geom.make_func_pattern(lambda i: (i, 0, 0), circular=True)
+    assert pat.get_pixel(99) == (0, 0, 0)
+    assert pat.get_pixel(0) == (99, 0, 0)
+    assert geom.circ_flip(geom.circ_flip(pat)) == pat
+
+
+def test_movie_round_trip(tmp_path):
+    geom = DeviceGeometry(20, 4)
+    movie = geom.make_func_movie(5, lambda i: geom.make_solid_pattern((i, 1, 2)))
+    name = str(tmp_path / "movie.txt")
+    geom.save_movie(name, movie, 12)
+    loaded, fps = geom.load_movie(name)
+    assert fps == 12
+    assert loaded.getvalue() == movie.getvalue()
+
+
+def test_fingerprint():
+    geom = DeviceGeometry(250, 3, TWO_STRINGS)
+    assert geom.fingerprint() == DeviceGeometry(250, 3, TWO_STRINGS).fingerprint()
+    assert geom.fingerprint() != DeviceGeometry(250, 4, TWO_STRINGS).fingerprint()
+    assert geom.fingerprint() != DeviceGeometry(250, 3).fingerprint()
+
+
+@pytest.mark.parametrize("format", ["binary", "text"])
+def test_load_pads_and_adds_white(tmp_path, format):
+    name = str(tmp_path / "movie")
+    rgb = DeviceGeometry(20, 3)
+    movie = rgb.make_func_movie(4, lambda i: rgb.make_solid_pattern((i, 1, 2)))
+    rgb.save_movie(name, movie, 8, format=format)
+    loaded, fps = DeviceGeometry(24, 4).load_movie(name)
+    frames = loaded.getvalue()
+    assert fps == 8
+    assert len(frames) == 4 * 24 * 4
+    assert frames[:8] == bytes(8)
+    assert frames[8:16] == b"\x00\x00\x01\x02" * 2
+    assert frames[88:96] == bytes(8)
+
+
+def test_load_truncates_and_removes_white(tmp_path):
+    name = str(tmp_path / "movie")
+    rgbw = DeviceGeometry(10, 4)
+    movie = rgbw.make_func_pattern(lambda i: (i, 0, 1))
+    rgbw.save_movie(name, rgbw.to_movie(movie), 8, format="binary")
+    loaded, fps = DeviceGeometry(6, 3).load_movie(name)
+    assert loaded.getvalue() == b"".join(bytes([i, 0, 1]) for i in range(2, 8))
+
+
+def test_load_resamples_by_layout(tmp_path):
+    name = str(tmp_path / "movie")
+    small = DeviceGeometry(5, 3)
+    movie = small.make_func_pattern(lambda i: (i, 0, 0))
+    small.save_movie(name, small.to_movie(movie), 8)
+    loaded, fps = DeviceGeometry(10, 3).load_movie(name, source=small)
+    assert loaded.getvalue()[0::3] == bytes([0, 0, 1, 1, 2, 2, 3, 3, 4, 4])
+
+
+def test_to_movie_from_generator():
+    geom = DeviceGeometry(30, 3)
+    pats = [geom.make_solid_pattern((i, 0, 0)) for i in range(5)]
+    expected = b"".join(bytes(pat.data) for pat in pats)
+    assert geom.to_movie(pats).getvalue() == expected
+    assert geom.to_movie(iter(pats), 5).getvalue() == expected
+    # Fewer frames than announced gives a shorter movie
+    assert geom.to_movie(iter(pats[:3]), 5).getvalue() == expected[: 3 * 90]
+    assert geom.make_func_movie(5, iter(pats)).getvalue() == expected
+
+
+def test_to_movie_allocates_once():
+    geom = DeviceGeometry(1000, 3)
+    pat = geom.make_solid_pattern((1, 2, 3))
+    tracemalloc.start()
+    try:
+        movie = geom.to_movie((pat for i in range(1000)), 1000)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert movie.getvalue() == bytes(pat.data) * 1000
+    assert peak < 1.5 * 3000 * 1000
@@ -0,0 +1,93 @@
+"""
+Patterns, layouts and movies on a DeviceEmulator.
+"""
+
+import pytest
+
+pytest.importorskip("xled")
+
+from xled_plus.emulator import DeviceEmulator
+
+
+@pytest.fixture
+def emu():
+    with DeviceEmulator(num_leds=50, max_frames=100) as emu:
+        yield emu
+
+
+def test_device_info(emu):
+    ctr = emu.connect()
+    assert ctr.num_leds == 50
+    assert ctr.led_bytes == 3
+    assert ctr.make_solid_pattern((1, 2, 3))[7] == b"\x01\x02\x03"
+
+
+def test_layout_positions_are_cached(emu):
+    ctr = emu.connect()
+    positions = ctr.get_layout_positions("centered")
+    assert len(positions) == 50
+    assert ctr.get_layout_positions("centered") is positions
+    pat = ctr.make_layout_pattern(lambda p: (int(100 + 99 * p[0]), 0, 0), "centered")
+    assert pat.get_pixel(0) == (int(100 + 99 * positions[0][0]), 0, 0)
+    ctr.fetch_layout()
+    assert ctr.get_layout_positions("centered") is not positions
+    assert ctr.get_layout_positions("centered") == positions
+
+
+def test_show_movie(emu):
+    ctr = emu.connect()
+    movie = ctr.make_func_movie(10, lambda i: ctr.make_solid_pattern((i, 0, 0)))
+    ctr.show_movie(movie, 10)
+    assert emu.mode == "movie"
+    assert len(emu.movies) == 1
+
+
+def request_stats(ctr, method, endpoint):
+    return ctr.get_http_stats().get((method, endpoint), {"count": 0, "sent": 0})
+
+
+def test_requests_share_connection(emu):
+    ctr = emu.connect()
+    movie = ctr.make_func_movie(5, lambda i: ctr.make_solid_pattern((i, 0, 0)))
+    ctr.show_movie(movie, 10)
+    connections = emu.connection_count
+    for k in range(5):
+        ctr.get_mode()
+    assert emu.connection_count == connections
+    assert request_stats(ctr, "GET", "led/mode")["count"] >= 5
+    assert request_stats(ctr, "POST", "movies/full")["sent"] == 5 * 50 * 3
+    ctr.reset_http_stats()
+    assert ctr.get_http_stats() == {}
+
+
+def make_movie(ctr, numframes, k=0):
+    return ctr.make_func_movie(numframes, lambda i: ctr.make_solid_pattern((k, i, 0)))
+
+
+def test_state_is_not_refetched(emu):
+    ctr = emu.connect()
+    ctr.show_movie(make_movie(ctr, 10, 1), 10)
+    ctr.show_movie(make_movie(ctr, 10, 2), 10)
+    ctr.turn_off()
+    ctr.turn_on()
+    ctr.show_movie(make_movie(ctr, 10, 3), 10)
+    assert request_stats(ctr, "GET", "movies")["count"] == 1
+    assert request_stats(ctr, "GET", "led/mode")["count"] == 1
+    assert emu.mode == "movie"
+    assert len(emu.movies) == 3
+    assert ctr.state.movies == emu.movies
+
+
+def test_upload_sends_movie_once(emu):
+    ctr = emu.connect()
+    movie = make_movie(ctr, 40)
+    ctr.show_movie(movie, 10)
+    ctr.show_movie(make_movie(ctr, 40), 10)
+    assert ctr.upload_movie(movie, 10) == ctr.find_movie(ctr.movie_unique_id(movie, 10))
+    full = request_stats(ctr, "POST", "movies/full")
+    assert full["count"] == 1
+    assert full["sent"] == 40 * 50 * 3
+    assert request_stats(ctr, "POST", "movies/new")["count"] == 1
+    assert len(emu.movies) == 1
+    ctr.show_movie(movie, 20)
+    assert len(emu.movies) == 2
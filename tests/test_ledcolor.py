@@ -0,0 +1,117 @@
+"""
+The vectorized and table based color conversions agree with hsl_color.
+"""
+
+import itertools
+
+import pytest
+
+from xled_plus import ledcolor
+
+np = pytest.importorskip("numpy")
+
+GRID = list(
+    itertools.product(
+        np.linspace(0.0, 1.0, 37), [0.0, 0.3, 1.0], np.linspace(-1.0, 1.0, 21)
+    )
+)
+
+
+@pytest.mark.parametrize("style", ["linear", "equilight", "3col", "8col"])
+def test_array_matches_scalar(style):
+    old = ledcolor.get_color_style()
+    try:
+        ledcolor.set_color_style(style)
+        h, s, l = np.array(GRID).T
+        rgb = ledcolor.hsl_color_array(h, s, l)
+        assert rgb.dtype == np.uint8
+        assert [tuple(c) for c in rgb.tolist()] == [
+            ledcolor.hsl_color(*hsl) for hsl in GRID
+        ]
+    finally:
+        ledcolor.set_color_style(old[0])
+        ledcolor.set_color_style(old[1])
+
+
+def test_array_broadcasts():
+    rgb = ledcolor.hsl_color_array(np.linspace(0.0, 1.0, 5), 1.0, 0.0)
+    assert rgb.shape == (5, 3)
+    assert tuple(rgb[2]) == ledcolor.hsl_color(0.5, 1.0, 0.0)
+
+
+@pytest.fixture
+def lut():
+    lut = ledcolor.set_color_lut((65, 11, 33))
+    yield lut
+    ledcolor.set_color_lut(False)
+
+
+def test_lut_is_exact_on_grid(lut):
+    for h, s, l in [(0.0, 0.0, -1.0), (0.25, 0.5, 0.0), (1.0, 1.0, 0.5)]:
+        assert ledcolor.hsl_color(h, s, l) == ledcolor.exact_hsl_color(h, s, l)
+
+
+def test_lut_error_is_small(lut):
+    h, s, l = np.array(GRID).T
+    exact = ledcolor.hsl_color_array(h, s, l).astype(int)
+    approx = lut.lookup_array(h, s, l).astype(int)
+    assert [tuple(c) for c in approx.tolist()] == [
+        ledcolor.hsl_color(*hsl) for hsl in GRID
+    ]
+    assert np.abs(approx - exact).mean() < 2.0
+
+
+def test_lut_follows_color_style(lut):
+    old = ledcolor.get_color_style()
+    try:
+        ledcolor.set_color_style("linear")
+        assert ledcolor.hsl_color(0.5, 1.0, 0.5) == ledcolor.exact_hsl_color(
+            0.5, 1.0, 0.5
+        )
+    finally:
+        ledcolor.set_color_style(old[1])
+
+
+def test_model_matches_module():
+    model = ledcolor.ColorModel()
+    for hsl in GRID[::7]:
+        assert model.hsl_color(*hsl) == ledcolor.hsl_color(*hsl)
+        assert model.exact_hsl_color(*hsl) == ledcolor.exact_hsl_color(*hsl)
+
+
+def test_models_are_independent():
+    model = ledcolor.ColorModel(style=("3col", "linear"), balance=[0.9, 1.0, 0.7])
+    before = ledcolor.hsl_color(0.3, 1.0, 0.0)
+    assert model.hsl_color(0.3, 1.0, 0.0) != before
+    assert model.get_color_style() == ("3col", "linear")
+    model.set_color_style("equilight")
+    assert model.get_color_style() == ("3col", "equilight")
+    assert ledcolor.hsl_color(0.3, 1.0, 0.0) == before
+    h, s, l = np.array(GRID).T
+    assert [tuple(c) for c in model.hsl_color_array(h, s, l).tolist()] == [
+        model.hsl_color(*hsl) for hsl in GRID
+    ]
+
+
+def test_model_lut():
+    model = ledcolor.ColorModel(balance=[0.8, 1.0, 0.6])
+    model.set_lut((65, 11, 33))
+    assert model.hsl_color(0.25, 0.5, 0.0) == model.exact_hsl_color(0.25, 0.5, 0.0)
+    assert ledcolor.default_model.lut is None
+
+
+def test_led_params_are_picked_up(lut):
+    before = ledcolor.hsl_color(0.3, 1.0, 0.0)
+    balance = ledcolor.led_balance
+    try:
+        ledcolor.set_led_params(balance=[0.9, 1.0, 0.7])
+        model = ledcolor.ColorModel(balance=[0.9, 1.0, 0.7])
+        assert ledcolor.exact_hsl_color(0.3, 1.0, 0.0) == model.exact_hsl_color(
+            0.3, 1.0, 0.0
+        )
+        assert ledcolor.hsl_color(0.25, 0.5, 0.0) == model.exact_hsl_color(
+            0.25, 0.5, 0.0
+        )
+    finally:
+        ledcolor.set_led_params(balance=balance)
+    assert ledcolor.hsl_color(0.3, 1.0, 0.0) == before
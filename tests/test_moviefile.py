@@ -0,0 +1,149 @@
+"""
+Round trips of the binary, compressed and text movie formats.
+"""
+
+import io
+import os
+
+import pytest
+
+from xled_plus import moviefile
+from xled_plus.geometry import DeviceGeometry
+
+
+NUM_LEDS = 60
+LED_BYTES = 4
+
+
+def make_frames(numframes):
+    # Few leds change per frame, as in typical effects
+    frame = bytearray(NUM_LEDS * LED_BYTES)
+    frames = []
+    for i in range(numframes):
+        frame[(i * 7) % len(frame)] = i % 256
+        frames.append(bytes(frame))
+    return frames
+
+
+def test_binary_round_trip(tmp_path):
+    name = str(tmp_path / "movie.bin")
+    frames = make_frames(50)
+    assert moviefile.write_movie_file(name, frames, NUM_LEDS, LED_BYTES, 12.5) == 50
+    assert moviefile.is_movie_file(name)
+    with moviefile.MovieFile(name) as movie:
+        assert (movie.numframes, movie.num_leds, movie.led_bytes) == (50, 60, 4)
+        assert movie.fps == 12.5
+        assert movie.profile == "RGBW"
+        assert movie.verify()
+        assert [bytes(frame) for frame in movie.frames()] == frames
+        with pytest.raises(IndexError):
+            movie.get_frame(50)
+
+
+def test_binary_from_movie(tmp_path):
+    name = str(tmp_path / "movie.bin")
+    frames = make_frames(10)
+    moviefile.write_movie_file(
+        name, io.BytesIO(b"".join(frames)), NUM_LEDS, LED_BYTES, 10
+    )
+    info, read = moviefile.read_movie_frames(name)
+    assert (info["numframes"], info["fps"]) == (10, 10)
+    assert list(read) == frames
+
+
+def test_truncated_file(tmp_path):
+    name = str(tmp_path / "movie.bin")
+    moviefile.write_movie_file(name, make_frames(10), NUM_LEDS, LED_BYTES, 10)
+    with open(name, "r+b") as f:
+        f.truncate(moviefile.HEADER_SIZE + 9 * NUM_LEDS * LED_BYTES)
+    with pytest.raises(ValueError):
+        moviefile.MovieFile(name)
+
+
+def test_binary_checksum(tmp_path):
+    name = str(tmp_path / "movie.bin")
+    moviefile.write_movie_file(name, make_frames(10), NUM_LEDS, LED_BYTES, 10)
+    with open(name, "r+b") as f:
+        f.seek(moviefile.HEADER_SIZE + 5)
+        byte = f.read(1)
+        f.seek(moviefile.HEADER_SIZE + 5)
+        f.write(bytes([byte[0] ^ 1]))
+    info, read = moviefile.read_movie_frames(name)
+    with pytest.raises(ValueError):
+        list(read)
+
+
+@pytest.mark.parametrize("codec", sorted(moviefile.CODECS))
+def test_compressed_round_trip(tmp_path, codec):
+    name = str(tmp_path / "movie.xz")
+    frames = make_frames(150)
+    moviefile.write_compressed_movie(
+        name, frames, NUM_LEDS, LED_BYTES, 8, codec=codec, interval=64
+    )
+    assert moviefile.is_compressed_movie_file(name)
+    assert not moviefile.is_movie_file(name)
+    info, read = moviefile.read_movie_frames(name)
+    assert (info["numframes"], info["fps"], info["profile"]) == (150, 8, "RGBW")
+    assert list(read) == frames
+
+
+def test_compressed_checksum(tmp_path):
+    name = str(tmp_path / "movie.xz")
+    moviefile.write_compressed_movie(name, make_frames(20), NUM_LEDS, LED_BYTES, 8)
+    with open(name, "r+b") as f:
+        f.seek(36)
+        crc = f.read(1)
+        f.seek(36)
+        f.write(bytes([crc[0] ^ 1]))
+    info, read = moviefile.read_compressed_movie(name)
+    with pytest.raises(ValueError):
+        list(read)
+
+
+def test_compressed_unknown_codec(tmp_path):
+    name = str(tmp_path / "movie.xz")
+    moviefile.write_compressed_movie(name, make_frames(5), NUM_LEDS, LED_BYTES, 8)
+    with open(name, "r+b") as f:
+        f.seek(40)
+        f.write(b"\x09")
+    with pytest.raises(ValueError):
+        moviefile.read_compressed_movie(name)
+
+
+def test_convert_between_formats(tmp_path):
+    frames = make_frames(30)
+    names = [str(tmp_path / name) for name in ("a.bin", "b.xz", "c.txt", "d.bin")]
+    moviefile.write_movie_file(names[0], frames, NUM_LEDS, LED_BYTES, 10)
+    moviefile.convert_movie_file(names[0], names[1], codec="zlib")
+    moviefile.convert_movie_file(names[1], names[2], format="text")
+    moviefile.convert_movie_file(names[2], names[3])
+    assert not moviefile.is_movie_file(names[2])
+    for name in names:
+        info, read = moviefile.read_movie_frames(name)
+        assert list(read) == frames
+    assert moviefile.read_movie_frames(names[1])[0]["profile"] == "RGBW"
+    assert os.path.getsize(names[1]) < os.path.getsize(names[0])
+
+
+@pytest.mark.parametrize(
+    "format, codec", [("binary", None), ("text", None), ("binary", "zlib")]
+)
+def test_save_and_load(tmp_path, format, codec):
+    name = str(tmp_path / "movie")
+    geom = DeviceGeometry(20, 4)
+    movie = geom.make_func_movie(4, lambda i: geom.make_solid_pattern((i, 1, 2)))
+    geom.save_movie(name, movie, 8, format=format, codec=codec)
+    loaded, fps = geom.load_movie(name)
+    assert fps == 8
+    assert loaded.getvalue() == movie.getvalue()
+
+
+def test_save_defaults_to_text(tmp_path):
+    name = str(tmp_path / "movie")
+    geom = DeviceGeometry(20, 4)
+    geom.save_movie(name, geom.to_movie(geom.make_solid_pattern((1, 2, 3))), 8)
+    assert not moviefile.is_movie_file(name)
+    with open(name) as f:
+        assert f.readline() == "1 20 4 8\n"
+    with pytest.raises(ValueError):
+        geom.save_movie(name, io.BytesIO(), 8, format="mp4")
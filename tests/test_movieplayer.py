@@ -0,0 +1,133 @@
+"""
+Playing movie files from disk in real time on a DeviceEmulator.
+"""
+
+import time
+
+import pytest
+
+pytest.importorskip("xled")
+
+from xled_plus.emulator import DeviceEmulator
+from xled_plus.movieplayer import MoviePlayer
+
+
+@pytest.fixture
+def emu():
+    with DeviceEmulator(num_leds=100) as emu:
+        yield emu
+
+
+def write_movie(ctr, path, numframes):
+    movie = ctr.make_func_movie(
+        numframes, lambda i: ctr.make_solid_pattern((i % 256, i // 256, 7))
+    )
+    with open(path, "wb") as f:
+        f.write(movie.getvalue())
+    return movie.getvalue()
+
+
+def test_frames_are_played_in_time(emu, tmp_path):
+    ctr = emu.connect()
+    path = str(tmp_path / "movie.raw")
+    data = write_movie(ctr, path, 30)
+    with MoviePlayer(ctr, path, 25, loop=False) as player:
+        player.play()
+        stats = player.get_stats()
+    assert emu.wait_rt_frames(30)
+    assert b"".join(frame for t, frame in emu.rt_frames) == data
+    times = [t for t, frame in emu.rt_frames]
+    assert abs((times[-1] - times[0]) / 29 - 0.04) < 0.004
+    assert stats["sent"] == 30
+    assert stats["dropped"] == 0
+
+
+def test_loop_and_offset(emu, tmp_path):
+    ctr = emu.connect()
+    path = str(tmp_path / "movie.raw")
+    with open(path, "wb") as f:
+        f.write(b"HEADER")
+    data = write_movie(ctr, path + ".tmp", 10)
+    with open(path, "ab") as f:
+        f.write(data)
+    with MoviePlayer(ctr, path, 50, offset=6) as player:
+        assert player.numframes == 10
+        player.play(numframes=15, start=5)
+    assert emu.wait_rt_frames(15)
+    frames = [frame for t, frame in emu.rt_frames]
+    assert [frame[0] for frame in frames] == [(5 + i) % 10 for i in range(15)]
+
+
+def test_binary_movie_file(emu, tmp_path):
+    ctr = emu.connect()
+    path = str(tmp_path / "movie.bin")
+    movie = ctr.make_func_movie(12, lambda i: ctr.make_solid_pattern((i, 0, 0)))
+    ctr.save_movie(path, movie, 40, format="binary")
+    with MoviePlayer(ctr, path, loop=False) as player:
+        assert (player.numframes, player.fps) == (12, 40)
+        player.play()
+    assert emu.wait_rt_frames(12)
+    assert b"".join(frame for t, frame in emu.rt_frames) == movie.getvalue()
+
+
+class SlowFrameDevice(object):
+    """
+    Stands in for a controller, taking long to send one of the frames.
+    """
+
+    def __init__(self, num_leds, slow_index, delay):
+        self.num_leds = num_leds
+        self.led_bytes = 3
+        self.slow_index = slow_index
+        self.delay = delay
+        self.sent = []
+
+    def show_rt_frame(self, frame):
+        self.sent.append(frame[0])
+        if frame[0] == self.slow_index:
+            time.sleep(self.delay)
+
+
+def test_pages_are_released_after_dropped_wrap(tmp_path):
+    dev = SlowFrameDevice(100000, 9, 0.1)
+    path = str(tmp_path / "movie.raw")
+    with open(path, "wb") as f:
+        for i in range(10):
+            f.write(bytes([i]) * 300000)
+    with MoviePlayer(dev, path, 50) as player:
+        released = []
+        release = player.release
+
+        def record(num):
+            release(num)
+            released.append(player.released)
+
+        player.release = record
+        player.play(numframes=16)
+    # Frame 9 takes 5 periods, so the loop restarts at a later frame
+    assert dev.sent[:10] == list(range(10))
+    assert 0 not in dev.sent[10:]
+    assert min(released[10:]) < max(released[:10])
+
+
+def test_empty_movie_is_rejected(emu, tmp_path):
+    ctr = emu.connect()
+    path = str(tmp_path / "movie.raw")
+    with open(path, "wb") as f:
+        f.write(b"\0" * 100)
+    with pytest.raises(ValueError):
+        MoviePlayer(ctr, path, 25)
+
+
+def test_close_while_playing(emu, tmp_path):
+    ctr = emu.connect()
+    path = str(tmp_path / "movie.raw")
+    write_movie(ctr, path, 10)
+    player = MoviePlayer(ctr, path, 50)
+    player.start()
+    assert emu.wait_rt_frames(5)
+    player.close()
+    sent = player.get_stats()["sent"]
+    time.sleep(0.1)
+    assert player.get_stats()["sent"] == sent
+    assert player.job.done()
@@ -0,0 +1,122 @@
+"""
+Re-packing the movies of a DeviceEmulator when a new movie does not fit.
+"""
+
+import time
+
+import pytest
+
+pytest.importorskip("xled")
+
+from xled_plus.emulator import DeviceEmulator
+from xled_plus.highcontrol import HighControlInterface
+from xled_plus.moviecache import MovieCache
+
+
+def make_movie(ctr, numframes, k=0):
+    return ctr.make_func_movie(numframes, lambda i: ctr.make_solid_pattern((k, i, 0)))
+
+
+def request_stats(ctr, method, endpoint):
+    return ctr.get_http_stats().get((method, endpoint), {"count": 0, "sent": 0})
+
+
+@pytest.fixture
+def emu():
+    with DeviceEmulator(num_leds=50, max_frames=100) as emu:
+        yield emu
+
+
+def test_movie_cache_argument():
+    assert HighControlInterface("host").movie_cache.keep_fraction == 0.0
+    assert HighControlInterface("host", movie_cache=True).movie_cache.policy == "lfu"
+    assert HighControlInterface("host", movie_cache=None).movie_cache is None
+
+
+def test_make_room_clears_without_cache(emu):
+    ctr = emu.connect()
+    ctr.movie_cache = None
+    for k in range(3):
+        ctr.show_movie(make_movie(ctr, 40, k), 10)
+    assert request_stats(ctr, "DELETE", "movies")["count"] == 1
+    assert request_stats(ctr, "POST", "movies/full")["count"] == 3
+    assert len(emu.movies) == 1
+
+
+def test_make_room_keeps_used_movies(emu):
+    ctr = emu.connect()
+    ctr.movie_cache = MovieCache(keep_fraction=0.5)
+    often = make_movie(ctr, 20, 0)
+    ctr.show_movie(often, 10)
+    ctr.show_movie(make_movie(ctr, 30, 1), 10)
+    ctr.show_movie(often, 10)
+    ctr.show_movie(make_movie(ctr, 60, 2), 10)
+    stats = ctr.movie_cache.get_stats()
+    assert stats["repacks"] == 1
+    assert stats["reuploads"] == 1
+    assert stats["reuploaded_bytes"] == 20 * 50 * 3
+    assert request_stats(ctr, "POST", "movies/full")["count"] == 4
+    assert ctr.find_movie(ctr.movie_unique_id(often, 10)) is not None
+    assert len(emu.movies) == 2
+    assert emu.mode == "movie"
+
+
+def test_make_room_keeps_playlist(emu):
+    ctr = emu.connect()
+    assert ctr.movie_cache.keep_fraction == 0.0
+    ids = [ctr.upload_movie(make_movie(ctr, 15, k), 10) for k in range(2)]
+    ctr.show_playlist(ids, 5)
+    ctr.upload_movie(make_movie(ctr, 30, 2), 10)
+    ctr.upload_movie(make_movie(ctr, 50, 3), 10, force=True)
+    stats = ctr.movie_cache.get_stats()
+    assert stats["repacks"] == 1
+    assert stats["reuploads"] == 2
+    assert len(emu.movies) == 3
+    assert len(emu.playlist) == 2
+    assert emu.mode == "playlist"
+
+
+def test_make_room_skips_movies_used_once(emu):
+    ctr = emu.connect()
+    ctr.movie_cache = MovieCache()
+    for k in range(6):
+        ctr.show_movie(make_movie(ctr, 30, k), 10)
+    stats = ctr.movie_cache.get_stats()
+    assert stats["repacks"] == 1
+    assert stats["reuploads"] == 0
+    assert request_stats(ctr, "POST", "movies/full")["count"] == 6
+
+
+def test_oversize_movie_is_streamed(emu):
+    ctr = emu.connect()
+    movie = make_movie(ctr, 120, 1)
+    assert ctr.show_movie(movie, 25, stream=True) is True
+    try:
+        assert emu.wait_rt_frames(5)
+    finally:
+        ctr.turn_off()
+    time.sleep(0.05)
+    sent = len(emu.rt_frames)
+    time.sleep(0.2)
+    assert len(emu.rt_frames) == sent
+    assert emu.mode == "off"
+    assert [frame for t, frame in emu.rt_frames][:5] == [
+        movie.getvalue()[i * 150 : i * 150 + 150] for i in range(5)
+    ]
+    assert request_stats(ctr, "POST", "movies/full")["count"] == 0
+
+
+def test_show_stops_streaming(emu):
+    ctr = emu.connect()
+    ctr.show_movie(make_movie(ctr, 120, 1), 25, stream=True)
+    assert emu.wait_rt_frames(2)
+    ctr.show_movie(make_movie(ctr, 20, 2), 10)
+    time.sleep(0.2)
+    assert emu.mode == "movie"
+
+
+def test_movie_that_fits_is_uploaded(emu):
+    ctr = emu.connect()
+    ctr.show_movie(make_movie(ctr, 90, 1), 10, stream=True)
+    assert request_stats(ctr, "POST", "movies/full")["count"] == 1
+    assert emu.mode == "movie"
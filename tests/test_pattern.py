@@ -0,0 +1,62 @@
+"""
+The bytearray backed Pattern behaves like the list-of-pixels patterns.
+"""
+
+import pytest
+
+from xled_plus.pattern import Pattern, reverse_pixels
+
+
+def test_pixels():
+    pat = Pattern(4, 3)
+    assert len(pat) == 4
+    assert bytes(pat) == bytes(12)
+    pat[1] = b"\x01\x02\x03"
+    pat.set_pixel(2, (4, 5, 6))
+    assert pat[1] == b"\x01\x02\x03"
+    assert pat[-2] == b"\x04\x05\x06"
+    assert pat.get_pixel(2) == (4, 5, 6)
+    assert list(pat) == [bytes(3), b"\x01\x02\x03", b"\x04\x05\x06", bytes(3)]
+    with pytest.raises(IndexError):
+        pat[4]
+
+
+def test_rgbw_pixels():
+    pat = Pattern(2, 4)
+    pat.set_pixel(1, (7, 8, 9))
+    assert pat[1] == b"\x00\x07\x08\x09"
+    assert pat.get_pixel(1) == (7, 8, 9)
+
+
+def test_slices():
+    pat = Pattern(5, 3, bytes(range(15)))
+    assert pat[1:3] == Pattern(2, 3, bytes(range(3, 9)))
+    assert bytes(pat[::2]) == bytes(range(0, 3)) + bytes(range(6, 9)) + bytes(
+        range(12, 15)
+    )
+    pat[0:2] = Pattern(2, 3)
+    assert bytes(pat[0:2]) == bytes(6)
+    copy = pat.copy()
+    copy[4] = bytes(3)
+    assert pat[4] == bytes(range(12, 15))
+
+
+def test_reverse_pixels():
+    assert reverse_pixels(bytes(range(8)), 4) == bytes([4, 5, 6, 7, 0, 1, 2, 3])
+
+
+def test_array_shares_memory():
+    np = pytest.importorskip("numpy")
+    pat = Pattern(3, 4)
+    pat.array[:, 1:] = np.array([1, 2, 3], dtype=np.uint8)
+    assert pat[2] == b"\x00\x01\x02\x03"
+
+
+def test_concatenation():
+    pat = Pattern(3, 3, bytes(range(9)))
+    assert pat[:2] + pat[2:] == pat
+    assert bytes(pat[1:] + [b"\x09\x09\x09"]) == bytes(range(3, 9)) + b"\x09" * 3
+    assert bytes([b"\x09\x09\x09"] + pat[:1]) == b"\x09" * 3 + bytes(range(3))
+    assert len(pat + pat) == 6
+    with pytest.raises(TypeError):
+        pat + 1
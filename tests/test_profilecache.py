@@ -0,0 +1,63 @@
+"""
+Device profiles read from an on-disk ProfileCache instead of the device.
+"""
+
+import pytest
+
+pytest.importorskip("xled")
+
+from xled_plus.emulator import DeviceEmulator
+from xled_plus.highcontrol import HighControlInterface
+from xled_plus.profilecache import ProfileCache
+
+
+def test_profile_is_cached(tmp_path):
+    cache = ProfileCache(str(tmp_path / "profiles.json"))
+    with DeviceEmulator(num_leds=120, profile="RGBW", version="2.5.6") as emu:
+        ctr = HighControlInterface(emu.address, profile_cache=cache)
+        assert ctr.get_http_stats() == {}
+        assert (ctr.num_leds, ctr.led_bytes, ctr.version) == (120, 4, (2, 5, 6))
+        assert ctr.hw_address == emu.mac
+        ctr.fetch_layout()
+        assert ("GET", "gestalt") in ctr.get_http_stats()
+        for hw_address in (emu.mac, None):
+            ctr = HighControlInterface(emu.address, hw_address, profile_cache=cache)
+            assert (ctr.num_leds, ctr.led_bytes, ctr.family) == (120, 4, "G")
+            ctr.fetch_layout()
+            assert len(ctr.layout) == 120
+            # Looked up by host, the address is checked by logging in
+            assert set(ctr.get_http_stats()) <= {("POST", "login"), ("POST", "verify")}
+            assert bool(ctr.get_http_stats()) == (hw_address is None)
+            ctr.load_profile(refresh=True)
+            assert ("GET", "gestalt") in ctr.get_http_stats()
+
+
+def test_profile_of_another_device_is_dropped(tmp_path):
+    cache = ProfileCache(str(tmp_path / "profiles.json"))
+    with DeviceEmulator(num_leds=120) as emu:
+        prof = {
+            "mac": "aa:bb:cc:dd:ee:ff",
+            "num_leds": 10,
+            "led_bytes": 3,
+            "family": "G",
+            "led_profile": "RGB",
+            "version": "2.5.6",
+            "string_config": [{"first_led_id": 0, "length": 10}],
+        }
+        cache.put(emu.address, prof["mac"], prof)
+        ctr = HighControlInterface(emu.address, profile_cache=cache)
+        assert ctr.num_leds == 120
+        assert ctr.hw_address == emu.mac
+        assert cache.get(emu.address)["mac"] == emu.mac
+        assert cache.get(emu.address, prof["mac"]) is None
+
+
+def test_stale_entries_are_ignored(tmp_path):
+    cache = ProfileCache(str(tmp_path / "profiles.json"), ttl=-1)
+    cache.put("10.0.0.2", "AA:BB:CC:DD:EE:FF", {"num_leds": 10})
+    assert cache.get("10.0.0.2", "aa:bb:cc:dd:ee:ff") is None
+    cache.ttl = 3600
+    assert cache.get("10.0.0.2", "aa:bb:cc:dd:ee:ff") == {"num_leds": 10}
+    assert cache.get("10.0.0.2") == {"num_leds": 10}
+    cache.remove(host="10.0.0.2")
+    assert cache.get("10.0.0.2") is None
@@ -0,0 +1,80 @@
+"""
+Real time frames in protocol versions 1, 2 and 3, received by a
+DeviceEmulator.
+"""
+
+import pytest
+
+pytest.importorskip("xled")
+
+from xled_plus.emulator import DeviceEmulator
+
+
+@pytest.mark.parametrize(
+    "family, version, num_leds",
+    [
+        ("D", "1.99.20", 200),
+        ("G", "2.3.8", 600),
+        ("G", "2.8.3", 1000),
+    ],
+)
+def test_frames_are_reassembled(family, version, num_leds):
+    with DeviceEmulator(num_leds=num_leds, family=family, version=version) as emu:
+        ctr = emu.connect()
+        frames = [
+            ctr.make_func_pattern(lambda i: (i % 256, k, (i * k) % 256))
+            for k in range(3)
+        ]
+        for k, pat in enumerate(frames):
+            ctr.show_rt_frame(pat)
+            assert emu.wait_rt_frames(k + 1)
+        assert [frame for t, frame in emu.rt_frames] == [
+            bytes(pat.data) for pat in frames
+        ]
+        assert emu.rt_rejected == 0
+        assert emu.mode == "rt"
+
+
+def test_geometry_frames():
+    with DeviceEmulator(num_leds=300, profile="RGBW") as emu:
+        ctr = emu.connect()
+        geom = ctr.get_geometry()
+        pat = geom.make_layout_pattern(lambda pos, i: (i % 256, 0, 1), index=True)
+        ctr.show_rt_frame(pat)
+        assert emu.wait_rt_frames(1)
+        assert emu.rt_frames[0][1] == bytes(pat.data)
+
+
+@pytest.mark.parametrize(
+    "family, version, num_leds, protocol",
+    [
+        ("D", "1.99.20", 200, 1),
+        ("G", "2.3.8", 600, 2),
+        ("G", "2.8.3", 1000, 3),
+    ],
+)
+def test_frame_data_is_sent_as_is(family, version, num_leds, protocol):
+    with DeviceEmulator(num_leds=num_leds, family=family, version=version) as emu:
+        ctr = emu.connect()
+        assert ctr.rt_protocol_version() == protocol
+        data = bytearray(range(256)) * (num_leds * 3 // 256 + 1)
+        data = data[: num_leds * 3]
+        ctr.show_rt_frame(memoryview(data))
+        ctr.show_rt_frame(bytes(data[::-1]))
+        assert emu.wait_rt_frames(2)
+        assert [frame for t, frame in emu.rt_frames] == [
+            bytes(data),
+            bytes(data[::-1]),
+        ]
+        assert emu.rt_rejected == 0
+
+
+def test_pattern_is_sent_without_movie(monkeypatch):
+    with DeviceEmulator(num_leds=50) as emu:
+        ctr = emu.connect()
+        monkeypatch.setattr(ctr, "to_movie", None)
+        pat = ctr.make_func_pattern(lambda i: (i, 2 * i, 255 - i))
+        ctr.show_rt_frame(pat)
+        ctr.show_rt_frame(list(pat))
+        assert emu.wait_rt_frames(2)
+        assert [frame for t, frame in emu.rt_frames] == [bytes(pat.data)] * 2
@@ -0,0 +1,149 @@
+"""
+Timing of real time effects played by a FrameScheduler, as recorded by a
+DeviceEmulator.
+"""
+
+import time
+
+import pytest
+
+pytest.importorskip("xled")
+
+from xled_plus.effect_base import Effect
+from xled_plus.emulator import DeviceEmulator
+from xled_plus.scheduler import FrameScheduler
+
+
+class Counter(Effect):
+    """
+    Shows the frame number in the first led, optionally taking some time
+    to render every slow_every frame.
+    """
+
+    def __init__(self, ctr, render_time=0.0, slow_every=0, numframes=None):
+        super(Counter, self).__init__(ctr)
+        self.render_time = render_time
+        self.slow_every = slow_every
+        self.numframes = numframes
+
+    def reset(self, numframes=False):
+        self.num = 0
+
+    def getnext(self):
+        if self.num == self.numframes:
+            return None
+        if self.slow_every and self.num % self.slow_every == self.slow_every - 1:
+            time.sleep(self.render_time)
+        pat = self.ctr.make_solid_pattern((0, 0, 0))
+        pat.set_pixel(0, (self.num % 256, self.num // 256, 0))
+        self.num += 1
+        return pat
+
+
+def frame_numbers(emu):
+    return [frame[0] + 256 * frame[1] for t, frame in emu.rt_frames]
+
+
+def intervals(emu):
+    times = [t for t, frame in emu.rt_frames]
+    return [b - a for a, b in zip(times, times[1:])]
+
+
+@pytest.fixture
+def emu():
+    with DeviceEmulator(num_leds=100) as emu:
+        yield emu
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = FrameScheduler()
+    yield scheduler
+    scheduler.stop()
+
+
+def test_frames_are_evenly_spaced(emu, scheduler):
+    ctr = emu.connect()
+    job = scheduler.add(Counter(ctr), fps=25)
+    assert emu.wait_rt_frames(30)
+    job.cancel()
+    steps = intervals(emu)[:29]
+    assert frame_numbers(emu)[:30] == list(range(30))
+    assert abs(sum(steps) / len(steps) - 0.04) < 0.004
+    assert max(steps) < 0.1
+
+
+def test_slow_frame_does_not_shift_schedule(emu, scheduler):
+    ctr = emu.connect()
+    job = scheduler.add(Counter(ctr, 0.07, 10), fps=20, lookahead=4)
+    assert emu.wait_rt_frames(40)
+    job.cancel()
+    times = [t for t, frame in emu.rt_frames][:40]
+    # Rendered ahead, so the slow frames neither delay nor drop any frames
+    assert frame_numbers(emu)[:40] == list(range(40))
+    assert abs((times[-1] - times[0]) / 39 - 0.05) < 0.005
+
+
+def test_skip_policy_keeps_schedule(emu, scheduler):
+    ctr = emu.connect()
+    job = scheduler.add(Counter(ctr, 0.2, 5), fps=20, lookahead=1, policy="skip")
+    assert emu.wait_rt_frames(20)
+    job.cancel()
+    steps = sorted(intervals(emu)[:19])
+    assert job.get_stats()["late"] > 0
+    # Between the stalls, frames still come at about one every 50 ms
+    assert abs(steps[len(steps) // 2] - 0.05) < 0.01
+
+
+def test_jobs_are_replaced_per_controller(emu, scheduler):
+    ctr = emu.connect()
+    first = scheduler.add(Counter(ctr), fps=20)
+    assert emu.wait_rt_frames(2)
+    second = scheduler.add(Counter(ctr), fps=20)
+    assert emu.wait_rt_frames(7)
+    assert first.future.cancelled() or first.done()
+    assert scheduler.jobs == [second]
+    scheduler.stop_all()
+    assert scheduler.jobs == []
+
+
+def test_render_ahead(emu, scheduler):
+    ctr = emu.connect()
+    job = scheduler.add(Counter(ctr, 0.1, 8), fps=20, ahead=8)
+    assert emu.wait_rt_frames(40)
+    job.cancel()
+    times = [t for t, frame in emu.rt_frames][:40]
+    assert frame_numbers(emu)[:40] == list(range(40))
+    assert abs((times[-1] - times[0]) / 39 - 0.05) < 0.005
+    stats = job.get_stats()
+    assert stats["underruns"] == 0
+    assert stats["render_max"] >= 0.1
+
+
+def test_thread_lives_while_jobs_play(emu, scheduler):
+    ctr = emu.connect()
+    job = scheduler.add(Counter(ctr), fps=20)
+    assert emu.wait_rt_frames(2)
+    thread = scheduler.thread
+    assert thread.is_alive() and not thread.daemon
+    scheduler.join(0.2)
+    assert thread.is_alive()
+    job.cancel()
+    scheduler.join(2.0)
+    assert not thread.is_alive()
+    # Adding a job again starts a new thread
+    scheduler.add(Counter(ctr), fps=20)
+    assert emu.wait_rt_frames(emu.rt_frame_count + 2)
+    assert scheduler.thread is not thread
+
+
+@pytest.mark.parametrize("ahead", [0, 4])
+def test_job_ends_with_effect(emu, scheduler, ahead):
+    ctr = emu.connect()
+    job = scheduler.add(Counter(ctr, numframes=6), fps=50, ahead=ahead)
+    assert job.wait(5.0)
+    assert emu.wait_rt_frames(6)
+    time.sleep(0.1)
+    assert frame_numbers(emu) == list(range(6))
+    assert job.get_stats()["sent"] == 6
+    assert not scheduler.jobs
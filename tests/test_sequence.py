@@ -0,0 +1,64 @@
+"""
+Sequences looked up in a precomputed texture are close to the exact colors.
+"""
+
+import pytest
+
+from xled_plus import sequence
+from xled_plus.geometry import DeviceGeometry
+from xled_plus.ledcolor import hsl_color
+
+COLORS = [hsl_color(h, 1.0, 0.0) for h in (0.0, 0.3, 0.6)]
+
+
+def exact_frames(seq, numframes):
+    seq.reset(numframes)
+    frames = []
+    for i in range(numframes):
+        seq.update(1.0 / seq.preferred_fps)
+        frames.append(
+            seq.ctr.make_layout_pattern(
+                lambda pos: seq.seqfunc((seq.dot(seq.vect, pos) + seq.currpos) % 1.0),
+                style="centered",
+            )
+        )
+    return frames
+
+
+def frames(seq, numframes):
+    seq.reset(numframes)
+    return [seq.getnext() for i in range(numframes)]
+
+
+@pytest.mark.parametrize("numpy", [True, False])
+def test_gradient_is_close(monkeypatch, numpy):
+    if numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(sequence, "np", None)
+    geom = DeviceGeometry(200)
+    seq = sequence.GradientSequence(geom, COLORS, speed=0.3, folds=2.0)
+    for pat, exact in zip(frames(seq, 40), exact_frames(seq, 40)):
+        assert max(abs(a - b) for a, b in zip(pat.data, exact.data)) <= 1
+
+
+@pytest.mark.parametrize("numpy", [True, False])
+def test_bands_differ_only_at_edges(monkeypatch, numpy):
+    if numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(sequence, "np", None)
+    geom = DeviceGeometry(200)
+    seq = sequence.ColorSequence(geom, COLORS, speed=0.3, folds=2.0)
+    for pat, exact in zip(frames(seq, 40), exact_frames(seq, 40)):
+        assert sum(a != b for a, b in zip(pat, exact)) <= 2
+
+
+def test_numpy_matches_python(monkeypatch):
+    pytest.importorskip("numpy")
+    geom = DeviceGeometry(200)
+    seq = sequence.SpectrumSequence(geom)
+    with_numpy = frames(seq, 30)
+    monkeypatch.setattr(sequence, "np", None)
+    seq = sequence.SpectrumSequence(geom)
+    assert frames(seq, 30) == with_numpy
@@ -10,6 +10,12 @@ As outer API, i.e to users of an effect, it provides these functions:
 'save_movie()' to create a movie of the effect and save it to file for later use.
 'launch_rt()' for playing the effect in real time.
 'stop_rt()' for stopping the currently played real time effect.
+MovieEffect plays a ready made movie as an effect.
+Real time effects are played by a FrameScheduler (see scheduler.py), by
+default a shared one running in a background thread. Several effects can
+play at the same time on different controllers. With 'launch_rt(ahead=N)'
+the frames are rendered N frames ahead in a separate thread (see
+RenderAhead), which hides occasional slow frames.
 
 As inner API, i.e for communicating with its subclasses, it requires each subclass
 to provide two functions:
@@ -23,33 +29,147 @@ required for the movie (then typically the same as 'preferred_frames') or False
 if a real time effect is requested. If there is a non-False numframes, 'reset'
 should try to set up data structures to make sure that after this many frames
 the movie will seamlessly return to the first frame.
+In real time, 'getnext()' may also return the frame data as bytes or a
+memoryview, which is sent as is, or None when the effect has ended.
 """
 
-import sys
+import collections
+import threading
 import time
 
-if sys.version_info.major == 2:
-    from threading import _Timer
+perf_counter = getattr(time, "perf_counter", time.time)
 
-    TimerX = _Timer
-else:
-    from threading import Timer
 
-    TimerX = Timer
+def percentile(times, p):
+    """
+    Returns the p:th percentile (0.0 - 1.0) of a sorted list of times, or
+    0.0 if the list is empty.
+    """
+    return times[min(len(times) - 1, int(p * len(times)))] if times else 0.0
 
 
-class RepeatedTimer(TimerX):
-    def run(self):
-        lasttime = time.time()
-        self.function(*self.args, **self.kwargs)
-        while not self.finished.wait(
-            max(0.0, self.interval - (time.time() - lasttime))
-        ):
-            lasttime = time.time()
-            self.function(*self.args, **self.kwargs)
+def get_scheduler():
+    # Imported here, since the scheduler requires asyncio
+    from xled_plus.scheduler import get_default_scheduler
 
+    return get_default_scheduler()
 
-effect_timer = None
+
+class RenderAhead(object):
+    """
+    Renders the frames of an effect ahead of time in a producer thread,
+    into a ring buffer of encoded frames. The consumer takes frames with
+    pop, which never blocks. An empty buffer when a frame is needed counts
+    as an underrun.
+
+    :param effect: the Effect to render
+    :param ctr: controller (or geometry) the frames are encoded for
+    :param int depth: number of frames in the ring buffer
+    """
+
+    def __init__(self, effect, ctr=None, depth=8):
+        self.effect = effect
+        self.ctr = ctr or effect.ctr
+        self.depth = max(1, depth)
+        framesize = self.ctr.num_leds * self.ctr.led_bytes
+        self.slots = [bytearray(framesize) for i in range(self.depth)]
+        self.head = 0  # next slot to read
+        self.count = 0  # number of filled slots
+        self.cond = threading.Condition()
+        self.thread = None
+        self.running = False
+        self.ended = False
+        self.error = None
+        self.rendered = 0
+        self.popped = 0
+        self.underruns = 0
+        self.render_times = collections.deque(maxlen=1000)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.produce)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self, wait=False):
+        """
+        Stops the producer thread. Unless wait is set, it does not wait for
+        a frame being rendered to finish.
+        """
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if wait and self.thread:
+            self.thread.join()
+        self.thread = None
+
+    def produce(self):
+        while True:
+            with self.cond:
+                while self.running and self.count == self.depth:
+                    self.cond.wait()
+                if not self.running:
+                    return
+                slot = self.slots[(self.head + self.count) % self.depth]
+            t0 = perf_counter()
+            try:
+                pat = self.effect.getnext()
+                if pat is None:
+                    self.ended = True
+                    self.running = False
+                    return
+                slot[:] = self.ctr.frame_data(pat)
+            except Exception as e:
+                self.error = e
+                self.running = False
+                return
+            self.render_times.append(perf_counter() - t0)
+            with self.cond:
+                self.count += 1
+                self.rendered += 1
+
+    def pop(self):
+        """
+        Returns the next frame as bytes, or None if no frame is ready or
+        the effect has ended (then ended is set). Raises any exception from
+        the effect.
+
+        :rtype: bytes
+        """
+        with self.cond:
+            if self.count == 0:
+                if self.error:
+                    raise self.error
+                if not self.ended:
+                    self.underruns += 1
+                return None
+            frame = bytes(self.slots[self.head])
+            self.head = (self.head + 1) % self.depth
+            self.count -= 1
+            self.popped += 1
+            self.cond.notify()
+            return frame
+
+    def get_stats(self):
+        """
+        Returns the current buffer depth, frame counts, underruns, and the
+        50th, 90th and 99th percentile and max of recent render times in
+        seconds.
+
+        :rtype: dict
+        """
+        times = sorted(self.render_times)
+        return {
+            "depth": self.count,
+            "capacity": self.depth,
+            "rendered": self.rendered,
+            "popped": self.popped,
+            "underruns": self.underruns,
+            "render_p50": percentile(times, 0.5),
+            "render_p90": percentile(times, 0.9),
+            "render_p99": percentile(times, 0.99),
+            "render_max": times[-1] if times else 0.0,
+        }
 
 
 class Effect(object):
@@ -57,6 +177,7 @@ class Effect(object):
         self.ctr = ctr
         self.preferred_frames = 120
         self.preferred_fps = 8
+        self.rt_job = None
 
     def reset(self, numframes=False):
         pass  # provided by subclass
@@ -64,44 +185,86 @@ class Effect(object):
     def getnext(self):
         pass  # provided by subclass
 
-    def launch_rt(self):
-        global effect_timer
-
-        def doit():
-            self.ctr.show_rt_frame(self.getnext())
-
-        if effect_timer:
-            effect_timer.cancel()
-        effect_timer = RepeatedTimer(1.0 / self.preferred_fps, doit)
-        self.reset(False)
-        effect_timer.start()
+    def launch_rt(self, scheduler=None, **kwargs):
+        """
+        Plays the effect in real time, replacing any other real time effect
+        on the same controller. Keyword arguments (fps, policy, lookahead,
+        ahead) are passed on to FrameScheduler.add. With ahead=N frames are
+        rendered N frames ahead in a separate thread.
+        The effect plays in a background thread until stop_rt is called,
+        and the program does not exit while it plays.
+        """
+        self.stop_rt()
+        self.rt_job = (scheduler or get_scheduler()).add(self, **kwargs)
         return True
 
     def stop_rt(self):
-        global effect_timer
-        if effect_timer:
-            effect_timer.cancel()
-        effect_timer = None
+        if self.rt_job:
+            self.rt_job.cancel()
+        self.rt_job = None
+
+    def get_rt_stats(self):
+        """
+        Returns timing statistics of the currently playing real time
+        effect, or None if not playing.
+
+        :rtype: dict
+        """
+        return self.rt_job.get_stats() if self.rt_job else None
 
     def make_movie(self, numframes):
-        frames = []
+        # Each frame is written to the movie as it is produced, so the
+        # patterns are never all kept at the same time
         self.reset(numframes)
-        for i in range(numframes):
-            frames.append(self.getnext())
-        return self.ctr.to_movie(frames)
+        frames = (self.getnext() for i in range(numframes))
+        return self.ctr.to_movie(frames, numframes)
 
     def launch_movie(self):
         self.stop_rt()
+        get_scheduler().remove(self.ctr)
         self.ctr.show_movie(self.make_movie(self.preferred_frames), self.preferred_fps)
 
-    def save_movie(self, name):
+    def save_movie(self, name, format="text", codec=None):
         self.ctr.save_movie(
-            name, self.make_movie(self.preferred_frames), self.preferred_fps
+            name,
+            self.make_movie(self.preferred_frames),
+            self.preferred_fps,
+            format,
+            codec,
         )
 
 
+class MovieEffect(Effect):
+    """
+    Plays the frames of a ready made movie, looping. This is used to show
+    a movie in real time, eg one that does not fit on the device.
+
+    :param ctr: controller (or geometry) the movie is made for
+    :param movie: file-like object representing the movie
+    :param fps: frames per second
+    """
+
+    def __init__(self, ctr, movie, fps):
+        super(MovieEffect, self).__init__(ctr)
+        movie.seek(0)
+        self.data = movie.read()
+        movie.seek(0)
+        self.framesize = ctr.num_leds * ctr.led_bytes
+        self.preferred_frames = len(self.data) // self.framesize
+        self.preferred_fps = fps
+        self.index = 0
+
+    def reset(self, numframes=False):
+        self.index = 0
+
+    def getnext(self):
+        start = self.index * self.framesize
+        self.index = (self.index + 1) % self.preferred_frames
+        return self.data[start : start + self.framesize]
+
+
 def stop_rt():
-    global effect_timer
-    if effect_timer:
-        effect_timer.cancel()
-        effect_timer = None
+    """
+    Stops all real time effects played by the shared scheduler.
+    """
+    get_scheduler().stop_all()
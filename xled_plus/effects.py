@@ -21,8 +21,31 @@ from xled_plus.pattern import (
     random_hsl_color_func,
     sprinkle_pattern,
 )
-from xled_plus.ledcolor import hsl_color
+from xled_plus.ledcolor import hsl_color, default_model
 import random
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def cycle_steps(cycles, numframes):
+    """
+    Returns the periods (in frames) to use for the leds of the glowing and
+    breathing effects. Cycles is either one period or a range of periods
+    given by its first and last value. For a movie of numframes frames, the
+    periods in the range that divide numframes are used, if there are any.
+    """
+    if type(cycles) == int:
+        return [cycles]
+    steps = list(range(cycles[0], cycles[-1] + 1))
+    if numframes:
+        divisors = [n for n in steps if numframes % n == 0]
+        if divisors:
+            return divisors
+    return steps
 
 
 """
@@ -30,11 +53,14 @@ Glowing effect
 
 Similar to the Glow effect in the app, but seamless when it wraps around.
 Check out the specific examples: Charcoal, Fire, Water, Aurora, Meadow.
+With numpy, the state of all leds is kept in arrays and each frame is one
+blend over all leds, otherwise each led is a Glowbit.
 """
 
 
 class Glowbit:
-    def __init__(self, cols, bend, steps, initstep=False, loop=False):
+    def __init__(self, cols, bend, steps, initstep=False, loop=False, model=None):
+        self.hsl_color = model.hsl_color if model else hsl_color
         self.count = 0
         self.lastcol = (0, 0, 0)
         self.nextcol = (0, 0, 0)
@@ -45,10 +71,10 @@ class Glowbit:
         self.cols = cols
         self.bend = bend
         if self.loop:
-            self.initcol1 = hsl_color(
+            self.initcol1 = self.hsl_color(
                 *self.cols[int((random.random() ** self.bend) * len(self.cols))]
             )
-            self.initcol2 = hsl_color(
+            self.initcol2 = self.hsl_color(
                 *self.cols[int((random.random() ** self.bend) * len(self.cols))]
             )
             self.lastcol = self.initcol1
@@ -62,7 +88,7 @@ class Glowbit:
             elif self.loop and self.count + 2 * self.steps >= self.loop:
                 self.nextcol = self.initcol1
             else:
-                self.nextcol = hsl_color(
+                self.nextcol = self.hsl_color(
                     *self.cols[int((random.random() ** self.bend) * len(self.cols))]
                 )
             self.currind = 0
@@ -81,19 +107,19 @@ class GlowEffect(Effect):
         self.cycles = cycles
 
     def reset(self, numframes):
-        if type(self.cycles) == int:
-            steps = [self.cycles]
-        elif numframes:
-            steps = []
-            for n in range(self.cycles[0], self.cycles[-1] + 1):
-                if numframes % n == 0:
-                    steps.append(n)
-            if not steps:
-                steps = list(range(self.cycles[0], self.cycles[-1] + 1))
-        else:
-            steps = list(range(self.cycles[0], self.cycles[-1] + 1))
+        steps = cycle_steps(self.cycles, numframes)
         pr1 = 13 if len(steps) % 13 != 0 else 7
         pr2 = 11 if len(steps) % 11 != 0 else 7
+        if np is not None:
+            self.reset_arrays(
+                [steps[(i * pr1) % len(steps)] for i in range(self.ctr.num_leds)],
+                [
+                    (i * pr2) % steps[(i * pr1) % len(steps)]
+                    for i in range(self.ctr.num_leds)
+                ],
+                numframes,
+            )
+            return
         self.glowarray = [
             Glowbit(
                 self.cols,
@@ -101,12 +127,65 @@ class GlowEffect(Effect):
                 steps[(i * pr1) % len(steps)],
                 (i * pr2) % steps[(i * pr1) % len(steps)],
                 numframes,
+                self.ctr.color_model,
             )
             for i in range(self.ctr.num_leds)
         ]
 
+    def reset_arrays(self, steps, initsteps, numframes):
+        # Same state as in Glowbit, one array element per led. The palette
+        # is converted to rgb once, with black last for the start of an
+        # effect that does not loop.
+        model = self.ctr.color_model
+        self.rgbcols = np.array(
+            [model.hsl_color(*col) for col in self.cols] + [(0, 0, 0)], dtype=float
+        )
+        self.rng = np.random.RandomState(random.getrandbits(32))
+        self.loop = numframes
+        self.count = 0
+        self.steps = np.array(steps)
+        self.currind = np.where(initsteps, initsteps, steps)
+        num = self.ctr.num_leds
+        if self.loop:
+            self.initcol1 = self.random_cols(num)
+            self.initcol2 = self.random_cols(num)
+            self.lastcol = self.initcol1.copy()
+            self.nextcol = self.initcol2.copy()
+        else:
+            self.lastcol = np.full(num, len(self.cols))
+            self.nextcol = np.full(num, len(self.cols))
+
+    def random_cols(self, num):
+        return (self.rng.random_sample(num) ** self.bend * len(self.cols)).astype(int)
+
     def getnext(self):
-        return self.ctr.make_func_pattern(lambda i: self.glowarray[i].getnext())
+        if np is None:
+            return self.ctr.make_func_pattern(lambda i: self.glowarray[i].getnext())
+        change = np.flatnonzero(self.currind == self.steps)
+        if len(change):
+            self.lastcol[change] = self.nextcol[change]
+            cols = self.random_cols(len(change))
+            if self.loop:
+                steps = self.steps[change]
+                cols = np.where(
+                    self.count + steps >= self.loop,
+                    self.initcol2[change],
+                    np.where(
+                        self.count + 2 * steps >= self.loop,
+                        self.initcol1[change],
+                        cols,
+                    ),
+                )
+            self.nextcol[change] = cols
+            self.currind[change] = 0
+        self.currind += 1
+        self.count += 1
+        prop = (self.currind / self.steps.astype(float))[:, None]
+        last = self.rgbcols[self.lastcol]
+        rgb = np.rint(last + (self.rgbcols[self.nextcol] - last) * prop)
+        pat = self.ctr.make_pattern()
+        pat.array[:, -3:] = rgb
+        return pat
 
 
 class Charcoal(GlowEffect):
@@ -210,6 +289,13 @@ Sparkling effect
 Similar to the Bright Twinkle effect in the app, but more versatile.
 Again there are specific examples, but check out SparkleStars which has
 varied color temperature of whites, unlike the origonal.
+
+A step function can have a vectorized version as its attribute 'vector',
+taking an array of spark ages and an array of color descriptions, and
+returning an array of rgb colors and a boolean array of which sparks are
+done (as when the step function returns True), or None to fall back to
+calling the step function. The step functions below all have one, which
+is used when numpy is available.
 """
 
 
@@ -224,62 +310,113 @@ class SparkleEffect(Effect):
     def reset(self, numframes):
         self.pattern = self.ctr.make_solid_pattern(self.initialcol)
         self.time = -1
-        self.slist = []
-        self.olist = list(range(0, self.ctr.num_leds))
+        # Active sparks in parallel lists: led index, color description,
+        # start time, and the color last written to the led
+        self.sind = []
+        self.scol = []
+        self.stime = []
+        self.slast = []
+        # Idle leds, and the position of each led in the idle list (or -1),
+        # so that any led can be taken out in constant time
+        self.idle = list(range(0, self.ctr.num_leds))
+        self.idlepos = list(range(0, self.ctr.num_leds))
+        self.reserved = set()
         self.numframes = False  # intentionally set to False here
         if numframes:
             # walk a number of steps, count the sfunc cycle, and record the poisson outcomes
-            self.blocktime = {}
             tmp = self.newfunc(0, 0)
             while self.stepfunc(0, self.time + 1, tmp) not in [False, True]:
                 self.getnext()
             self.leadintime = self.time
-            self.leadin = [ele for ele in self.slist]
+            self.leadin = {}
+            for ind, coldesc, tm in zip(self.sind, self.scol, self.stime):
+                self.leadin.setdefault(tm, []).append((ind, coldesc))
+            self.leadinnext = 0
             self.numframes = numframes
 
+    def take_idle(self, pos):
+        # Removes and returns the idle led at pos, by moving the last one there
+        ind = self.idle[pos]
+        last = self.idle.pop()
+        if last != ind:
+            self.idle[pos] = last
+            self.idlepos[last] = pos
+        self.idlepos[ind] = -1
+        return ind
+
+    def release(self, ind):
+        if ind not in self.reserved:
+            self.idlepos[ind] = len(self.idle)
+            self.idle.append(ind)
+
+    def start_spark(self, ind, coldesc):
+        self.sind.append(ind)
+        self.scol.append(coldesc)
+        self.stime.append(self.time)
+        self.slast.append(None)
+
+    def remove_sparks(self, done):
+        # Removes the sparks at the positions in done, in increasing order,
+        # by moving the last ones there, and makes their leds idle
+        for pos in reversed(done):
+            self.release(self.sind[pos])
+            for lst in (self.sind, self.scol, self.stime, self.slast):
+                last = lst.pop()
+                if pos < len(lst):
+                    lst[pos] = last
+
     def getnext(self):
         self.time += 1
-        if self.numframes:
-            self.pattern = self.ctr.copy_pattern(self.pattern)  # only needed for movie
         if self.numframes and self.time >= self.numframes:
-            for (ind, coldesc, tm) in self.leadin:
-                if tm == self.time - self.numframes:
-                    self.slist.append((ind, coldesc, self.time))
+            for ind, coldesc in self.leadin.get(self.time - self.numframes, ()):
+                self.start_spark(ind, coldesc)
         else:
-            if self.numframes and self.time >= self.numframes - self.leadintime:
-                for (ind, coldesc, tm) in self.leadin:
-                    if (
-                        tm <= self.time - self.numframes + self.leadintime
-                        and ind in self.olist
-                    ):
-                        self.olist.remove(ind)
+            if self.numframes:
+                # Keep the leds of the lead in sparks free for when they restart
+                while self.leadinnext <= self.time - self.numframes + self.leadintime:
+                    for ind, coldesc in self.leadin.get(self.leadinnext, ()):
+                        self.reserved.add(ind)
+                        if self.idlepos[ind] >= 0:
+                            self.take_idle(self.idlepos[ind])
+                    self.leadinnext += 1
             n = randompoisson(self.freq)
             for j in range(n):
-                if self.olist:
-                    pos = random.randint(0, len(self.olist) - 1)
-                    ind = self.olist[pos]
-                    coldesc = self.newfunc(ind, self.time)
-                    self.slist.append((ind, coldesc, self.time))
-                    del self.olist[pos]
-        remlst = []
-        for pos, (ind, coldesc, stime) in enumerate(self.slist):
-            col = self.stepfunc(ind, self.time - stime, coldesc)
-            if col is False:
-                remlst.append(pos)
-                self.olist.append(ind)
-            elif col is True:
-                remlst.append(pos)
-                self.olist.append(ind)
-                self.ctr.modify_pattern(self.pattern, ind, self.initialcol)
-            else:
-                self.ctr.modify_pattern(self.pattern, ind, col)
-        for pos in reversed(sorted(remlst)):
-            del self.slist[pos]
+                if self.idle:
+                    ind = self.take_idle(random.randint(0, len(self.idle) - 1))
+                    self.start_spark(ind, self.newfunc(ind, self.time))
+        vector = getattr(self.stepfunc, "vector", None) if np is not None else None
+        if vector and self.sind:
+            res = vector(self.time - np.array(self.stime), np.array(self.scol, float))
+            if res is not None:
+                return self.patch_pattern(*res)
+        # Only the pixels whose color changed are written
+        set_pixel = self.pattern.set_pixel
+        done = []
+        for pos, ind in enumerate(self.sind):
+            col = self.stepfunc(ind, self.time - self.stime[pos], self.scol[pos])
+            if col is False or col is True:
+                if col is True and self.slast[pos] != self.initialcol:
+                    set_pixel(ind, self.initialcol)
+                done.append(pos)
+            elif col != self.slast[pos]:
+                set_pixel(ind, col)
+                self.slast[pos] = col
+        self.remove_sparks(done)
+        return self.pattern
+
+    def patch_pattern(self, cols, done):
+        # Writes the colors of all sparks at once, and removes those done.
+        # A led can have two sparks when a lead in spark restarts, and then
+        # the later one wins, as when calling the step function.
+        done = np.flatnonzero(done)
+        cols[done] = self.initialcol
+        self.pattern.array[self.sind, -3:] = cols
+        self.remove_sparks(done.tolist())
         return self.pattern
 
 
-def random_color_func(hue=False, sat=False, light=False):
-    return random_hsl_color_func(hue, sat, light)
+def random_color_func(hue=False, sat=False, light=False, model=None):
+    return random_hsl_color_func(hue, sat, light, model)
 
 
 def random_hs_func(hue=False, sat=False):
@@ -325,18 +462,20 @@ def circular_hs_func(cycle, dists=False, probs=False):
         return func2
 
 
-def circular_color_func(cycle, dists=False, probs=False, light=0.0):
+def circular_color_func(cycle, dists=False, probs=False, light=0.0, model=None):
     func = circular_hs_func(cycle, dists, probs)
-    return lambda ind, tm: hsl_color(*func(ind, tm), light)
+    hsl = model.hsl_color if model else hsl_color
+    return lambda ind, tm: hsl(*func(ind, tm), light)
 
 
-def tinted_white_func(hue1, depth1, hue2, depth2):
+def tinted_white_func(hue1, depth1, hue2, depth2, model=None):
     sc = depth1 + depth2
     mid = depth1 / sc
+    hsl = model.hsl_color if model else hsl_color
 
     def func(*args):
         r = random.random()
-        return hsl_color(hue1 if r < mid else hue2, 1.0, 1.0 - sc * abs(r - mid))
+        return hsl(hue1 if r < mid else hue2, 1.0, 1.0 - sc * abs(r - mid))
 
     return func
 
@@ -369,12 +508,26 @@ def pulselight_func(up, stable, down, initcol=(0, 0, 0), lin=False):
         else:
             return True
 
+    def vector(tm, rgb):
+        pr = np.where(
+            tm < up,
+            (tm + 1.0) / (up + 1.0),
+            np.where(tm < up + stable, 1.0, (tot - tm) / (down + 1.0)),
+        )
+        if not lin:
+            pr = pr * pr
+        return np.rint(init + (rgb - init) * pr[:, None]), tm >= tot
+
+    init = np.array(initcol, float) if np is not None else None
+    func.vector = vector
     return func
 
 
-def flashlight_func(stable, down, flashcol=False, initcol=(0, 0, 0), lin=False):
+def flashlight_func(
+    stable, down, flashcol=False, initcol=(0, 0, 0), lin=False, model=None
+):
     if not flashcol:
-        flashcol = hsl_color(0.0, 0.0, 1.0)
+        flashcol = (model or default_model).hsl_color(0.0, 0.0, 1.0)
     tot = 1 + stable + down
 
     def func(ind, tm, rgb):
@@ -388,39 +541,68 @@ def flashlight_func(stable, down, flashcol=False, initcol=(0, 0, 0), lin=False):
         else:
             return True
 
+    def vector(tm, rgb):
+        pr = (tot - tm) / (down + 1.0)
+        if not lin:
+            pr = pr * pr
+        cols = np.rint(init + (rgb - init) * pr[:, None])
+        cols = np.where((tm < 1 + stable)[:, None], rgb, cols)
+        cols = np.where((tm < 1)[:, None], flash, cols)
+        return cols, tm >= tot
+
+    init = np.array(initcol, float) if np is not None else None
+    flash = np.array(flashcol, float) if np is not None else None
+    func.vector = vector
     return func
 
 
-def looplight_func(up, down, sprop_up=1.0, sprop_down=0.0, lin=False):
+def looplight_func(up, down, sprop_up=1.0, sprop_down=0.0, lin=False, model=None):
     tot = up + down
+    model = model or default_model
+    hsl = model.hsl_color
 
     def func(ind, tm, hs):
         if tm < up:
             pr = (tm + 1.0) / up
             if not lin:
                 pr *= pr
-            return hsl_color(hs[0], hs[1] * sprop_up, 2 * pr - 1.0)
+            return hsl(hs[0], hs[1] * sprop_up, 2 * pr - 1.0)
         elif tm < tot:
             pr = (tot - tm) / down
             if not lin:
                 pr *= pr
-            return hsl_color(hs[0], hs[1] * sprop_down, 2 * pr - 1.0)
+            return hsl(hs[0], hs[1] * sprop_down, 2 * pr - 1.0)
         else:
             return True
 
+    def vector(tm, hs):
+        if model.lut is not None:
+            return None
+        rising = tm < up
+        pr = np.where(rising, (tm + 1.0) / up, (tot - tm) / down)
+        if not lin:
+            pr = pr * pr
+        sprop = np.where(rising, sprop_up, sprop_down)
+        cols = model.hsl_color_array(hs[:, 0], hs[:, 1] * sprop, 2 * pr - 1.0)
+        return cols, tm >= tot
+
+    func.vector = vector
     return func
 
 
 class SimpleBlink(SparkleEffect):
     def __init__(self, ctr):
         super(SimpleBlink, self).__init__(
-            ctr, 8, random_color_func(sat=1.0, light=0.0), pulselight_func(0, 1, 0)
+            ctr,
+            8,
+            random_color_func(sat=1.0, light=0.0, model=ctr.color_model),
+            pulselight_func(0, 1, 0),
         )
 
 
 class SimpleStars(SparkleEffect):
     def __init__(self, ctr):
-        white = hsl_color(0.0, 0.0, 1.0)
+        white = ctr.color_model.hsl_color(0.0, 0.0, 1.0)
         super(SimpleStars, self).__init__(
             ctr, 8, lambda *args: white, pulselight_func(0, 1, 0)
         )
@@ -429,32 +611,38 @@ class SimpleStars(SparkleEffect):
 class Pulselight(SparkleEffect):
     def __init__(self, ctr):
         super(Pulselight, self).__init__(
-            ctr, 3, random_color_func(light=0.0), pulselight_func(18, 4, 18)
+            ctr,
+            3,
+            random_color_func(light=0.0, model=ctr.color_model),
+            pulselight_func(18, 4, 18),
         )
         self.preferred_fps = 12
 
 
 class Looplight(SparkleEffect):
     def __init__(self, ctr, reverse=False):
+        model = ctr.color_model
         if reverse:
-            sfunc = looplight_func(8, 16, sprop_up=0.0, sprop_down=1.0)
+            sfunc = looplight_func(8, 16, sprop_up=0.0, sprop_down=1.0, model=model)
         else:
-            sfunc = looplight_func(16, 8)
+            sfunc = looplight_func(16, 8, model=model)
         super(Looplight, self).__init__(ctr, 4, random_hs_func(sat=[0.5, 1.0]), sfunc)
 
 
 class LooplightSpectrum(SparkleEffect):
     def __init__(self, ctr, cycle=240):
-        super(LooplightSpectrum, self).__init__(
-            ctr, 4, circular_hs_func(cycle), looplight_func(16, 8)
-        )
+        sfunc = looplight_func(16, 8, model=ctr.color_model)
+        super(LooplightSpectrum, self).__init__(ctr, 4, circular_hs_func(cycle), sfunc)
         self.preferred_frames = cycle
 
 
 class SparkleRandom(SparkleEffect):
     def __init__(self, ctr, hue=False, sat=False, light=False):
         super(SparkleRandom, self).__init__(
-            ctr, 3, random_color_func(hue, sat, light), pulselight_func(16, 8, 16)
+            ctr,
+            3,
+            random_color_func(hue, sat, light, ctr.color_model),
+            pulselight_func(16, 8, 16),
         )
         self.preferred_fps = 12
 
@@ -462,14 +650,17 @@ class SparkleRandom(SparkleEffect):
 class SparkleStars(SparkleEffect):
     def __init__(self, ctr):
         super(SparkleStars, self).__init__(
-            ctr, 3, tinted_white_func(0.0, 0.5, 0.5, 0.5), pulselight_func(16, 8, 16)
+            ctr,
+            3,
+            tinted_white_func(0.0, 0.5, 0.5, 0.5, ctr.color_model),
+            pulselight_func(16, 8, 16),
         )
         self.preferred_fps = 12
 
 
 class SparkleCP(SparkleEffect):
     def __init__(self, ctr, cols):
-        colsrgb = list(map(lambda hsl: hsl_color(*hsl), cols))
+        colsrgb = list(map(lambda hsl: ctr.color_model.hsl_color(*hsl), cols))
         super(SparkleCP, self).__init__(
             ctr, 3, selected_color_func(colsrgb), pulselight_func(16, 8, 16)
         )
@@ -480,11 +671,24 @@ class SparkleCP(SparkleEffect):
 Breathing effect
 
 Each led has a fixed color but slowly pulsing brightness.
+With numpy, the brightness over one period is tabulated once for each
+period in use, and each frame is a lookup in the tables and a multiply
+of the led colors, otherwise each led is a Breathbit.
 """
 
 
+def lcm(numbers):
+    res = 1
+    for n in numbers:
+        res = res * n // math.gcd(res, n)
+    return res
+
+
 class Breathbit:
-    def __init__(self, col, lspan, steps, stayhigh=0, staylow=0, initstep=False):
+    def __init__(
+        self, col, lspan, steps, stayhigh=0, staylow=0, initstep=False, model=None
+    ):
+        self.hsl_color = model.hsl_color if model else hsl_color
         self.currind = initstep if initstep else steps
         self.steps = steps
         self.hsteps = (steps - 1) / 2.0
@@ -494,7 +698,7 @@ class Breathbit:
         self.preferred_frames = 60
 
     def setcolor(self, col):
-        self.col = hsl_color(*col)
+        self.col = self.hsl_color(*col)
 
     def getnext(self):
         self.currind += 1
@@ -515,35 +719,91 @@ class BreathEffect(Effect):
         self.cycles = cycles
 
     def reset(self, numframes):
-        if type(self.cycles) == int:
-            steps = [self.cycles]
-        elif numframes:
-            steps = []
-            for n in range(self.cycles[0], self.cycles[-1] + 1):
-                if numframes % n == 0:
-                    steps.append(n)
-            if not steps:
-                steps = list(range(self.cycles[0], self.cycles[-1] + 1))
-        else:
-            steps = list(range(self.cycles[0], self.cycles[-1] + 1))
+        steps = cycle_steps(self.cycles, numframes)
         pr1 = 13 if len(steps) % 13 != 0 else 7
         pr2 = 11 if len(steps) % 11 != 0 else 7
-        colarray = [
-            self.cols[int((random.random() ** self.bend) * len(self.cols))]
+        colinds = [
+            int((random.random() ** self.bend) * len(self.cols))
             for i in range(self.ctr.num_leds)
         ]
+        colarray = [self.cols[ind] for ind in colinds]
+        ledsteps = [steps[(i * pr1) % len(steps)] for i in range(self.ctr.num_leds)]
+        if np is not None:
+            self.reset_tables(
+                colinds,
+                ledsteps,
+                [(i * pr2) % ledsteps[i] for i in range(self.ctr.num_leds)],
+            )
+            return
         self.brarray = [
             Breathbit(
                 colarray[i],
                 self.lspan,
                 steps[(i * pr1) % len(steps)],
                 initstep=(i * pr2) % steps[(i * pr1) % len(steps)],
+                model=self.ctr.color_model,
             )
             for i in range(self.ctr.num_leds)
         ]
 
+    def reset_tables(self, colinds, ledsteps, initsteps):
+        # The same brightness as in Breathbit, tabulated over one period,
+        # with the tables of all periods after each other
+        model = self.ctr.color_model
+        lspan = 1.0 - (1.0 - self.lspan) ** 0.5
+        rgbcols = np.array([model.hsl_color(*col) for col in self.cols], dtype=float)
+        self.rgb = rgbcols[colinds]
+        offsets = {}
+        tables = []
+        size = 0
+        for steps in sorted(set(ledsteps)):
+            hsteps = (steps - 1) / 2.0
+            prop = abs(np.arange(steps) - hsteps) / hsteps
+            tables.append((prop * lspan + 1.0 - lspan) ** 2)
+            offsets[steps] = size
+            size += steps
+        self.table = np.concatenate(tables)
+        self.ledsteps = np.array(ledsteps)
+        self.offsets = np.array([offsets[steps] for steps in ledsteps])
+        # Index into the table of each led at the first frame
+        self.currind = np.where(initsteps, np.add(initsteps, 1), 0) % self.ledsteps
+
+    def get_period(self, numframes=None):
+        """
+        Returns the number of frames after which the effect repeats exactly,
+        the least common multiple of the periods of the leds. The periods
+        are chosen to divide numframes if possible, by default
+        preferred_frames. For a real time effect, numframes False, this can
+        be very large when cycles is a range.
+
+        :param int numframes: number of frames of the intended movie
+        :rtype: int
+        """
+        if numframes is None:
+            numframes = self.preferred_frames
+        steps = cycle_steps(self.cycles, numframes)
+        pr1 = 13 if len(steps) % 13 != 0 else 7
+        return lcm(
+            set(steps[(i * pr1) % len(steps)] for i in range(self.ctr.num_leds))
+        )
+
+    def make_movie(self, numframes):
+        # Shortened to a whole number of periods, so that the movie loops
+        # seamlessly, unless one period is longer than the movie
+        period = self.get_period(numframes)
+        if period <= numframes:
+            numframes = numframes // period * period
+        return super(BreathEffect, self).make_movie(numframes)
+
     def getnext(self):
-        return self.ctr.make_func_pattern(lambda i: self.brarray[i].getnext())
+        if np is None:
+            return self.ctr.make_func_pattern(lambda i: self.brarray[i].getnext())
+        dim = self.table[self.offsets + self.currind]
+        self.currind += 1
+        self.currind[self.currind == self.ledsteps] = 0
+        pat = self.ctr.make_pattern()
+        pat.array[:, -3:] = np.rint(self.rgb * dim[:, None])
+        return pat
 
 
 class BreathCP(BreathEffect):
@@ -565,8 +825,8 @@ class GlitterEffect(Effect):
     def __init__(self, ctr, freq, cols, icol=(0, 0, 0)):
         super(GlitterEffect, self).__init__(ctr)
         self.freq = freq
-        self.cols = list(map(lambda hsl: hsl_color(*hsl), cols))
-        self.initialcol = hsl_color(*icol)
+        self.cols = list(map(lambda hsl: ctr.color_model.hsl_color(*hsl), cols))
+        self.initialcol = ctr.color_model.hsl_color(*icol)
         self.preferred_fps = 10
         self.preferred_frames = 100
 
@@ -632,23 +892,71 @@ class RotateEffect(Effect):
         self.preferred_fps = speed
 
     def reset(self, numframes):
-        self.pattern = self.ctr.copy_pattern(self.origpattern)
+        # The pattern in circular order is stored twice after each other, so
+        # that every rotation of it is a contiguous slice of the ring. The
+        # flip of circind and the permutation are composed into one gather
+        # index, which is left out when it is the identity.
+        num = self.ctr.num_leds
+        self.ring = self.ctr.circ_flip(self.origpattern).data * 2
+        gather = [
+            self.perm[self.ctr.circind(i)] if self.perm else self.ctr.circind(i)
+            for i in range(num)
+        ]
+        if gather == list(range(num)):
+            self.gather = None
+        elif np is not None:
+            self.gather = np.array(gather) + num
+            self.ringarray = np.frombuffer(self.ring, dtype=np.uint8).reshape(
+                2 * num, self.ctr.led_bytes
+            )
+        else:
+            self.gather = gather
+        self.shift = 0
 
     def getnext(self):
-        currpattern = (
-            self.ctr.permute_pattern(self.pattern, self.perm, circular=True)
-            if self.perm
-            else self.pattern
-        )
-        self.pattern = self.ctr.rotate_pattern(self.pattern, self.step, circular=True)
-        return currpattern
+        num = self.ctr.num_leds
+        lb = self.ctr.led_bytes
+        base = num - self.shift
+        if self.gather is None:
+            pat = self.ctr.make_pattern(self.ring[base * lb : (base + num) * lb])
+        elif np is not None:
+            pat = self.ctr.make_pattern()
+            pat.array[:] = self.ringarray[self.gather - self.shift]
+        else:
+            src = memoryview(self.ring)
+            pat = self.ctr.make_pattern(
+                b"".join(
+                    [src[(k + base) * lb : (k + base + 1) * lb] for k in self.gather]
+                )
+            )
+        self.shift = (self.shift + self.step) % num
+        return pat
+
+    def make_movie(self, numframes):
+        # With numpy all frames are gathered from the ring at once
+        if np is None:
+            return super(RotateEffect, self).make_movie(numframes)
+        self.reset(numframes)
+        num = self.ctr.num_leds
+        shifts = (np.arange(numframes) * self.step) % num
+        if self.gather is None:
+            ringarray = np.frombuffer(self.ring, dtype=np.uint8).reshape(
+                2 * num, self.ctr.led_bytes
+            )
+            index = np.arange(num) + num
+        else:
+            ringarray = self.ringarray
+            index = self.gather
+        self.shift = (numframes * self.step) % num
+        return self.ctr.to_movie(ringarray[index - shifts[:, None]].tobytes())
 
 
 class Spectrum(RotateEffect):
     def __init__(self, ctr, scattered=False, lightness=0.0, step=1):
         numleds = ctr.num_leds
         pat = ctr.make_func_pattern(
-            lambda i: hsl_color(i / float(numleds), 1.0, lightness), circular=True
+            lambda i: ctr.color_model.hsl_color(i / float(numleds), 1.0, lightness),
+            circular=True,
         )
         if scattered:
             perm = list(range(numleds))
@@ -699,7 +1007,7 @@ class ColorMeanderEffect(Effect):
         self.preferred_frames = 500
 
     def reset(self, numframes):
-        self.pat = self.ctr.make_func_pattern(lambda i: hsl_color(0, 0, 1))
+        self.pat = self.ctr.make_solid_pattern(self.ctr.color_model.hsl_color(0, 0, 1))
         self.cm = ColorMeander()
         if numframes:
             self.cm.steplen *= 10
@@ -743,8 +1051,8 @@ class ColorMeanderEffect(Effect):
     def update_tandem(self):
         self.cm.step()
         (h, s, l) = self.cm.get_hsl()
-        col1 = hsl_color(h, s, l)
-        col2 = hsl_color((h + 0.5) % 1.0, s, l)
+        col1 = self.ctr.color_model.hsl_color(h, s, l)
+        col2 = self.ctr.color_model.hsl_color((h + 0.5) % 1.0, s, l)
         self.pat = self.ctr.make_func_pattern(
             lambda i: col1 if i < self.ctr.num_leds // 2 else col2
         )
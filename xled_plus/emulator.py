@@ -0,0 +1,702 @@
+# -*- coding: utf-8 -*-
+
+"""
+xled++.emulator
+~~~~~~~~~~~~~~~
+
+A local stand-in for a Twinkly device, for testing and benchmarking
+without physical leds.
+
+The emulator serves the subset of the REST API used by highcontrol
+(device info, modes, movies, playlist, layout, movie config, timer,
+color and effects) over HTTP, and receives real time frames on a UDP
+socket in protocol version 1, 2 or 3. Each complete real time frame is
+recorded together with its arrival time.
+
+Typical use::
+
+    emu = DeviceEmulator(num_leds=250, version="2.8.3")
+    emu.start()
+    ctr = emu.connect()
+    ...
+    emu.stop()
+
+Use a low version or family "D" to exercise the code paths for older
+devices.
+"""
+
+from __future__ import absolute_import
+
+import base64
+import collections
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from xled.security import make_challenge_response
+
+log = logging.getLogger(__name__)
+
+API_PREFIX = "/xled/v1/"
+
+
+class RtSender(object):
+    """
+    Minimal replacement for xled's UDPClient that sends from an ephemeral
+    local port. The regular client binds the same local port as it sends
+    to, which collides with an emulator running on the same machine.
+
+    :param str host: destination host
+    :param int port: destination udp port
+    """
+
+    def __init__(self, host, port):
+        self.destination_host = host
+        self.port = port
+        self.handle = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, message):
+        return self.handle.sendto(message, (self.destination_host, self.port))
+
+    def close(self):
+        self.handle.close()
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, avoid delayed acks on them
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.emulator.connection_count += 1
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    def dispatch(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        status, content = self.server.emulator.handle_request(
+            method, self.path, self.headers, body
+        )
+        data = json.dumps(content).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        log.debug(format, *args)
+
+
+class DeviceEmulator(object):
+    """
+    Emulates a Twinkly device on the local machine.
+
+    :param int num_leds: number of leds
+    :param str profile: led profile, 'RGB' or 'RGBW'
+    :param str family: firmware family, 'D' for generation I devices
+    :param str version: firmware version, like '2.8.3'
+    :param list string_config: list of string lengths, default a single string
+    :param int max_frames: movie capacity in frames
+    :param str host: address to listen on
+    :param int http_port: http port, or 0 for any free port
+    :param int udp_port: udp port for real time frames, or 0 for any free port
+    :param int record_limit: max number of real time frames kept in rt_frames
+    """
+
+    def __init__(
+        self,
+        num_leds=250,
+        profile="RGB",
+        family="G",
+        version="2.8.3",
+        string_config=None,
+        max_frames=992,
+        host="127.0.0.1",
+        http_port=0,
+        udp_port=0,
+        record_limit=10000,
+    ):
+        assert profile in ("RGB", "RGBW")
+        self.num_leds = num_leds
+        self.profile = profile
+        self.led_bytes = len(profile)
+        self.family = family
+        self.version = version
+        self.version_tuple = tuple(map(int, version.split(".")))
+        self.string_config = string_config or [num_leds]
+        assert sum(self.string_config) == num_leds
+        self.max_frames = max_frames
+        self.host = host
+        self.mac = "98:f4:ab:{:02x}:{:02x}:{:02x}".format(*bytearray(os.urandom(3)))
+        self.name = "Twinkly_" + self.mac.replace(":", "")[-6:].upper()
+        self.record_limit = record_limit
+        self.lock = threading.Lock()
+        self.frame_cond = threading.Condition(self.lock)
+        self.token = None
+        self.pending_token = None
+        self.mode = "movie"
+        self.effect_id = 0
+        self.color = (0, 0, 0)
+        self.timer = (-1, -1)
+        self.clock_offset = 0
+        self.brightness = 100
+        self.movie_config = {
+            "frame_delay": 100,
+            "leds_number": num_leds,
+            "frames_number": 0,
+        }
+        self.movie_data = b""
+        self.movies = []
+        self.movie_contents = {}
+        self.pending_movie = None
+        self.next_movie_id = 0
+        self.current_movie = -1
+        self.playlist = []
+        self.current_playlist_entry = -1
+        self.layout = self.default_layout()
+        self.rt_frames = collections.deque(maxlen=record_limit)
+        self.rt_frame_count = 0
+        self.rt_packet_count = 0
+        self.rt_rejected = 0
+        self.request_count = 0
+        self.connection_count = 0
+        self.frame_parts = []
+        self.httpd = _ThreadingHTTPServer((host, http_port), _RequestHandler)
+        self.httpd.emulator = self
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # Large receive buffer, so that bursts of frames are not dropped here
+        self.udp.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+        self.udp.bind((host, udp_port))
+        self.udp.settimeout(0.2)
+        self.threads = []
+        self.running = False
+
+    @property
+    def http_port(self):
+        return self.httpd.server_address[1]
+
+    @property
+    def udp_port(self):
+        return self.udp.getsockname()[1]
+
+    @property
+    def address(self):
+        """
+        Host and port to pass as host to a ControlInterface
+        """
+        return "{}:{}".format(self.host, self.http_port)
+
+    @property
+    def frame_size(self):
+        return self.num_leds * self.led_bytes
+
+    @property
+    def has_movie_list(self):
+        return self.family != "D" and self.version_tuple >= (2, 5, 6)
+
+    def default_layout(self):
+        # A synthesized 2d layout of the leds in zigzag rows
+        cols = max(1, int(round(self.num_leds ** 0.5)))
+        rows = (self.num_leds + cols - 1) // cols
+        coords = []
+        for i in range(self.num_leds):
+            r, c = divmod(i, cols)
+            if r % 2:
+                c = cols - 1 - c
+            coords.append(
+                {
+                    "x": 2.0 * c / max(1, cols - 1) - 1.0,
+                    "y": float(r) / max(1, rows - 1),
+                    "z": 0.0,
+                }
+            )
+        return {"source": "2d", "synthesized": True, "coordinates": coords}
+
+    # Starting and stopping
+
+    def start(self):
+        """
+        Starts serving http requests and receiving udp frames in
+        background threads.
+        """
+        self.running = True
+        self.threads = [
+            threading.Thread(target=self.httpd.serve_forever),
+            threading.Thread(target=self.udp_loop),
+        ]
+        for th in self.threads:
+            th.daemon = True
+            th.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the background threads and closes the sockets.
+        """
+        self.running = False
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        for th in self.threads:
+            th.join()
+        self.udp.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def connect(self, color_model=None):
+        """
+        Creates a HighControlInterface connected to this emulator, with its
+        real time frames sent to the emulator udp port.
+
+        :rtype: HighControlInterface
+        """
+        from xled_plus.highcontrol import HighControlInterface
+
+        ctr = HighControlInterface(self.address, self.mac, color_model=color_model)
+        ctr._udpclient = RtSender(self.host, self.udp_port)
+        return ctr
+
+    # Real time frames
+
+    def udp_loop(self):
+        while self.running:
+            try:
+                packet = self.udp.recv(65536)
+            except socket.timeout:
+                continue
+            except socket.error:
+                break
+            self.handle_rt_packet(bytearray(packet), time.time())
+
+    def handle_rt_packet(self, packet, timestamp):
+        with self.lock:
+            self.rt_packet_count += 1
+            if len(packet) < 10 or bytes(packet[1:9]) != self.token:
+                self.rt_rejected += 1
+                return
+            if packet[0] == 1:
+                self.record_frame(packet[10:], timestamp)
+            elif packet[0] == 2:
+                self.record_frame(packet[10:], timestamp)
+            elif packet[0] == 3 and len(packet) >= 12:
+                if packet[11] == 0:
+                    self.frame_parts = []
+                elif packet[11] != len(self.frame_parts):
+                    # Lost or reordered fragment, drop the frame
+                    self.rt_rejected += 1
+                    self.frame_parts = []
+                    return
+                self.frame_parts.append(bytes(packet[12:]))
+                if sum(map(len, self.frame_parts)) >= self.frame_size:
+                    self.record_frame(b"".join(self.frame_parts), timestamp)
+                    self.frame_parts = []
+            else:
+                self.rt_rejected += 1
+
+    def record_frame(self, frame, timestamp):
+        if len(frame) != self.frame_size:
+            self.rt_rejected += 1
+            return
+        self.rt_frames.append((timestamp, bytes(frame)))
+        self.rt_frame_count += 1
+        self.frame_cond.notify_all()
+
+    def wait_rt_frames(self, count, timeout=5.0):
+        """
+        Waits until a total of count real time frames have been received.
+
+        :param int count: total number of frames to wait for
+        :param float timeout: max time to wait in seconds
+        :return: True if the frames arrived in time
+        :rtype: bool
+        """
+        deadline = time.time() + timeout
+        with self.lock:
+            while self.rt_frame_count < count:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self.frame_cond.wait(remaining)
+            return True
+
+    def reset_rt_frames(self):
+        with self.lock:
+            self.rt_frames.clear()
+            self.rt_frame_count = 0
+            self.rt_packet_count = 0
+            self.rt_rejected = 0
+
+    # Http requests
+
+    def handle_request(self, method, path, headers, body):
+        path = path.split("?")[0]
+        if not path.startswith(API_PREFIX):
+            return 404, {"code": 1104}
+        endpoint = path[len(API_PREFIX) :]
+        func = self.routes.get((method, endpoint))
+        if func is None:
+            return 404, {"code": 1104}
+        if endpoint.startswith(("movies", "playlist")) and not self.has_movie_list:
+            return 404, {"code": 1104}
+        if endpoint == "led/color" and self.version_tuple < (2, 7, 1):
+            return 404, {"code": 1104}
+        if endpoint not in ("login", "verify", "gestalt", "fw/version"):
+            token = headers.get("X-Auth-Token")
+            if not token or base64.b64decode(token) != self.token:
+                return 401, {"code": 1104}
+        if endpoint in self.binary_endpoints:
+            data = body
+        elif body:
+            try:
+                data = json.loads(body.decode("utf-8"))
+            except ValueError:
+                return 400, {"code": 1101}
+        else:
+            data = {}
+        with self.lock:
+            self.request_count += 1
+            res = func(self, data, headers)
+        if isinstance(res, tuple):
+            return res
+        res.setdefault("code", 1000)
+        return 200, res
+
+    def api_login(self, data, headers):
+        challenge = base64.b64decode(data["challenge"])
+        self.pending_token = os.urandom(8)
+        return {
+            "authentication_token": base64.b64encode(self.pending_token).decode(
+                "ascii"
+            ),
+            "authentication_token_expires_in": 14400,
+            "challenge-response": make_challenge_response(challenge, self.mac),
+        }
+
+    def api_verify(self, data, headers):
+        token = headers.get("X-Auth-Token")
+        if not token or base64.b64decode(token) != self.pending_token:
+            return 401, {"code": 1104}
+        self.token = self.pending_token
+        return {}
+
+    def api_gestalt(self, data, headers):
+        return {
+            "product_name": "Twinkly",
+            "hardware_version": "100",
+            "bytes_per_led": self.led_bytes,
+            "hw_id": self.mac.replace(":", "")[-6:],
+            "flash_size": 64,
+            "led_type": 14,
+            "product_code": "TWEMULATOR",
+            "fw_family": self.family,
+            "device_name": self.name,
+            "uptime": str(int(time.time() * 1000) % 100000000),
+            "mac": self.mac,
+            "uuid": str(uuid.uuid5(uuid.NAMESPACE_DNS, self.mac)).upper(),
+            "max_supported_led": max(self.num_leds, 510),
+            "number_of_led": self.num_leds,
+            "led_profile": self.profile,
+            "frame_rate": 25,
+            "measured_frame_rate": 25,
+            "movie_capacity": self.max_frames,
+            "wire_type": 1,
+            "copyright": "emulator",
+        }
+
+    def api_fw_version(self, data, headers):
+        return {"version": self.version}
+
+    def api_get_device_name(self, data, headers):
+        return {"name": self.name}
+
+    def api_set_device_name(self, data, headers):
+        self.name = data["name"]
+        return {}
+
+    def api_get_led_config(self, data, headers):
+        strings = []
+        first = 0
+        for length in self.string_config:
+            strings.append({"first_led_id": first, "length": length})
+            first += length
+        return {"strings": strings}
+
+    def api_get_layout(self, data, headers):
+        return dict(self.layout)
+
+    def api_set_layout(self, data, headers):
+        if len(data["coordinates"]) != self.num_leds:
+            return 400, {"code": 1105}
+        self.layout = {
+            "source": data["source"],
+            "synthesized": data.get("synthesized", False),
+            "coordinates": data["coordinates"],
+        }
+        return {}
+
+    def api_get_mode(self, data, headers):
+        return {"mode": self.mode, "shop_mode": 0}
+
+    def api_set_mode(self, data, headers):
+        if data["mode"] not in (
+            "movie",
+            "playlist",
+            "rt",
+            "demo",
+            "effect",
+            "color",
+            "off",
+        ):
+            return 400, {"code": 1105}
+        self.mode = data["mode"]
+        return {}
+
+    def seconds_after_midnight(self):
+        now = time.localtime()
+        secs = now.tm_hour * 3600 + now.tm_min * 60 + now.tm_sec
+        return (secs + self.clock_offset) % 86400
+
+    def api_get_timer(self, data, headers):
+        return {
+            "time_now": self.seconds_after_midnight(),
+            "time_on": self.timer[0],
+            "time_off": self.timer[1],
+        }
+
+    def api_set_timer(self, data, headers):
+        if "time_now" in data:
+            self.clock_offset = 0
+            self.clock_offset = data["time_now"] - self.seconds_after_midnight()
+        self.timer = (data["time_on"], data["time_off"])
+        return {}
+
+    def api_get_brightness(self, data, headers):
+        return {"mode": "enabled", "value": self.brightness}
+
+    def api_set_brightness(self, data, headers):
+        self.brightness = data.get("value", self.brightness)
+        return {}
+
+    def api_get_color(self, data, headers):
+        return {"red": self.color[0], "green": self.color[1], "blue": self.color[2]}
+
+    def api_set_color(self, data, headers):
+        self.color = (data["red"], data["green"], data["blue"])
+        return {}
+
+    def api_get_effects(self, data, headers):
+        return {"effects_number": 15}
+
+    def api_get_effects_current(self, data, headers):
+        return {"effect_id": self.effect_id}
+
+    def api_set_effects_current(self, data, headers):
+        self.effect_id = data["effect_id"]
+        return {}
+
+    def api_get_movie_config(self, data, headers):
+        return dict(self.movie_config)
+
+    def api_set_movie_config(self, data, headers):
+        self.movie_config = {
+            "frame_delay": data["frame_delay"],
+            "leds_number": data["leds_number"],
+            "frames_number": data["frames_number"],
+        }
+        return {}
+
+    def api_set_movie_full(self, data, headers):
+        nframes = len(data) // self.frame_size
+        if nframes * self.frame_size != len(data) or nframes > self.max_frames:
+            return 400, {"code": 1105}
+        self.movie_data = bytes(data)
+        return {"frames_number": nframes}
+
+    def api_rt_frame(self, data, headers):
+        self.record_frame(data, time.time())
+        return {}
+
+    def used_frames(self):
+        return sum(entry["frames_number"] for entry in self.movies)
+
+    def api_get_movies(self, data, headers):
+        return {
+            "movies": [dict(entry) for entry in self.movies],
+            "available_frames": self.max_frames - self.used_frames(),
+            "max_capacity": self.max_frames,
+        }
+
+    def api_delete_movies(self, data, headers):
+        self.movies = []
+        self.movie_contents = {}
+        self.pending_movie = None
+        self.current_movie = -1
+        self.playlist = []
+        self.current_playlist_entry = -1
+        if self.mode in ("movie", "playlist"):
+            self.mode = "off"
+        return {}
+
+    def api_movies_new(self, data, headers):
+        if len(self.movies) >= 16:
+            return 400, {"code": 1105}
+        if data["frames_number"] > self.max_frames - self.used_frames():
+            return 400, {"code": 1105}
+        entry = {
+            "id": self.next_movie_id,
+            "name": data["name"],
+            "unique_id": data["unique_id"],
+            "descriptor_type": data["descriptor_type"],
+            "leds_per_frame": data["leds_per_frame"],
+            "frames_number": data["frames_number"],
+            "fps": data["fps"],
+        }
+        self.next_movie_id += 1
+        self.pending_movie = entry
+        return {"id": entry["id"]}
+
+    def api_movies_full(self, data, headers):
+        entry = self.pending_movie
+        if entry is None:
+            return 400, {"code": 1105}
+        expected = entry["frames_number"] * entry["leds_per_frame"] * self.led_bytes
+        if len(data) != expected:
+            return 400, {"code": 1105}
+        self.pending_movie = None
+        self.movies.append(entry)
+        self.movie_contents[entry["id"]] = bytes(data)
+        self.current_movie = entry["id"]
+        return {"frames_number": entry["frames_number"]}
+
+    def find_movie(self, movie_id):
+        for entry in self.movies:
+            if entry["id"] == movie_id:
+                return entry
+        return None
+
+    def api_get_movies_current(self, data, headers):
+        entry = self.find_movie(self.current_movie)
+        if entry is None:
+            return {"id": -1, "unique_id": "", "name": ""}
+        return {
+            "id": entry["id"],
+            "unique_id": entry["unique_id"],
+            "name": entry["name"],
+        }
+
+    def api_set_movies_current(self, data, headers):
+        if self.find_movie(data["id"]) is None:
+            return 400, {"code": 1105}
+        self.current_movie = data["id"]
+        return {}
+
+    def api_get_playlist(self, data, headers):
+        return {
+            "unique_id": "",
+            "name": "",
+            "entries": [dict(entry) for entry in self.playlist],
+        }
+
+    def api_set_playlist(self, data, headers):
+        uids = {entry["unique_id"]: entry for entry in self.movies}
+        entries = []
+        for ele in data["entries"]:
+            if ele["unique_id"] not in uids:
+                return 400, {"code": 1105}
+            movie = uids[ele["unique_id"]]
+            entries.append(
+                {
+                    "id": movie["id"],
+                    "unique_id": movie["unique_id"],
+                    "name": movie["name"],
+                    "duration": ele["duration"],
+                }
+            )
+        self.playlist = entries
+        self.current_playlist_entry = entries[0]["id"] if entries else -1
+        return {}
+
+    def api_delete_playlist(self, data, headers):
+        self.playlist = []
+        self.current_playlist_entry = -1
+        return {}
+
+    def api_get_playlist_current(self, data, headers):
+        for entry in self.playlist:
+            if entry["id"] == self.current_playlist_entry:
+                return {
+                    "id": entry["id"],
+                    "unique_id": entry["unique_id"],
+                    "name": entry["name"],
+                }
+        return {"id": -1, "unique_id": "", "name": ""}
+
+    def api_set_playlist_current(self, data, headers):
+        if data["id"] not in [entry["id"] for entry in self.playlist]:
+            return 400, {"code": 1105}
+        self.current_playlist_entry = data["id"]
+        return {}
+
+    binary_endpoints = ("led/movie/full", "movies/full", "led/rt/frame")
+
+    routes = {
+        ("POST", "login"): api_login,
+        ("POST", "verify"): api_verify,
+        ("GET", "gestalt"): api_gestalt,
+        ("GET", "fw/version"): api_fw_version,
+        ("GET", "device_name"): api_get_device_name,
+        ("POST", "device_name"): api_set_device_name,
+        ("GET", "led/config"): api_get_led_config,
+        ("GET", "led/layout/full"): api_get_layout,
+        ("POST", "led/layout/full"): api_set_layout,
+        ("GET", "led/mode"): api_get_mode,
+        ("POST", "led/mode"): api_set_mode,
+        ("GET", "timer"): api_get_timer,
+        ("POST", "timer"): api_set_timer,
+        ("GET", "led/out/brightness"): api_get_brightness,
+        ("POST", "led/out/brightness"): api_set_brightness,
+        ("GET", "led/color"): api_get_color,
+        ("POST", "led/color"): api_set_color,
+        ("GET", "led/effects"): api_get_effects,
+        ("GET", "led/effects/current"): api_get_effects_current,
+        ("POST", "led/effects/current"): api_set_effects_current,
+        ("GET", "led/movie/config"): api_get_movie_config,
+        ("POST", "led/movie/config"): api_set_movie_config,
+        ("POST", "led/movie/full"): api_set_movie_full,
+        ("POST", "led/rt/frame"): api_rt_frame,
+        ("GET", "movies"): api_get_movies,
+        ("DELETE", "movies"): api_delete_movies,
+        ("POST", "movies/new"): api_movies_new,
+        ("POST", "movies/full"): api_movies_full,
+        ("GET", "movies/current"): api_get_movies_current,
+        ("POST", "movies/current"): api_set_movies_current,
+        ("GET", "playlist"): api_get_playlist,
+        ("POST", "playlist"): api_set_playlist,
+        ("DELETE", "playlist"): api_delete_playlist,
+        ("GET", "playlist/current"): api_get_playlist_current,
+        ("POST", "playlist/current"): api_set_playlist_current,
+    }
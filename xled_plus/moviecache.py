@@ -0,0 +1,195 @@
+"""
+xled_plus.moviecache
+~~~~~~~~~~~~~~~~~~~~
+
+Bookkeeping of the movies uploaded to a device, used by
+HighControlInterface to decide which movies to keep when a new movie does
+not fit.
+
+The firmware can only delete all movies at once. So when a new movie does
+not fit in the free frames, or the device already has its maximum number
+of movies, the device is re-packed: all movies are deleted, and the most
+valuable of the previous movies are uploaded again along with the new one.
+For this the cache keeps the data of the movies it has seen uploaded.
+Movies in the playlist, and movies explicitly pinned, are kept first.
+Among the rest the policy decides: 'lru' keeps the most recently used,
+'lfu' the most frequently used.
+
+Note that re-packing does not save upload bytes by itself: a kept movie
+is uploaded again right away, instead of later when it is shown. What it
+saves is uploads at the time a scene is shown, and it keeps the playlist.
+A kept movie that is not shown again before the next re-packing is wasted
+upload, and kept movies make the device fill up again sooner. So other
+movies than the pinned ones are only kept if they have been used at least
+min_uses times, and they take at most keep_fraction of the frames and of
+the movie slots. See samples/bench_movies.py for the trade-off. With
+keep_fraction 0.0, as HighControlInterface uses by default, only the
+playlist and the pinned movies are kept.
+The cache holds the data of the movies on the device, which is dropped
+when they are removed from it.
+
+The cache also counts uploads and uploaded bytes, see get_stats.
+"""
+
+POLICIES = ("lru", "lfu")
+
+
+class MovieCache(object):
+    """
+    Usage, size and data of movies uploaded to one device, keyed by their
+    unique id.
+
+    :param str policy: 'lru' or 'lfu', which movies to keep on re-packing
+    :param float keep_fraction: max fraction of the capacity and of the
+        movie slots to fill with kept movies that are not pinned or in the
+        playlist
+    :param int max_movies: max number of movies the device can hold
+    :param int min_uses: min number of uses of a movie that is not pinned
+        or in the playlist for it to be kept
+    """
+
+    def __init__(self, policy="lfu", keep_fraction=0.35, max_movies=16, min_uses=2):
+        assert policy in POLICIES
+        self.policy = policy
+        self.keep_fraction = keep_fraction
+        self.max_movies = max_movies
+        self.min_uses = min_uses
+        self.entries = {}
+        self.pinned = set()
+        self.clock = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {
+            "uploads": 0,
+            "uploaded_bytes": 0,
+            "reuploads": 0,
+            "reuploaded_bytes": 0,
+            "hits": 0,
+            "repacks": 0,
+        }
+
+    def get_stats(self):
+        """
+        Returns the number of uploads and uploaded bytes (including those
+        re-uploaded when re-packing), the number of re-uploads and their
+        bytes, the number of uses of movies already on the device, and the
+        number of times the device was re-packed.
+
+        :rtype: dict
+        """
+        return dict(self.stats)
+
+    def get_entry(self, unique_id):
+        if unique_id not in self.entries:
+            self.entries[unique_id] = {
+                "data": None,
+                "frames": 0,
+                "fps": None,
+                "uses": 0,
+                "last_used": 0,
+            }
+        return self.entries[unique_id]
+
+    def use(self, unique_id, hit=False):
+        """
+        Records that a movie was shown, uploaded or put in a playlist.
+
+        :param str unique_id: unique id of the movie
+        :param bool hit: the movie was already on the device
+        """
+        self.clock += 1
+        entry = self.get_entry(unique_id)
+        entry["uses"] += 1
+        entry["last_used"] = self.clock
+        if hit:
+            self.stats["hits"] += 1
+
+    def add(self, unique_id, data, frames, fps, reupload=False):
+        """
+        Records the upload of a movie, and keeps its data for re-packing.
+
+        :param str unique_id: unique id of the movie
+        :param bytes data: the movie data
+        :param int frames: number of frames
+        :param fps: frames per second
+        :param bool reupload: uploaded again when re-packing
+        """
+        entry = self.get_entry(unique_id)
+        entry["data"] = data
+        entry["frames"] = frames
+        entry["fps"] = fps
+        self.stats["uploads"] += 1
+        self.stats["uploaded_bytes"] += len(data)
+        if reupload:
+            self.stats["reuploads"] += 1
+            self.stats["reuploaded_bytes"] += len(data)
+
+    def evict(self, unique_id):
+        """
+        Drops the data of a movie no longer on the device. Its usage is
+        still remembered.
+        """
+        if unique_id in self.entries:
+            self.entries[unique_id]["data"] = None
+
+    def pin(self, unique_id):
+        """
+        Makes a movie be kept on the device when re-packing, as long as it
+        fits. Movies in the playlist are always kept.
+        """
+        self.pinned.add(unique_id)
+
+    def unpin(self, unique_id):
+        self.pinned.discard(unique_id)
+
+    def score(self, unique_id):
+        entry = self.entries[unique_id]
+        if self.policy == "lfu":
+            return (entry["uses"], entry["last_used"])
+        else:
+            return entry["last_used"]
+
+    def select(self, unique_ids, budget, max_count, keep=(), capacity=None):
+        """
+        Selects which movies to keep when re-packing. Movies in keep and
+        pinned movies come first, then the others in order of the policy,
+        as long as they fit within the budget. The others must also have
+        been used min_uses times, and fit within keep_fraction of the
+        capacity and of max_movies, so that the device is left with room
+        for new movies. Movies without data can not be uploaded again and
+        are never selected.
+
+        :param list unique_ids: unique ids of the movies on the device
+        :param int budget: number of frames available for kept movies
+        :param int max_count: max number of movies to keep
+        :param keep: unique ids to keep first, eg the playlist
+        :param int capacity: total number of frames of the device
+        :rtype: list
+        """
+        candidates = [
+            uid
+            for uid in unique_ids
+            if uid in self.entries and self.entries[uid]["data"] is not None
+        ]
+        candidates.sort(key=self.score, reverse=True)
+        candidates.sort(key=lambda uid: uid in keep or uid in self.pinned, reverse=True)
+        other_budget = int((capacity or budget) * self.keep_fraction)
+        other_count = int(self.max_movies * self.keep_fraction)
+        selected = []
+        for uid in candidates:
+            frames = self.entries[uid]["frames"]
+            pinned = uid in keep or uid in self.pinned
+            if len(selected) < max_count and frames <= budget:
+                if not pinned:
+                    if (
+                        frames > other_budget
+                        or not other_count
+                        or self.entries[uid]["uses"] < self.min_uses
+                    ):
+                        continue
+                    other_budget -= frames
+                    other_count -= 1
+                selected.append(uid)
+                budget -= frames
+        return selected
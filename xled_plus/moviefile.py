@@ -0,0 +1,446 @@
+"""
+xled_plus.moviefile
+~~~~~~~~~~~~~~~~~~~
+
+Binary movie files, with raw frames after a fixed size header, so that a
+movie can be memory mapped and any frame read directly.
+
+The header is 64 bytes, little endian: the magic string "XLEDMOV1", the
+size of the header (offset of the frame data), bytes per led, number of
+leds, number of frames, frames per second (double), led profile (eg "RGB"
+or "RGBW", zero padded to 8 bytes), and a crc32 checksum of the frame data,
+which read_movie_frames verifies when the last frame is read.
+The rest of the header is reserved and zero.
+
+There is also a compressed format for archiving, where most frames are
+stored as the difference (xor) from the previous frame, which is mostly
+zeros when only a few leds change per frame. Every keyframe_interval
+frames there is a keyframe stored as is, starting a block which is
+compressed with zlib or lzma. It has the same header, except for the magic
+string "XLEDMVZ1", and the codec and keyframe interval after the checksum.
+Each block is preceded by its number of frames and compressed size.
+Decoding is done one block at a time, so the memory use is bounded by
+the block size. The checksum is verified when the last frame is decoded.
+
+The text format of DeviceGeometry.save_movie, with one hexadecimal line per
+frame, is still supported. read_movie_frames reads frames from files in
+any format, and convert_movie_file converts between them.
+"""
+
+import binascii
+import mmap
+import struct
+import zlib
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+MAGIC = b"XLEDMOV1"
+HEADER = struct.Struct("<8sHHIId8sI")
+HEADER_SIZE = 64
+
+ZMAGIC = b"XLEDMVZ1"
+ZHEADER = struct.Struct("<8sHHIId8sIBH")
+BLOCK = struct.Struct("<II")
+CODECS = {
+    "none": (0, bytes, bytes),
+    "zlib": (1, lambda data: zlib.compress(data, 9), zlib.decompress),
+}
+if lzma:
+    CODECS["lzma"] = (2, lzma.compress, lzma.decompress)
+CODEC_NAMES = {0: "none", 1: "zlib", 2: "lzma"}
+
+
+def is_movie_file(name):
+    """
+    Checks whether a file is a binary movie file, as opposed to the text
+    or compressed format.
+
+    :rtype: bool
+    """
+    with open(name, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def is_compressed_movie_file(name):
+    """
+    Checks whether a file is a compressed movie file.
+
+    :rtype: bool
+    """
+    with open(name, "rb") as f:
+        return f.read(len(ZMAGIC)) == ZMAGIC
+
+
+def xor_frames(frame1, frame2):
+    # The difference between two frames, or the frame back from the
+    # difference, as a byte string
+    size = len(frame1)
+    return (
+        int.from_bytes(frame1, "little") ^ int.from_bytes(frame2, "little")
+    ).to_bytes(size, "little")
+
+
+def write_movie_file(name, frames, num_leds, led_bytes, fps, profile=None):
+    """
+    Writes a binary movie file.
+
+    :param str name: file name
+    :param frames: a movie (file-like object) or an iterable of frames as
+        bytes-like objects
+    :param int num_leds: number of leds
+    :param int led_bytes: bytes per led
+    :param fps: frames per second
+    :param str profile: led profile, default RGB or RGBW from led_bytes
+    :rtype: int
+    """
+    framesize = num_leds * led_bytes
+    if hasattr(frames, "read"):
+        movie = frames
+        movie.seek(0)
+        frames = iter(lambda: movie.read(framesize), b"")
+    profile = profile or ("RGBW" if led_bytes == 4 else "RGB")
+    numframes = 0
+    crc = 0
+    with open(name, "wb") as f:
+        f.write(b"\0" * HEADER_SIZE)
+        for frame in frames:
+            assert len(frame) == framesize
+            f.write(frame)
+            crc = zlib.crc32(frame, crc)
+            numframes += 1
+        f.seek(0)
+        f.write(
+            HEADER.pack(
+                MAGIC,
+                HEADER_SIZE,
+                led_bytes,
+                num_leds,
+                numframes,
+                float(fps),
+                profile.encode("ascii"),
+                crc & 0xFFFFFFFF,
+            )
+        )
+    return numframes
+
+
+class MovieFile(object):
+    """
+    A binary movie file, memory mapped for direct access to any frame.
+
+    :param str name: file name
+    """
+
+    def __init__(self, name):
+        self.file = open(name, "rb")
+        head = HEADER.unpack(self.file.read(HEADER.size))
+        if head[0] != MAGIC:
+            self.file.close()
+            raise ValueError("Not a binary movie file: {}".format(name))
+        self.offset = head[1]
+        self.led_bytes = head[2]
+        self.num_leds = head[3]
+        self.numframes = head[4]
+        self.fps = head[5]
+        self.profile = head[6].rstrip(b"\0").decode("ascii")
+        self.checksum = head[7]
+        self.framesize = self.num_leds * self.led_bytes
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.mapview = memoryview(self.map)
+        end = self.offset + self.numframes * self.framesize
+        if len(self.map) < end:
+            self.close()
+            raise ValueError("Truncated movie file: {}".format(name))
+        self.data = self.mapview[self.offset : end]
+
+    def __len__(self):
+        return self.numframes
+
+    def get_frame(self, num):
+        """
+        Returns frame num, as a memoryview into the file.
+
+        :param int num: frame number
+        :rtype: memoryview
+        """
+        if not 0 <= num < self.numframes:
+            raise IndexError("Frame number out of range")
+        start = num * self.framesize
+        return self.data[start : start + self.framesize]
+
+    def frames(self, start=0):
+        """
+        Iterates over the frames, as memoryviews into the file.
+        """
+        for num in range(start, self.numframes):
+            yield self.get_frame(num)
+
+    def verify(self):
+        """
+        Checks the frame data against the checksum in the header.
+
+        :rtype: bool
+        """
+        crc = 0
+        for pos in range(0, len(self.data), 1 << 20):
+            crc = zlib.crc32(self.data[pos : pos + (1 << 20)], crc)
+        return crc & 0xFFFFFFFF == self.checksum
+
+    def close(self):
+        if hasattr(self, "data"):
+            self.data.release()
+        self.mapview.release()
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_text_movie(name):
+    """
+    Reads a movie file in the text format of DeviceGeometry.save_movie.
+    Returns a dict with the header fields and an iterator over the frames,
+    which reads the file one line at a time.
+
+    :rtype: tuple
+    """
+    f = open(name, "r")
+    head = f.readline().split()
+    info = {
+        "numframes": int(head[0]),
+        "num_leds": int(head[1]),
+        "led_bytes": int(head[2]),
+        "fps": float(head[3]),
+    }
+    if info["fps"] == int(info["fps"]):
+        info["fps"] = int(info["fps"])
+
+    def frames():
+        with f:
+            for i in range(info["numframes"]):
+                yield binascii.unhexlify(f.readline().strip("\n"))
+
+    return info, frames()
+
+
+def write_compressed_movie(
+    name, frames, num_leds, led_bytes, fps, profile=None, codec="zlib", interval=64
+):
+    """
+    Writes a compressed movie file.
+
+    :param str name: file name
+    :param frames: a movie (file-like object) or an iterable of frames as
+        bytes-like objects
+    :param int num_leds: number of leds
+    :param int led_bytes: bytes per led
+    :param fps: frames per second
+    :param str profile: led profile, default RGB or RGBW from led_bytes
+    :param str codec: 'zlib', 'lzma' or 'none'
+    :param int interval: number of frames between keyframes
+    :rtype: int
+    """
+    framesize = num_leds * led_bytes
+    if hasattr(frames, "read"):
+        movie = frames
+        movie.seek(0)
+        frames = iter(lambda: movie.read(framesize), b"")
+    profile = profile or ("RGBW" if led_bytes == 4 else "RGB")
+    codec_id, compress = CODECS[codec][0:2]
+    numframes = 0
+    crc = 0
+
+    with open(name, "wb") as f:
+
+        def write_block(block):
+            data = compress(b"".join(block))
+            f.write(BLOCK.pack(len(block), len(data)))
+            f.write(data)
+
+        f.write(b"\0" * HEADER_SIZE)
+        block = []
+        last = None
+        for frame in frames:
+            frame = bytes(frame)
+            assert len(frame) == framesize
+            crc = zlib.crc32(frame, crc)
+            if len(block) == interval:
+                write_block(block)
+                block = []
+            block.append(xor_frames(last, frame) if block else frame)
+            last = frame
+            numframes += 1
+        if block:
+            write_block(block)
+        f.seek(0)
+        f.write(
+            ZHEADER.pack(
+                ZMAGIC,
+                HEADER_SIZE,
+                led_bytes,
+                num_leds,
+                numframes,
+                float(fps),
+                profile.encode("ascii"),
+                crc & 0xFFFFFFFF,
+                codec_id,
+                interval,
+            )
+        )
+    return numframes
+
+
+def read_compressed_movie(name):
+    """
+    Reads a compressed movie file. Returns a dict with the header fields
+    and an iterator over the frames, which decodes one block at a time.
+
+    :rtype: tuple
+    """
+    f = open(name, "rb")
+    head = ZHEADER.unpack(f.read(ZHEADER.size))
+    if head[0] != ZMAGIC:
+        f.close()
+        raise ValueError("Not a compressed movie file: {}".format(name))
+    info = {
+        "numframes": head[4],
+        "num_leds": head[3],
+        "led_bytes": head[2],
+        "fps": head[5],
+        "profile": head[6].rstrip(b"\0").decode("ascii"),
+        "checksum": head[7],
+    }
+    if info["fps"] == int(info["fps"]):
+        info["fps"] = int(info["fps"])
+    decoders = [dec for cid, comp, dec in CODECS.values() if cid == head[8]]
+    if not decoders:
+        f.close()
+        raise ValueError(
+            "Codec {} (id {}) of compressed movie file {} is not available".format(
+                CODEC_NAMES.get(head[8], "unknown"), head[8], name
+            )
+        )
+    decompress = decoders[0]
+    framesize = head[3] * head[2]
+    f.seek(head[1])
+
+    def frames():
+        with f:
+            left = info["numframes"]
+            crc = 0
+            while left > 0:
+                count, size = BLOCK.unpack(f.read(BLOCK.size))
+                data = decompress(f.read(size))
+                frame = data[0:framesize]
+                for i in range(count):
+                    if i:
+                        frame = xor_frames(
+                            frame, data[i * framesize : (i + 1) * framesize]
+                        )
+                    crc = zlib.crc32(frame, crc)
+                    yield frame
+                left -= count
+            if crc & 0xFFFFFFFF != info["checksum"]:
+                raise ValueError("Checksum mismatch in movie file: {}".format(name))
+
+    return info, frames()
+
+
+def read_movie_frames(name):
+    """
+    Reads a movie file in any format. Returns a dict with the fields
+    numframes, num_leds, led_bytes, fps, and profile (except for the text
+    format), and an iterator over the frames.
+    Only one frame (or one block for a compressed file) at a time is kept
+    in memory. For the binary formats the checksum is verified when the
+    last frame is read, raising ValueError if it does not match.
+
+    :rtype: tuple
+    """
+    if is_compressed_movie_file(name):
+        return read_compressed_movie(name)
+    if not is_movie_file(name):
+        return read_text_movie(name)
+    movie = MovieFile(name)
+    info = {
+        "numframes": movie.numframes,
+        "num_leds": movie.num_leds,
+        "led_bytes": movie.led_bytes,
+        "fps": movie.fps,
+        "profile": movie.profile,
+    }
+    if info["fps"] == int(info["fps"]):
+        info["fps"] = int(info["fps"])
+
+    def frames():
+        with movie:
+            crc = 0
+            for num in range(movie.numframes):
+                frame = movie.get_frame(num).tobytes()
+                crc = zlib.crc32(frame, crc)
+                yield frame
+            if crc & 0xFFFFFFFF != movie.checksum:
+                raise ValueError("Checksum mismatch in movie file: {}".format(name))
+
+    return info, frames()
+
+
+def write_text_movie(name, frames, num_leds, led_bytes, fps, numframes=None):
+    """
+    Writes a movie file in the text format, one hexadecimal line per frame.
+
+    :param str name: file name
+    :param frames: a movie (file-like object) or an iterable of frames as
+        bytes-like objects
+    :param int num_leds: number of leds
+    :param int led_bytes: bytes per led
+    :param fps: frames per second
+    :param int numframes: number of frames, needed for the header if frames
+        is an iterator
+    :rtype: int
+    """
+    framesize = num_leds * led_bytes
+    if hasattr(frames, "read"):
+        movie = frames
+        numframes = movie.seek(0, 2) // framesize
+        movie.seek(0)
+        frames = iter(lambda: movie.read(framesize), b"")
+    elif numframes is None:
+        frames = list(frames)
+        numframes = len(frames)
+    with open(name, "w") as f:
+        f.write("{} {} {} {}\n".format(numframes, num_leds, led_bytes, fps))
+        for i, frame in zip(range(numframes), frames):
+            f.write(binascii.hexlify(frame).decode() + "\n")
+    return numframes
+
+
+def convert_movie_file(src, dst, format="binary", codec=None):
+    """
+    Converts a movie file to the binary format, or to the text format with
+    format 'text', or to the compressed format with the given codec. The
+    source can be in any format.
+
+    :param str src: file to convert
+    :param str dst: file to write
+    :param str format: 'binary' or 'text'
+    :param str codec: write the compressed format, with 'zlib' or 'lzma'
+    """
+    info, frames = read_movie_frames(src)
+    args = (info["num_leds"], info["led_bytes"], info["fps"])
+    profile = info.get("profile")
+    if format == "text" and not codec:
+        write_text_movie(dst, frames, *args, numframes=info["numframes"])
+    elif format != "binary":
+        raise ValueError("Unknown movie file format: {}".format(format))
+    elif codec:
+        write_compressed_movie(dst, frames, *args, profile=profile, codec=codec)
+    else:
+        write_movie_file(dst, frames, *args, profile=profile)
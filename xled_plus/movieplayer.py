@@ -0,0 +1,196 @@
+"""
+xled_plus.movieplayer
+~~~~~~~~~~~~~~~~~~~~~
+
+Plays movies from disk in real time, for content much larger than the
+device memory.
+
+The movie file is memory mapped, and each frame is sent with
+show_rt_frame as a memoryview slice of the map, so nothing is copied and
+memory use does not grow with the file size. Pages already played are
+released from the map as the movie plays.
+
+The player is an Effect played by a FrameScheduler job (see scheduler.py),
+by default on the shared scheduler. Frame N is due at N / fps seconds
+after the start. When the player falls behind, the frames whose time has
+passed are dropped, so the movie keeps its pace. The number of dropped
+frames and the timing jitter are available from get_stats.
+
+The movie file is either a binary movie file from save_movie with format
+"binary" (see moviefile.py), or just the raw frames one after another, as in a movie
+from to_movie, eg written with open(name, "wb").write(movie.getvalue()).
+"""
+
+import mmap
+import os
+
+from xled_plus.effect_base import Effect, get_scheduler
+from xled_plus.moviefile import MovieFile, is_movie_file
+
+
+class MoviePlayer(Effect):
+    """
+    Plays a movie file in real time on a device.
+
+    :param ctr: the HighControlInterface to play on
+    :param str path: the movie file
+    :param fps: frames per second, default from a binary movie file
+    :param bool loop: start over at the end of the movie
+    :param int offset: position in the file where raw frames start
+    :param scheduler: the FrameScheduler to play with, default the shared one
+    """
+
+    def __init__(self, ctr, path, fps=None, loop=True, offset=0, scheduler=None):
+        super(MoviePlayer, self).__init__(ctr)
+        self.loop = loop
+        self.scheduler = scheduler
+        self.framesize = ctr.num_leds * ctr.led_bytes
+        numframes = None
+        if is_movie_file(path):
+            with MovieFile(path) as movie:
+                if movie.framesize != self.framesize:
+                    raise ValueError("Movie is not made for this device")
+                offset = movie.offset
+                numframes = movie.numframes
+                fps = fps or movie.fps
+        else:
+            numframes = (os.path.getsize(path) - offset) // self.framesize
+        if numframes <= 0:
+            raise ValueError("Movie has no frames")
+        assert fps
+        self.fps = fps
+        self.preferred_fps = fps
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.mapview = memoryview(self.map)
+        self.view = self.mapview[offset:]
+        self.offset = offset
+        self.numframes = numframes
+        self.released = 0
+        self.start_frame = 0
+        self.end_frame = None
+        self.num = 0
+        self.lap = 0
+        self.job = None
+
+    def get_frame(self, num):
+        """
+        Returns frame num of the movie, as a memoryview into the file.
+        The memoryview should not be kept after the player is closed,
+        since the file stays mapped into memory as long as it is.
+
+        :param int num: frame number
+        :rtype: memoryview
+        """
+        start = num * self.framesize
+        return self.view[start : start + self.framesize]
+
+    def release(self, num):
+        # Lets the kernel drop the pages of the frames before num from
+        # this process, to keep the memory use flat
+        if not hasattr(self.map, "madvise") or not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        end = (self.offset + num * self.framesize) // mmap.PAGESIZE * mmap.PAGESIZE
+        if end - self.released >= 1 << 20:
+            self.map.madvise(mmap.MADV_DONTNEED, self.released, end - self.released)
+            self.released = end
+
+    def reset(self, numframes=False):
+        self.num = 0
+        self.lap = self.start_frame // self.numframes
+        self.released = 0
+        if hasattr(self.map, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            self.map.madvise(mmap.MADV_SEQUENTIAL)
+
+    def getnext(self):
+        if self.end_frame is not None and self.num >= self.end_frame:
+            return None
+        pos = self.start_frame + self.num
+        index = pos % self.numframes
+        if pos // self.numframes != self.lap:
+            # Wrapped around, possibly with the first frames dropped
+            self.lap = pos // self.numframes
+            self.released = 0
+        # Pages of frames still waiting to be sent are read again if needed
+        self.release(index)
+        self.num += 1
+        return self.get_frame(index)
+
+    def skip(self, num):
+        # Called by the scheduler for frames dropped before being rendered
+        self.num += num
+        if self.end_frame is not None:
+            self.num = min(self.num, self.end_frame - 1)
+
+    def start(self, numframes=None, start=0):
+        """
+        Starts playing the movie, until stopped, or until numframes frames
+        have been due, or the end of the movie if not looping. Any other
+        real time effect on the device is stopped.
+
+        :param int numframes: number of frames to play, default all
+        :param int start: frame to start at
+        """
+        self.stop()
+        if not self.loop:
+            numframes = min(numframes or self.numframes, self.numframes - start)
+        self.start_frame = start
+        self.end_frame = numframes
+        scheduler = self.scheduler or get_scheduler()
+        self.job = scheduler.add(self, fps=self.fps, policy="skip")
+        self.rt_job = self.job
+
+    def play(self, numframes=None, start=0):
+        """
+        Plays the movie and waits until it has ended, see start.
+        """
+        self.start(numframes, start)
+        self.job.wait()
+
+    def stop(self, wait=True):
+        """
+        Stops playing. With wait, waits until no frame is being sent.
+        """
+        if self.job:
+            self.job.cancel()
+            if wait:
+                self.job.wait()
+        self.rt_job = None
+
+    def close(self):
+        """
+        Stops playing, and closes the movie file.
+        """
+        self.stop()
+        self.view.release()
+        self.mapview.release()
+        try:
+            self.map.close()
+        except BufferError:
+            # Some frame is still referenced, eg by the stopped job until it
+            # is garbage collected, and the map is closed when it is dropped
+            pass
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get_stats(self):
+        """
+        Returns the number of sent and dropped frames, the 50th and 99th
+        percentile of how late recent frames were sent, and the max for all
+        frames, in seconds, from the scheduler job (see RtJob.get_stats).
+
+        :rtype: dict
+        """
+        stats = self.job.get_stats() if self.job else {}
+        return {
+            "sent": stats.get("sent", 0),
+            "dropped": stats.get("skipped", 0),
+            "late_p50": stats.get("late_p50", 0.0),
+            "late_p99": stats.get("late_p99", 0.0),
+            "late_max": stats.get("max_lateness", 0.0),
+        }
@@ -11,12 +11,205 @@ easy to construct many more types of patterns with just a few lines of code.
 
 All the functions for creating patterns take a parameter ctr, which is a
 HighControlInterface connected to the led lights on which the pattern will fit.
+
+The Pattern class is the representation of a single frame used throughout
+the package. It keeps all pixels in one contiguous buffer laid out exactly
+as a frame of a movie, so it can be written to a movie or sent as a real
+time frame without any conversion.
 """
 
 from xled_plus.ledcolor import hsl_color, rgb_color
 import random
+import struct
 import math as m
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+_rgb_struct = struct.Struct(">BBB")
+_wrgb_struct = struct.Struct(">BBBB")
+
+
+class Pattern(object):
+    """
+    A single frame pattern of num_leds pixels with led_bytes bytes each.
+    The pixel data is stored in the bytearray 'data', in the same byte
+    order as in a movie frame.
+
+    For compatibility with code written for the older list-of-bytes
+    patterns, indexing with an integer gets or sets the raw bytes of one
+    pixel, iterating gives the pixels one by one, and len() gives the
+    number of leds. Slicing gives a new Pattern with the selected pixels,
+    and a Pattern can be concatenated with + to another Pattern or to a
+    list of pixels, as in pat[:n] + [pix], giving a new Pattern.
+
+    :param int num_leds: number of leds (pixels) in the pattern
+    :param int led_bytes: number of bytes per led, 3 for RGB and 4 for RGBW
+    :param data: optional initial bytes, otherwise the pattern is all black
+    """
+
+    def __init__(self, num_leds, led_bytes=3, data=None):
+        self.num_leds = num_leds
+        self.led_bytes = led_bytes
+        if data is None:
+            self.data = bytearray(num_leds * led_bytes)
+        else:
+            self.data = bytearray(data)
+            assert len(self.data) == num_leds * led_bytes
+
+    def __len__(self):
+        return self.num_leds
+
+    def __iter__(self):
+        lb = self.led_bytes
+        data = bytes(self.data)
+        for i in range(0, len(data), lb):
+            yield data[i : i + lb]
+
+    def __getitem__(self, ind):
+        lb = self.led_bytes
+        if isinstance(ind, slice):
+            start, stop, step = ind.indices(self.num_leds)
+            if step == 1:
+                return Pattern(
+                    max(0, stop - start), lb, self.data[start * lb : stop * lb]
+                )
+            inds = range(start, stop, step)
+            return Pattern(
+                len(inds), lb, b"".join([self.data[i * lb : i * lb + lb] for i in inds])
+            )
+        if ind < 0:
+            ind += self.num_leds
+        if not 0 <= ind < self.num_leds:
+            raise IndexError("pattern index out of range")
+        return bytes(self.data[ind * lb : ind * lb + lb])
+
+    def __setitem__(self, ind, pix):
+        lb = self.led_bytes
+        if isinstance(ind, slice):
+            start, stop, step = ind.indices(self.num_leds)
+            assert step == 1
+            if isinstance(pix, Pattern):
+                pix = pix.data
+            assert len(pix) == (stop - start) * lb
+            self.data[start * lb : stop * lb] = pix
+            return
+        if ind < 0:
+            ind += self.num_leds
+        if not 0 <= ind < self.num_leds:
+            raise IndexError("pattern index out of range")
+        assert len(pix) == lb
+        self.data[ind * lb : ind * lb + lb] = pix
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, Pattern)
+            and self.led_bytes == other.led_bytes
+            and self.data == other.data
+        )
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def _pixel_data(self, other):
+        # Pixel bytes of a Pattern or of a list of pixels, for concatenation
+        if isinstance(other, Pattern):
+            assert other.led_bytes == self.led_bytes
+            return other.data
+        if isinstance(other, list):
+            data = b"".join(other)
+            assert len(data) % self.led_bytes == 0
+            return data
+        return None
+
+    def __add__(self, other):
+        data = self._pixel_data(other)
+        if data is None:
+            return NotImplemented
+        return Pattern(
+            self.num_leds + len(data) // self.led_bytes,
+            self.led_bytes,
+            self.data + data,
+        )
+
+    def __radd__(self, other):
+        data = self._pixel_data(other)
+        if data is None:
+            return NotImplemented
+        return Pattern(
+            self.num_leds + len(data) // self.led_bytes,
+            self.led_bytes,
+            data + self.data,
+        )
+
+    def __bytes__(self):
+        return bytes(self.data)
+
+    def __repr__(self):
+        return "<Pattern {} leds x {} bytes>".format(self.num_leds, self.led_bytes)
+
+    def copy(self):
+        """
+        Returns an independent copy of the pattern.
+        """
+        return Pattern(self.num_leds, self.led_bytes, self.data)
+
+    def set_pixel(self, ind, rgb):
+        """
+        Sets the color of one led from an rgb tuple. The white component
+        of RGBW leds is set to zero.
+
+        :param int ind: led index
+        :param tuple rgb: color as an rgb tuple
+        """
+        if self.led_bytes == 4:
+            _wrgb_struct.pack_into(self.data, 4 * ind, 0, rgb[0], rgb[1], rgb[2])
+        else:
+            _rgb_struct.pack_into(self.data, 3 * ind, rgb[0], rgb[1], rgb[2])
+
+    def get_pixel(self, ind):
+        """
+        Returns the color of one led as an rgb tuple.
+
+        :param int ind: led index
+        :rtype: tuple
+        """
+        off = ind * self.led_bytes + self.led_bytes - 3
+        return tuple(self.data[off : off + 3])
+
+    def view(self):
+        """
+        Returns a memoryview of the pixel data, without copying it.
+
+        :rtype: memoryview
+        """
+        return memoryview(self.data)
+
+    @property
+    def array(self):
+        """
+        The pixel data as a numpy uint8 array of shape (num_leds, led_bytes),
+        sharing memory with the pattern. Requires numpy.
+        """
+        return np.frombuffer(self.data, dtype=np.uint8).reshape(
+            self.num_leds, self.led_bytes
+        )
+
+
+def reverse_pixels(buf, led_bytes):
+    """
+    Returns a bytearray with the pixels of the frame buffer buf in reverse
+    order, keeping the byte order within each pixel.
+    """
+    rev = buf[::-1]
+    out = bytearray(len(buf))
+    for c in range(led_bytes):
+        out[c::led_bytes] = rev[led_bytes - 1 - c :: led_bytes]
+    return out
+
 
 # Some utility functions
 
@@ -70,7 +263,7 @@ def random_color():
     return rgb_color(random.random(), random.random(), random.random())
 
 
-def random_hsl_color_func(hue=False, sat=False, light=False):
+def random_hsl_color_func(hue=False, sat=False, light=False, model=None):
     """
     Returns a function that generates random colors within certain intervals.
     Each of the parameters hue, sat, and light can be either False, a constant,
@@ -78,8 +271,10 @@ def random_hsl_color_func(hue=False, sat=False, light=False):
     randomized throughout its range, if it is an interval it is randomly drawn
     within this range, and if it is a constant it is set to that value.
     With this function you can thus construct a wide variety of random color
-    generating functions.
+    generating functions. The colors are converted with the color model
+    model if given, otherwise with the shared one.
     """
+    hsl = model.hsl_color if model else hsl_color
 
     def isnum(x):
         return type(x) in [float, int]
@@ -124,7 +319,7 @@ def random_hsl_color_func(hue=False, sat=False, light=False):
         light = lightexp(l0 + random.random() * ld, 1.0 / le) if ld != 0.0 else l0
         sat = (s0 + random.random() * sd) ** (1.0 / se) if sd != 0.0 else s0
         hue = (h0 + random.random() * hd) % 1.0 if hd != 0.0 else h0
-        return hsl_color(hue, sat, light)
+        return hsl(hue, sat, light)
 
     return func
 
@@ -157,8 +352,9 @@ def make_color_spectrum_pattern(ctr, offset=0, lightness=0.0):
     """
     Return a pattern of the color spectrum along the string.
     """
+    hsl = ctr.color_model.hsl_color
     return ctr.make_func_pattern(
-        lambda i: hsl_color(((i - offset) / float(ctr.num_leds)) % 1.0, 1.0, lightness),
+        lambda i: hsl(((i - offset) / float(ctr.num_leds)) % 1.0, 1.0, lightness),
         circular=True,
     )
 
@@ -187,20 +383,22 @@ def make_random_colors_pattern(ctr, lightness=0.0):
     """
     Return a pattern of randomly drawn hues of the same lightness.
     """
-    return ctr.make_func_pattern(lambda i: hsl_color(random.random(), 1.0, lightness))
+    hsl = ctr.color_model.hsl_color
+    return ctr.make_func_pattern(lambda i: hsl(random.random(), 1.0, lightness))
 
 
 def make_random_lightness_pattern(ctr, hue):
     """
     Return a pattern with the same hue but randomly drawn lightnesses.
     """
-    return ctr.make_func_pattern(
-        lambda i: hsl_color(hue, 1.0, random.random() * 2 - 1.0)
-    )
+    hsl = ctr.color_model.hsl_color
+    return ctr.make_func_pattern(lambda i: hsl(hue, 1.0, random.random() * 2 - 1.0))
 
 
 def make_random_hsl_pattern(ctr, hue=False, sat=False, light=False):
     """
     Return a pattern with random colors in the ranges specified by hue, sat, and light.
     """
-    return ctr.make_func_pattern(random_hsl_color_func(hue, sat, light))
+    return ctr.make_func_pattern(
+        random_hsl_color_func(hue, sat, light, ctr.color_model)
+    )
@@ -0,0 +1,107 @@
+"""
+xled_plus.profilecache
+~~~~~~~~~~~~~~~~~~~~~~
+
+On-disk cache of device profiles, i.e the static properties of a device
+that HighControlInterface otherwise has to ask the device for when
+connecting: number of leds, bytes per led, led profile, firmware family
+and version, string configuration, and layout.
+
+Profiles are stored in a json file, keyed by the hardware (MAC) address,
+and looked up by address or host. Entries older than the time-to-live are
+ignored and fetched from the device again.
+"""
+
+import json
+import os
+import time
+
+replace_file = getattr(os, "replace", os.rename)
+
+
+def default_cache_path():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "xled_plus", "profiles.json")
+
+
+class ProfileCache(object):
+    """
+    Cache of device profiles in a json file.
+
+    :param str path: file to store the profiles in, by default
+        profiles.json in the user's cache directory
+    :param float ttl: time-to-live of an entry in seconds
+    """
+
+    def __init__(self, path=None, ttl=7 * 24 * 3600):
+        self.path = path or default_cache_path()
+        self.ttl = ttl
+
+    def read(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def write(self, entries):
+        dirname = os.path.dirname(self.path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        tmpname = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmpname, "w") as f:
+            json.dump(entries, f)
+        replace_file(tmpname, self.path)
+
+    def get(self, host, hw_address=None):
+        """
+        Returns the cached profile of the device with the given hardware
+        address, or if not given the device last seen at host. Returns None
+        if there is no fresh entry. Another device may have got the host
+        since, so a profile found by host should be checked against the
+        device, as HighControlInterface does when logging in.
+
+        :rtype: dict
+        """
+        entries = self.read()
+        if hw_address:
+            entry = entries.get(hw_address.lower())
+        else:
+            entry = None
+            for ent in entries.values():
+                if ent.get("host") == host and (
+                    not entry or ent["time"] > entry["time"]
+                ):
+                    entry = ent
+        if not entry or entry["time"] + self.ttl < time.time():
+            return None
+        return entry["profile"]
+
+    def put(self, host, hw_address, profile):
+        """
+        Stores or updates the profile of a device. The given fields are
+        merged with those already stored for the device.
+
+        :param str host: the host the device was reached at
+        :param str hw_address: the hardware address of the device
+        :param dict profile: json serializable profile fields
+        """
+        entries = self.read()
+        key = hw_address.lower()
+        old = entries.get(key)
+        merged = dict(old["profile"]) if old else {}
+        merged.update(profile)
+        entries[key] = {"host": host, "time": time.time(), "profile": merged}
+        self.write(entries)
+
+    def remove(self, host=None, hw_address=None):
+        """
+        Removes the entry of a device, given by hardware address or host.
+        """
+        entries = self.read()
+        for key, ent in list(entries.items()):
+            if key == (hw_address or "").lower() or (host and ent["host"] == host):
+                del entries[key]
+        self.write(entries)
@@ -0,0 +1,58 @@
+"""
+Measures the compression ratio (x) and decode speed of the compressed movie
+format on some of the bundled effects, rendered offline for a string of
+250 leds (or the number of leds given as argument).
+"""
+
+from .sample_setup import *
+from xled_plus.geometry import DeviceGeometry
+from xled_plus.moviefile import CODECS, read_movie_frames
+import os
+import tempfile
+import time
+
+geom = DeviceGeometry(int(argv[1]) if len(argv) > 1 else 250)
+numframes = 300
+effects = [
+    ("Gold", Gold(geom)),
+    ("SparkleStars", SparkleStars(geom)),
+    ("SimpleBlink", SimpleBlink(geom)),
+    ("BreathCP", BreathCP(geom, [(0.0, 1.0, 0.0), (0.3, 1.0, 0.0)])),
+    ("Fire", Fire(geom)),
+    ("Spectrum", Spectrum(geom)),
+]
+tmpdir = tempfile.mkdtemp()
+name = os.path.join(tmpdir, "movie")
+
+print(
+    "{} frames of {} leds, {} bytes raw".format(
+        numframes, geom.num_leds, numframes * geom.num_leds * geom.led_bytes
+    )
+)
+for label, effect in effects:
+    movie = effect.make_movie(numframes)
+    rawsize = len(movie.getvalue())
+    for codec in sorted(CODECS):
+        start = time.time()
+        geom.save_movie(
+            name, movie, effect.preferred_fps, format="binary", codec=codec
+        )
+        encode = time.time() - start
+        size = os.path.getsize(name)
+        start = time.time()
+        info, frames = read_movie_frames(name)
+        for frame in frames:
+            pass
+        decode = time.time() - start
+        print(
+            "{:<13} {:<5} {:6.1f} x  enc {:6.1f} ms  dec {:7.0f} fps {:6.1f} MB/s".format(
+                label,
+                codec,
+                float(rawsize) / size,
+                encode * 1000.0,
+                numframes / decode,
+                rawsize / decode / 1e6,
+            )
+        )
+os.remove(name)
+os.rmdir(tmpdir)
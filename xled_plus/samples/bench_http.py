@@ -0,0 +1,77 @@
+"""
+Measures the number of http round-trips and the time spent by the high
+level calls of HighControlInterface. Runs against a local emulator, or
+against a real device if its address is given as argument.
+"""
+
+from .sample_setup import *
+from xled_plus.emulator import DeviceEmulator
+import time
+
+emu = None
+if len(argv) > 1:
+    ctr = setup_control()
+else:
+    emu = DeviceEmulator().start()
+    ctr = emu.connect()
+
+pat = ctr.make_solid_pattern((40, 20, 0))
+
+
+def make_movie(offset=0):
+    return ctr.make_func_movie(
+        10,
+        lambda i: ctr.make_func_pattern(
+            lambda j: hsl_color((i + j + offset) / 50.0 % 1.0, 1.0, 0.0)
+        ),
+    )
+
+
+movie = make_movie()
+movies = [make_movie(k + 1) for k in range(10)]
+ids = []
+
+
+def measure(name, func, repeat=10):
+    ctr.reset_http_stats()
+    start = time.time()
+    for i in range(repeat):
+        func()
+    elapsed = time.time() - start
+    stats = ctr.get_http_stats()
+    calls = sum(entry["count"] for entry in stats.values())
+    print(
+        "{:<14} {:5.1f} requests {:8.2f} ms".format(
+            name, float(calls) / repeat, elapsed * 1000.0 / repeat
+        )
+    )
+    for key in sorted(stats):
+        entry = stats[key]
+        print(
+            "    {:<6} {:<20} {:4d} x {:6.2f} ms  {:8d} bytes out {:6d} in".format(
+                key[0],
+                key[1],
+                entry["count"],
+                entry["time"] * 1000.0 / entry["count"],
+                entry["sent"],
+                entry["received"],
+            )
+        )
+
+
+measure("get_mode", ctr.get_mode)
+measure("show_pattern", lambda: ctr.show_pattern(pat))
+measure("show_movie", lambda: ctr.show_movie(movie, 10))
+measure(
+    "upload_movie", lambda: ids.append(ctr.upload_movie(movies.pop(), 10, force=True))
+)
+measure("upload (same)", lambda: ctr.upload_movie(movie, 10, force=True))
+if ctr.family != "D" and ctr.version >= (2, 5, 6):
+    measure("show_playlist", lambda: ctr.show_playlist(ids[-2:], 5))
+measure("turn_off/on", lambda: (ctr.turn_off(), ctr.turn_on()))
+measure("show_rt_frame", lambda: ctr.show_rt_frame(pat), 100)
+measure("clear_movies", ctr.clear_movies, 3)
+
+if emu:
+    print("Emulator connections opened: {}".format(emu.connection_count))
+    emu.stop()
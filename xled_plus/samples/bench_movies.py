@@ -0,0 +1,64 @@
+"""
+Simulates a day of scheduled scene changes on a local emulator, and
+reports the number of bytes uploaded when the device is just cleared when
+full, and when the movie cache keeps the most recently (lru) or most
+frequently (lfu) used movies. Also reported is the number of cold scene
+changes, where the movie was not on the device and had to be uploaded at
+the time it was shown.
+"""
+
+from .sample_setup import *
+from xled_plus.emulator import DeviceEmulator
+from xled_plus.moviecache import MovieCache
+import random
+
+# A scene change every 15 minutes, among 30 scenes of which a few are
+# shown much more often than the others
+num_changes = 96
+num_scenes = 30
+
+
+def make_scene(ctr, k, rnd):
+    numframes = rnd.choice([20, 40, 80, 150])
+    return ctr.make_func_movie(
+        numframes,
+        lambda i: ctr.make_func_pattern(
+            lambda j: hsl_color((k * 0.13 + (i + j) / 100.0) % 1.0, 1.0, 0.0)
+        ),
+    )
+
+
+def run(policy):
+    rnd = random.Random(1)
+    with DeviceEmulator(max_frames=992) as emu:
+        ctr = emu.connect()
+        ctr.movie_cache = MovieCache(policy) if policy else None
+        scenes = [make_scene(ctr, k, rnd) for k in range(num_scenes)]
+        weights = [1.0 / (k + 1) for k in range(num_scenes)]
+        ctr.reset_http_stats()
+        cold = 0
+        for n in range(num_changes):
+            scene = rnd.choices(range(num_scenes), weights)[0]
+            if ctr.find_movie(ctr.movie_unique_id(scenes[scene], 10)) is None:
+                cold += 1
+            ctr.show_movie(scenes[scene], 10)
+        stats = ctr.get_http_stats()
+        uploaded = sum(
+            entry["sent"] for key, entry in stats.items() if key[1] == "movies/full"
+        )
+        uploads = sum(
+            entry["count"] for key, entry in stats.items() if key[1] == "movies/full"
+        )
+        requests = sum(entry["count"] for entry in stats.values())
+        print(
+            "{:<6} {:4d} uploads {:9d} bytes {:5d} requests {:3d} cold".format(
+                policy or "clear", uploads, uploaded, requests, cold
+            )
+        )
+        if ctr.movie_cache:
+            print("       {}".format(ctr.movie_cache.get_stats()))
+
+
+print("{} scene changes among {} scenes:".format(num_changes, num_scenes))
+for policy in (None, "lru", "lfu"):
+    run(policy)
@@ -13,6 +13,6 @@ def setup_control():
     else:
         dev = discover()
         host = dev.ip_address
-    return HighControlInterface(host)
+    return HighControlInterface(host, profile_cache=True)
 
 
@@ -0,0 +1,456 @@
+"""
+xled_plus.scheduler
+~~~~~~~~~~~~~~~~~~~
+
+Asyncio based engine for playing effects in real time.
+
+Each playing effect is an RtJob with two stages: a render stage that
+calls the effect's getnext() in a worker thread and puts the encoded frame
+in a bounded look-ahead queue, and a send stage that takes frames from the
+queue and sends them to the device at deadlines computed from a monotonic
+clock. A slow frame therefore does not shift the timing of the following
+frames, and changes to the wall clock have no effect.
+
+When the send stage falls behind by more than one frame, the policy
+decides what happens:
+'skip' drops frames to get back on schedule (the default),
+'catchup' sends the late frames back to back until on schedule again,
+'delay' keeps every frame and moves the schedule later instead.
+
+A FrameScheduler runs any number of jobs, on any number of controllers, in
+one event loop. By default the loop runs in a background thread, but
+play() can also be awaited from an application's own event loop.
+Effect.launch_rt uses the shared scheduler from get_default_scheduler.
+The background thread is not a daemon thread, so a script that starts an
+effect keeps running while it plays. The thread ends by itself when the
+last job has stopped. Frames are rendered in a thread pool shared by all
+jobs, while each job sends its frames in a thread of its own, so slow
+rendering on one controller does not hold up the sending to the others.
+"""
+
+import asyncio
+import collections
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from xled_plus.effect_base import RenderAhead, percentile
+
+log = logging.getLogger(__name__)
+
+POLICIES = ("skip", "catchup", "delay")
+
+
+class RtJob(object):
+    """
+    One effect playing in real time on one controller.
+
+    :param effect: the Effect to play
+    :param ctr: controller to send frames to, default the effect's controller
+    :param float fps: frames per second, default the effect's preferred_fps
+    :param int lookahead: max number of rendered frames waiting to be sent
+    :param str policy: 'skip', 'catchup' or 'delay'
+    :param int ahead: if non-zero, render this many frames ahead in a
+        separate thread (see effect_base.RenderAhead) instead of using the
+        look-ahead queue. When no frame is ready in time, that frame is
+        left out and the previous one stays on the leds.
+
+    The job ends when the effect's getnext returns None. When frames are
+    skipped, an effect that has a skip(n) method is told to skip the n
+    frames that were not rendered yet, so that it keeps its pace, as a
+    movie should. Frames given as bytes or memoryview are sent as they are,
+    and must stay unchanged until the job has ended (see wait).
+    """
+
+    def __init__(self, effect, ctr=None, fps=None, lookahead=2, policy="skip", ahead=0):
+        assert policy in POLICIES
+        self.effect = effect
+        self.ctr = ctr or effect.ctr
+        self.fps = fps or effect.preferred_fps
+        self.lookahead = max(1, lookahead)
+        self.policy = policy
+        self.ahead = ahead
+        self.buffer = None
+        self.future = None
+        self.cancelled = False
+        self.started = False
+        self.finished = threading.Event()
+        self.send_lock = threading.Lock()
+        self.pending_skip = 0
+        self.frames_sent = 0
+        self.frames_skipped = 0
+        self.frames_late = 0
+        self.underruns = 0
+        self.lateness = collections.deque(maxlen=10000)
+        self.max_lateness = 0.0
+
+    def send_frame(self, frame):
+        # Holds the lock while sending, so that cancel waits for a frame
+        # being sent, and no frame is sent after it
+        with self.send_lock:
+            if not self.cancelled:
+                self.ctr.show_rt_frame(frame)
+
+    def render_frame(self, skip=0):
+        if skip and hasattr(self.effect, "skip"):
+            self.effect.skip(skip)
+        pat = self.effect.getnext()
+        if pat is None or isinstance(pat, (bytes, memoryview)):
+            return pat
+        # A copy, since the effect may reuse its pattern for the next frame
+        return bytes(self.ctr.frame_data(pat))
+
+    async def render(self, queue, executor):
+        loop = asyncio.get_event_loop()
+        frame = True
+        while frame is not None:
+            skip = self.pending_skip
+            self.pending_skip = 0
+            try:
+                frame = await loop.run_in_executor(executor, self.render_frame, skip)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Handed over to the send stage, which raises it
+                frame = e
+            await queue.put(frame)
+
+    async def run(self, executor=None):
+        """
+        Coroutine playing the effect until cancelled.
+
+        :param executor: executor to render frames in, default the loop's
+        """
+        with self.send_lock:
+            if self.cancelled:
+                self.finished.set()
+                return
+            self.started = True
+        loop = asyncio.get_event_loop()
+        queue = asyncio.Queue(self.lookahead)
+        sender = ThreadPoolExecutor(1)
+        self.effect.reset(False)
+        if self.ahead:
+            self.buffer = RenderAhead(self.effect, self.ctr, self.ahead)
+            self.buffer.start()
+            renderer = None
+            # Fill the buffer before starting the clock
+            while self.buffer.running and self.buffer.count < self.buffer.depth:
+                await asyncio.sleep(0.005)
+        else:
+            renderer = asyncio.ensure_future(self.render(queue, executor))
+        period = 1.0 / self.fps
+        start = time.monotonic()
+        num = 0
+        ended = False
+        try:
+            while not ended:
+                deadline = start + num * period
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if self.buffer:
+                    frame = self.buffer.pop()
+                    if frame is None:
+                        if self.buffer.ended:
+                            break
+                        self.underruns += 1
+                        num += 1
+                        continue
+                else:
+                    if queue.empty():
+                        self.underruns += 1
+                    frame = await queue.get()
+                    if frame is None:
+                        break
+                    if isinstance(frame, Exception):
+                        raise frame
+                late = time.monotonic() - deadline
+                if late > period:
+                    self.frames_late += 1
+                    self.max_lateness = max(self.max_lateness, late)
+                    if self.policy == "skip":
+                        missed = int(late / period)
+                        num += missed
+                        while missed and not queue.empty():
+                            skipped = queue.get_nowait()
+                            if skipped is None:
+                                # Send the last frame, then end
+                                ended = True
+                                break
+                            if isinstance(skipped, Exception):
+                                raise skipped
+                            frame = skipped
+                            self.frames_skipped += 1
+                            missed -= 1
+                        while missed and self.buffer and self.buffer.count > 1:
+                            frame = self.buffer.pop()
+                            self.frames_skipped += 1
+                            missed -= 1
+                        if missed and not ended and renderer:
+                            if hasattr(self.effect, "skip"):
+                                self.pending_skip += missed
+                                self.frames_skipped += missed
+                    elif self.policy == "delay":
+                        start += late
+                await loop.run_in_executor(sender, self.send_frame, frame)
+                self.frames_sent += 1
+                self.lateness.append(max(0.0, late))
+                num += 1
+        finally:
+            if renderer:
+                renderer.cancel()
+                await asyncio.gather(renderer, return_exceptions=True)
+            if self.buffer:
+                self.buffer.stop()
+            sender.shutdown(wait=False)
+            # Lets go of the frames before telling that the job has ended
+            while not queue.empty():
+                queue.get_nowait()
+            frame = skipped = None
+            self.finished.set()
+
+    def cancel(self):
+        """
+        Stops the job. Can be called from any thread. When it returns, no
+        more frames are sent, so the caller can switch the device to
+        another mode.
+        """
+        with self.send_lock:
+            self.cancelled = True
+            if not self.started:
+                self.finished.set()
+        if self.future:
+            self.future.cancel()
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the job has ended, by itself or after cancel, and no
+        longer holds any frames of the effect. Returns False on timeout.
+
+        :param float timeout: max seconds to wait, default no limit
+        :rtype: bool
+        """
+        return self.finished.wait(timeout)
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def get_stats(self):
+        """
+        Returns counters for sent, skipped and late frames, render
+        underruns, and the 50th and 99th percentile of how late recent
+        frames were sent and the largest lateness, in seconds. When
+        rendering ahead, the buffer stats from RenderAhead.get_stats are
+        included too.
+
+        :rtype: dict
+        """
+        stats = self.buffer.get_stats() if self.buffer else {}
+        lateness = sorted(self.lateness)
+        stats.update(
+            {
+                "sent": self.frames_sent,
+                "skipped": self.frames_skipped,
+                "late": self.frames_late,
+                "underruns": self.underruns,
+                "late_p50": percentile(lateness, 0.5),
+                "late_p99": percentile(lateness, 0.99),
+                "max_lateness": self.max_lateness,
+            }
+        )
+        return stats
+
+
+class FrameScheduler(object):
+    """
+    Plays real time effects on any number of controllers in one event loop.
+
+    :param int lookahead: default number of frames rendered ahead
+    :param str policy: default policy for late frames, see module doc
+    :param int max_workers: threads for rendering frames
+    """
+
+    def __init__(self, lookahead=2, policy="skip", max_workers=None):
+        assert policy in POLICIES
+        self.lookahead = lookahead
+        self.policy = policy
+        self.executor = ThreadPoolExecutor(max_workers or 4)
+        self.loop = None
+        self.thread = None
+        self.jobs = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts the event loop in a background thread, if not already
+        running. The thread keeps running until stop is called, or until
+        the last job added after this has stopped.
+        """
+        with self.lock:
+            self.start_locked()
+
+    def start_locked(self):
+        if self.thread:
+            return
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def runloop():
+            asyncio.set_event_loop(loop)
+            loop.call_soon(ready.set)
+            loop.run_forever()
+            # Let cancelled jobs clean up before closing the loop
+            pending = asyncio.all_tasks(loop)
+            for task in pending:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.close()
+
+        self.loop = loop
+        self.thread = threading.Thread(target=runloop)
+        self.thread.start()
+        ready.wait()
+
+    def detach_loop(self):
+        # Called with the lock held. Makes the next start begin a new loop
+        # and thread, and returns the current ones, which the caller stops.
+        thread, loop = self.thread, self.loop
+        self.thread = None
+        self.loop = None
+        return thread, loop
+
+    def stop(self):
+        """
+        Stops all jobs and the background event loop.
+        """
+        self.stop_all()
+        with self.lock:
+            thread, loop = self.detach_loop()
+        if thread:
+            loop.call_soon_threadsafe(loop.stop)
+            if thread is not threading.current_thread():
+                thread.join()
+
+    def join(self, timeout=None):
+        """
+        Blocks until all jobs have stopped and the background event loop
+        has ended, or until timeout seconds have passed.
+
+        :param float timeout: max seconds to wait, default no limit
+        """
+        thread = self.thread
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def make_job(
+        self, effect, ctr=None, fps=None, policy=None, lookahead=None, ahead=0
+    ):
+        return RtJob(
+            effect,
+            ctr,
+            fps,
+            self.lookahead if lookahead is None else lookahead,
+            policy or self.policy,
+            ahead,
+        )
+
+    def add(
+        self,
+        effect,
+        ctr=None,
+        fps=None,
+        policy=None,
+        lookahead=None,
+        ahead=0,
+        replace=True,
+    ):
+        """
+        Starts playing an effect in the background event loop.
+        Returns the job, which can be used to stop it and to get stats.
+
+        :param effect: the Effect to play
+        :param ctr: controller to send to, default the effect's controller
+        :param float fps: frames per second, default the effect's preferred_fps
+        :param str policy: policy for late frames, default the scheduler's
+        :param int lookahead: frames to render ahead, default the scheduler's
+        :param int ahead: frames to render ahead in a separate thread, see RtJob
+        :param bool replace: stop other jobs playing on the same controller
+        :rtype: RtJob
+        """
+        job = self.make_job(effect, ctr, fps, policy, lookahead, ahead)
+        if replace:
+            self.remove(job.ctr)
+        with self.lock:
+            self.start_locked()
+            self.jobs.append(job)
+            job.future = asyncio.run_coroutine_threadsafe(self.watch(job), self.loop)
+        return job
+
+    async def watch(self, job):
+        try:
+            await job.run(self.executor)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("Real time effect stopped by error")
+        finally:
+            self.discard(job)
+            # The loop thread ends with the last job, so that it does not
+            # keep the program running when nothing plays any more
+            with self.lock:
+                if not self.jobs and self.loop is asyncio.get_event_loop():
+                    self.detach_loop()[1].stop()
+
+    def discard(self, job):
+        # Jobs are removed both when stopped and when finished, possibly
+        # from different threads
+        try:
+            self.jobs.remove(job)
+        except ValueError:
+            pass
+
+    async def play(
+        self, effect, ctr=None, fps=None, policy=None, lookahead=None, ahead=0
+    ):
+        """
+        Coroutine playing an effect in the running event loop, until
+        cancelled. Use this instead of add to run in your own event loop.
+        """
+        job = self.make_job(effect, ctr, fps, policy, lookahead, ahead)
+        await job.run(self.executor)
+
+    def remove(self, job):
+        """
+        Stops a job.
+
+        :param job: an RtJob returned by add, or the effect or controller of
+            the jobs to stop
+        """
+        for other in list(self.jobs):
+            if other is job or other.effect is job or other.ctr is job:
+                other.cancel()
+                self.discard(other)
+
+    def stop_all(self):
+        """
+        Stops all jobs, but keeps the event loop running.
+        """
+        for job in list(self.jobs):
+            self.remove(job)
+
+
+default_scheduler = None
+
+
+def get_default_scheduler():
+    """
+    Returns the shared scheduler used by Effect.launch_rt.
+
+    :rtype: FrameScheduler
+    """
+    global default_scheduler
+    if default_scheduler is None:
+        default_scheduler = FrameScheduler()
+    return default_scheduler
@@ -14,20 +14,32 @@ to make the angles come out right. In the 2D case the 'angle' parameter below
 is just a single angle, in degreed counted clockwise from the top. In the 3D
 case, 'angle' is a tuple (theta, phi), where theta is the polar angle, and phi
 the azimuthal angle.
+
+The sequence function is sampled once into a color texture, and the
+projection of each led position on the direction vector is computed once,
+so each frame is only a shift of the projections and a texture lookup.
 """
 
 
 from xled_plus.effect_base import Effect
 from xled_plus.colormeander import ColorMeander
 from xled_plus.pattern import blendcolors
-from xled_plus.ledcolor import hsl_color
 import math as m
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 class Sequence(Effect):
+    texture_size = 4096
+
     def __init__(self, ctr, seqfunc, speed, folds, angle=False):
         super(Sequence, self).__init__(ctr)
         self.seqfunc = seqfunc
+        self.texture = None
+        self.proj = None
         if not ctr.layout_bounds:
             ctr.fetch_layout()
         self.dim = ctr.layout_bounds["dim"]
@@ -59,22 +71,55 @@ class Sequence(Effect):
     def set_vector(self, vec):
         assert len(vec) == self.dim
         self.vect = vec
+        self.proj = None
 
     def dot(self, v1, v2):
         return sum(map(lambda x1, x2: x1 * x2, v1, v2))
 
+    def make_texture(self):
+        # The sequence function sampled over [0, 1), as rgb colors
+        size = self.texture_size
+        cols = [self.seqfunc(float(k) / size) for k in range(size)]
+        if np is not None:
+            self.texture = np.array(cols, dtype=np.uint8)
+        else:
+            self.texture = cols
+
+    def make_projection(self):
+        # The position of each led along the direction vector
+        if np is not None:
+            pos = self.ctr.get_layout_array("centered")
+            self.proj = pos.dot(np.array(self.vect, dtype=float))
+        else:
+            self.proj = [
+                self.dot(self.vect, pos)
+                for pos in self.ctr.get_layout_positions("centered")
+            ]
+
     def reset(self, numframes):
         self.currpos = 0.0
+        self.make_texture()
+        self.proj = None
 
     def update(self, step):
         self.currpos += self.speed * step
 
     def getnext(self):
         self.update(1.0 / self.preferred_fps)
-        return self.ctr.make_layout_pattern(
-            lambda pos: self.seqfunc((self.dot(self.vect, pos) + self.currpos) % 1.0),
-            style="centered",
-        )
+        if self.texture is None:
+            self.make_texture()
+        if self.proj is None:
+            self.make_projection()
+        size = self.texture_size
+        pat = self.ctr.make_pattern()
+        if np is not None:
+            ind = ((self.proj + self.currpos) % 1.0 * size).astype(int) % size
+            pat.array[:, -3:] = self.texture[ind]
+        else:
+            for i, x in enumerate(self.proj):
+                ind = int((x + self.currpos) % 1.0 * size) % size
+                pat.set_pixel(i, self.texture[ind])
+        return pat
 
 
 class ColorSequence(Sequence):
@@ -138,7 +183,7 @@ class SpectrumSequence(Sequence):
         self.lightness = lightness
 
     def getcolor(self, x):
-        return hsl_color(x, 1.0, self.lightness)
+        return self.ctr.color_model.hsl_color(x, 1.0, self.lightness)
 
 
 class VaryingAngleSequence(Sequence):
@@ -163,6 +208,7 @@ class VaryingAngleSequence(Sequence):
             self.vect = (x * self.maxfold / 2.0, y * self.maxfold / 2.0)
         else:
             self.vect = (z * self.maxfold / 2.0,)
+        self.proj = None
         self.currpos += self.speed * step
 
 
@@ -52,7 +52,7 @@ class XledColorPicker:
             if not self.rtmode:
                 self.outermode = self.ctr.get_mode()['mode']
             pat = self.ctr.make_solid_pattern(hsl_color(*hsl))
-            self.ctr.show_rt_frame(self.ctr.to_movie(pat))
+            self.ctr.show_rt_frame(pat)
             self.rtmode = True
         else:
             if self.rtmode: